@@ -0,0 +1,123 @@
+# answer_cache.py
+
+import threading
+from embed_store import encode_texts
+from utils import is_error_text
+
+# Cosine similarity above which two questions are treated as the same question
+DEFAULT_SIMILARITY_THRESHOLD = 0.9
+DEFAULT_MAX_ENTRIES_PER_FILE = 200
+
+
+class SemanticAnswerCache:
+    """
+    Per-file cache of Q&A answers keyed by query meaning rather than exact text.
+    Incoming questions are embedded with the shared MiniLM encoder and matched
+    against earlier questions for the same file by cosine similarity.
+    Safe to share between threads: lookup() returns the query embedding so the
+    caller can hand it to store() instead of encoding the question twice.
+    """
+
+    def __init__(self, threshold=DEFAULT_SIMILARITY_THRESHOLD,
+                 max_entries_per_file=DEFAULT_MAX_ENTRIES_PER_FILE):
+        self.threshold = threshold
+        self.max_entries_per_file = max_entries_per_file
+        # cache_key -> {"embeddings": np.ndarray (n, dim), "entries": [dict, ...]}
+        self._files = {}
+        # Guards _files and the counters; encoding happens outside it
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, query):
+        """Return a unit-length embedding for the query."""
+        import numpy as np
+        embedding = encode_texts([query])[0]
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding = embedding / norm
+        return embedding
+
+    def lookup(self, cache_key, query):
+        """
+        Return (hit, query_embedding): the cached answer for the closest earlier
+        question, or None, plus the question's embedding to pass to store().
+        Hits are dicts with answer, token_usage, the original query and similarity.
+        """
+        import numpy as np
+        query_emb = self._embed(query)
+        with self._lock:
+            bucket = self._files.get(cache_key)
+            if not bucket or not bucket["entries"]:
+                self.misses += 1
+                return None, query_emb
+
+            similarities = bucket["embeddings"] @ query_emb
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None, query_emb
+
+            self.hits += 1
+            entry = bucket["entries"][best]
+            return {
+                "answer": entry["answer"],
+                "token_usage": entry["token_usage"],
+                "query": entry["query"],
+                "similarity": similarity
+            }, query_emb
+
+    def store(self, cache_key, query, answer, token_usage=None, query_embedding=None):
+        """Cache an answer for the given file and question (query_embedding from lookup(), if available)."""
+        import numpy as np
+        # Never cache error strings from the Q&A engine
+        if is_error_text(answer):
+            return
+
+        if query_embedding is None:
+            query_embedding = self._embed(query)
+        query_emb = np.asarray(query_embedding).reshape(1, -1)
+        with self._lock:
+            bucket = self._files.setdefault(cache_key, {"embeddings": None, "entries": []})
+            if bucket["embeddings"] is None:
+                bucket["embeddings"] = query_emb
+            else:
+                bucket["embeddings"] = np.vstack([bucket["embeddings"], query_emb])
+            bucket["entries"].append({"query": query, "answer": answer, "token_usage": token_usage})
+
+            # Drop the oldest entries once the per-file bound is reached
+            overflow = len(bucket["entries"]) - self.max_entries_per_file
+            if overflow > 0:
+                bucket["entries"] = bucket["entries"][overflow:]
+                bucket["embeddings"] = bucket["embeddings"][overflow:]
+
+    def clear(self, cache_key=None):
+        """Forget cached answers for one file, or for all files."""
+        with self._lock:
+            if cache_key is None:
+                self._files.clear()
+            else:
+                self._files.pop(cache_key, None)
+
+    def stats(self):
+        """Return hit/miss counters for logging."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "files": len(self._files)
+            }
+
+
+# Global answer cache instance
+answer_cache = None
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Get or create global semantic answer cache instance."""
+    global answer_cache
+    if answer_cache is None:
+        answer_cache = SemanticAnswerCache()
+    return answer_cache
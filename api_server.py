@@ -0,0 +1,463 @@
+"""
+HTTP API for the AI Content Analyzer pipeline.
+
+Exposes content submission, job polling, transcript/metadata retrieval,
+semantic search and Q&A over the same building blocks as the Streamlit app,
+with the embedding encoder and per-file FAISS indexes kept warm across
+requests. Every backend (storage, extraction, metadata, Q&A) can be swapped
+through create_app() so the service runs locally with stand-ins.
+
+Requests authenticate with a Supabase access token (Authorization: Bearer);
+the user id is taken from the verified token. X-User-Id is only trusted when
+API_TRUST_USER_HEADER=1, i.e. behind a proxy that authenticates and sets it.
+
+Run (local only; put a TLS proxy in front to expose it):
+    uvicorn api_server:app --host 127.0.0.1 --port 8000
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, UploadFile
+from pydantic import BaseModel
+
+load_dotenv()
+
+# Trust a proxy-supplied X-User-Id header instead of verifying tokens (never on an exposed port)
+API_TRUST_USER_HEADER = os.getenv("API_TRUST_USER_HEADER", "").lower() in ("1", "true", "yes")
+# Verified tokens are remembered briefly so each request doesn't round-trip to Supabase Auth
+TOKEN_CACHE_SECONDS = 60
+TOKEN_CACHE_SIZE = 1024
+# Finished jobs are forgotten after this long; the registry never holds more than MAX_JOBS
+# (new submissions are refused while it is full of queued/running jobs)
+JOB_TTL_SECONDS = float(os.getenv("API_JOB_TTL_SECONDS", "3600"))
+MAX_JOBS = int(os.getenv("API_MAX_JOBS", "1000"))
+FINISHED_JOB_STATUSES = ("completed", "completed_with_errors", "failed")
+
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = 5
+
+
+class QuestionRequest(BaseModel):
+    query: str
+    top_k: int = 5
+
+
+def _process_worker(file_path_or_url, filename, asr_options=None):
+    """Process-pool worker: extract or transcribe one source."""
+    from transcribe import process_content
+    return process_content(file_path_or_url, filename, asr_options)
+
+
+def verify_supabase_token(token):
+    """User id for a Supabase access token, or None if Supabase Auth rejects it."""
+    global _auth_client
+    if _auth_client is None:
+        from supabase import create_client
+        from supabase_storage import SUPABASE_URL, SUPABASE_KEY
+        _auth_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    try:
+        response = _auth_client.auth.get_user(token)
+    except Exception:
+        return None
+    return response.user.id if response and response.user else None
+
+_auth_client = None
+
+
+class JobStore:
+    """
+    In-memory job registry (per process). Finished jobs expire after ttl
+    seconds, and the oldest finished jobs are dropped beyond max_jobs;
+    queued and running jobs are never dropped.
+    """
+
+    def __init__(self, ttl=JOB_TTL_SECONDS, max_jobs=MAX_JOBS):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+
+    def _prune(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["status"] in FINISHED_JOB_STATUSES and now - job["updated_at"] > self.ttl]:
+            del self._jobs[job_id]
+        # Dicts keep insertion order, so the first jobs are the oldest
+        excess = len(self._jobs) - self.max_jobs + 1
+        if excess > 0:
+            finished = [job_id for job_id, job in self._jobs.items() if job["status"] in FINISHED_JOB_STATUSES]
+            for job_id in finished[:excess]:
+                del self._jobs[job_id]
+
+    def create(self, user_id, source):
+        """Register a queued job, or return None if the registry is full of live jobs."""
+        job_id = str(uuid.uuid4())
+        job = {"job_id": job_id, "user_id": user_id, "source": source, "status": "queued",
+               "stage": None, "file_id": None, "error": None,
+               "created_at": time.time(), "updated_at": time.time()}
+        with self._lock:
+            self._prune()
+            if len(self._jobs) >= self.max_jobs:
+                return None
+            self._jobs[job_id] = job
+        return dict(job)
+
+    def update(self, job_id, **changes):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(changes, updated_at=time.time())
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+
+class Pipeline:
+    """
+    Shared backends for the API. Anything left as None is loaded from the
+    app's own modules on first use.
+    """
+
+    def __init__(self, storage_manager=None, process_fn=None, metadata_fn=None, answer_fn=None,
+                 index_manager=None, cpu_workers=2, io_concurrency=8, groq_api_key=None, verify_token_fn=None,
+                 max_jobs=MAX_JOBS):
+        self._storage_manager = storage_manager
+        self.verify_token_fn = verify_token_fn or verify_supabase_token
+        # token -> (user_id, expires_at)
+        self._verified_tokens = {}
+        self.process_fn = process_fn
+        self.metadata_fn = metadata_fn
+        self.answer_fn = answer_fn
+        self._index_manager = index_manager
+        self.cpu_workers = cpu_workers
+        self.io_concurrency = io_concurrency
+        self.groq_api_key = groq_api_key or os.getenv("GROK_API_KEY")
+        self.jobs = JobStore(max_jobs=max_jobs)
+        self._pool = None
+        self._io_slots = None
+
+    @property
+    def storage_manager(self):
+        if self._storage_manager is None:
+            from supabase_storage import get_storage_manager
+            self._storage_manager = get_storage_manager()
+        return self._storage_manager
+
+    @property
+    def index_manager(self):
+        if self._index_manager is None:
+            from embed_store import get_index_manager
+            self._index_manager = get_index_manager()
+        return self._index_manager
+
+    def start(self):
+        self._io_slots = asyncio.Semaphore(self.io_concurrency)
+        if self.process_fn is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.cpu_workers)
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def warm_up(self):
+        """Load the shared embedding model before the first request needs it."""
+        from embed_store import get_embedding_model
+        get_embedding_model()
+
+    async def io(self, function, *args, **kwargs):
+        """Run a blocking network call in a thread under the I/O concurrency cap."""
+        async with self._io_slots:
+            return await asyncio.to_thread(function, *args, **kwargs)
+
+    async def storage(self, user_id, method, *args, **kwargs):
+        """Call a storage manager method on behalf of a user (calls for different users run concurrently)."""
+        user_storage = self.storage_manager.for_user(user_id)
+        return await self.io(getattr(user_storage, method), *args, **kwargs)
+
+    async def authenticate(self, token):
+        """User id for a bearer token (verified, then cached briefly), or None."""
+        cached = self._verified_tokens.get(token)
+        if cached and cached[1] > time.time():
+            return cached[0]
+        user_id = await self.io(self.verify_token_fn, token)
+        if user_id:
+            if len(self._verified_tokens) >= TOKEN_CACHE_SIZE:
+                self._verified_tokens.clear()
+            self._verified_tokens[token] = (user_id, time.time() + TOKEN_CACHE_SECONDS)
+        return user_id
+
+    async def extract(self, file_path_or_url, filename, asr_options=None):
+        if self.process_fn is not None:
+            return await asyncio.to_thread(self.process_fn, file_path_or_url, filename, asr_options)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _process_worker, file_path_or_url, filename, asr_options)
+
+    async def generate_metadata(self, transcript, groq_api_key):
+        if self.metadata_fn is None:
+            from utils import generate_video_metadata
+            self.metadata_fn = generate_video_metadata
+        return await self.io(self.metadata_fn, transcript, groq_api_key)
+
+    async def answer(self, query, context, metadata, groq_api_key):
+        if self.answer_fn is None:
+            from qa_engine import answer_query_with_metadata
+            self.answer_fn = answer_query_with_metadata
+        return await self.io(self.answer_fn, query, context, metadata, groq_api_key)
+
+    async def run_job(self, job_id, user_id, source, filename, file_size, temp_path=None, asr_options=None):
+        """Full pipeline for one submission: extract, metadata and embeddings, then one save."""
+        from utils import is_error_text
+        jobs = self.jobs
+        try:
+            jobs.update(job_id, status="running", stage="extracting")
+            transcript = await self.extract(temp_path or source, filename, asr_options)
+            if is_error_text(transcript):
+                jobs.update(job_id, status="failed", error=str(transcript))
+                return
+
+            # Metadata (network) and embeddings (local, warm encoder) side by side
+            jobs.update(job_id, stage="analyzing")
+            from embed_store import embed_transcript
+            metadata_task = self.generate_metadata(transcript, self.groq_api_key) if self.groq_api_key else None
+            embed_task = asyncio.to_thread(embed_transcript, transcript)
+            results = await asyncio.gather(*(task for task in (metadata_task, embed_task) if task is not None),
+                                           return_exceptions=True)
+            generated = results.pop(0) if metadata_task is not None else None
+            embedded = results.pop(0)
+
+            problems = []
+            metadata = None
+            usage_rows = []
+            if generated is not None:
+                if isinstance(generated, Exception) or "error" in generated:
+                    problems.append(f"metadata: {generated if isinstance(generated, Exception) else generated['error']}")
+                else:
+                    usage = generated.pop("token_usage", None)
+                    metadata = generated
+                    if usage:
+                        usage_rows.append({"operation": "metadata_generation",
+                                           "input_tokens": usage.get("input_tokens", 0),
+                                           "output_tokens": usage.get("output_tokens", 0),
+                                           "estimated_cost": usage.get("estimated_cost", 0)})
+            chunks = embeddings = embeddings_list = None
+            if isinstance(embedded, Exception):
+                problems.append(f"embeddings: {embedded}")
+            else:
+                _, chunks, embeddings = embedded
+                embeddings_list = [{'chunk': chunk, 'embedding': embedding.tolist()}
+                                   for chunk, embedding in zip(chunks, embeddings)]
+
+            # Everything for this file is written in one transaction
+            jobs.update(job_id, stage="saving")
+            file_type = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'unknown'
+            saved = await self.storage(user_id, "ingest_content", filename=filename, transcript=transcript,
+                                       file_type=file_type, file_size=file_size,
+                                       source_url=source if temp_path is None else None,
+                                       metadata=metadata, embeddings=embeddings_list, texts=chunks,
+                                       token_usage=usage_rows)
+            if not saved["success"]:
+                jobs.update(job_id, status="failed", error=saved.get("error", "Failed to save content"))
+                return
+            file_id = saved["file_id"]
+            jobs.update(job_id, file_id=file_id)
+            if embeddings is not None:
+                # Keep the new file's index warm for the searches that usually follow
+                self.index_manager.put((user_id, file_id), chunks, embeddings, transcript)
+
+            if problems:
+                jobs.update(job_id, status="completed_with_errors", stage=None, error="; ".join(problems))
+            else:
+                jobs.update(job_id, status="completed", stage=None)
+        except Exception as e:
+            jobs.update(job_id, status="failed", error=str(e))
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    async def search_context(self, user_id, file_id, query, top_k=5):
+        """
+        Retrieve context for a query. When the store can match chunks itself
+        (pgvector, local) no vectors are downloaded; otherwise (or for files
+        without chunk rows) a warm per-file FAISS index is used.
+        """
+        if getattr(self.storage_manager, "supports_chunk_matching", False):
+            from embed_store import context_from_matches, encode_texts
+            query_embedding = (await asyncio.to_thread(encode_texts, [query]))[0].tolist()
+            matches = await self.storage(user_id, "match_chunks", query_embedding, file_id, top_k)
+            if matches:
+                return context_from_matches(matches)
+        key = await self.ensure_index(user_id, file_id)
+        return await asyncio.to_thread(self.index_manager.search, key, query, top_k)
+
+    async def ensure_index(self, user_id, file_id):
+        """Load a file's index into the index manager if it isn't warm yet."""
+        key = (user_id, file_id)
+        if self.index_manager.get(key) is not None:
+            return key
+        # get_transcript is scoped to the user, so it doubles as the ownership check
+        transcript = await self.storage(user_id, "get_transcript", file_id)
+        if transcript is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        stored = await self.storage(user_id, "get_embeddings", file_id)
+        if stored and stored.get("embeddings"):
+            await asyncio.to_thread(self.index_manager.put_stored, key, stored, transcript)
+        else:
+            await asyncio.to_thread(self.index_manager.put_transcript, key, transcript)
+        return key
+
+
+def create_app(pipeline: Optional[Pipeline] = None) -> FastAPI:
+    """Build the FastAPI application around a pipeline (real or stand-in)."""
+    pipeline = pipeline or Pipeline()
+    background_tasks = set()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        pipeline.start()
+        if pipeline._index_manager is None:
+            await asyncio.to_thread(pipeline.warm_up)
+        yield
+        pipeline.stop()
+
+    app = FastAPI(title="AI Content Analyzer API", lifespan=lifespan)
+    app.state.pipeline = pipeline
+
+    async def require_user(authorization: Optional[str] = Header(None), x_user_id: Optional[str] = Header(None)):
+        """The authenticated user's id, from a verified bearer token (or a trusted proxy header)."""
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            user_id = await pipeline.authenticate(token.strip())
+            if not user_id:
+                raise HTTPException(status_code=401, detail="Invalid or expired access token")
+            return user_id
+        if API_TRUST_USER_HEADER and x_user_id:
+            return x_user_id
+        raise HTTPException(status_code=401, detail="Authorization: Bearer <Supabase access token> is required")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/metrics")
+    async def metrics(user_id: str = Depends(require_user)):
+        storage_manager = pipeline.storage_manager
+        return {"storage_cache": storage_manager.stats() if hasattr(storage_manager, "stats") else None}
+
+    @app.post("/content", status_code=202)
+    async def submit_content(file: Optional[UploadFile] = File(None), url: Optional[str] = Form(None),
+                             mode: Optional[str] = Form(None), language: Optional[str] = Form(None),
+                             latency_budget: Optional[float] = Form(None),
+                             user_id: str = Depends(require_user)):
+        if file is None and not url:
+            raise HTTPException(status_code=400, detail="Provide a file upload or a url")
+        from asr import TRANSCRIPTION_MODES
+        if mode and mode not in TRANSCRIPTION_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(TRANSCRIPTION_MODES)}")
+        asr_options = {key: value for key, value in (("mode", mode), ("language", language),
+                                                     ("latency_budget", latency_budget)) if value}
+
+        if file is not None:
+            from utils import save_upload_to_temp
+            temp_path, content_hash, file_size = await asyncio.to_thread(
+                save_upload_to_temp, file.file, filename=file.filename)
+            job = pipeline.jobs.create(user_id, file.filename)
+            if job is None:
+                os.remove(temp_path)
+                raise HTTPException(status_code=503, detail="Too many jobs in progress, retry later")
+            coroutine = pipeline.run_job(job["job_id"], user_id, file.filename, file.filename,
+                                         file_size, temp_path=temp_path, asr_options=asr_options)
+        else:
+            job = pipeline.jobs.create(user_id, url)
+            if job is None:
+                raise HTTPException(status_code=503, detail="Too many jobs in progress, retry later")
+            from utils import youtube_filename
+            coroutine = pipeline.run_job(job["job_id"], user_id, url, youtube_filename(), None,
+                                         asr_options=asr_options)
+
+        task = asyncio.create_task(coroutine)
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        return job
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str, user_id: str = Depends(require_user)):
+        job = pipeline.jobs.get(job_id)
+        if job is None or job["user_id"] != user_id:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    @app.get("/files/{file_id}/transcript")
+    async def get_transcript(file_id: int, user_id: str = Depends(require_user)):
+        transcript = await pipeline.storage(user_id, "get_transcript", file_id)
+        if transcript is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        return {"file_id": file_id, "transcript": transcript}
+
+    @app.get("/files/{file_id}/metadata")
+    async def get_metadata(file_id: int, user_id: str = Depends(require_user)):
+        details = await pipeline.storage(user_id, "get_file_details", file_id)
+        if details is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        metadata = await pipeline.storage(user_id, "get_metadata", file_id)
+        # The summary tree is an internal Q&A structure (and large); it isn't part of the metadata API
+        if metadata:
+            metadata = {key: value for key, value in metadata.items() if key != "summary_tree"}
+        return {"file_id": file_id, "metadata": metadata}
+
+    @app.delete("/files/{file_id}")
+    async def delete_file(file_id: int, user_id: str = Depends(require_user)):
+        result = await pipeline.storage(user_id, "delete_files", [file_id])
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail=result["error"])
+        if not result["deleted_ids"]:
+            raise HTTPException(status_code=404, detail="File not found")
+        pipeline.index_manager.evict((user_id, file_id))
+        return {"file_id": file_id, "deleted": True}
+
+    @app.post("/files/{file_id}/search")
+    async def search(file_id: int, request: SearchRequest, user_id: str = Depends(require_user)):
+        context = await pipeline.search_context(user_id, file_id, request.query, request.top_k)
+        return {"file_id": file_id, "query": request.query, "context": context}
+
+    @app.post("/files/{file_id}/qa")
+    async def ask(file_id: int, request: QuestionRequest, user_id: str = Depends(require_user),
+                  x_groq_api_key: Optional[str] = Header(None)):
+        groq_api_key = x_groq_api_key or pipeline.groq_api_key
+        if not groq_api_key:
+            raise HTTPException(status_code=400, detail="Groq API key required (X-Groq-Api-Key header)")
+
+        from answer_cache import get_answer_cache
+        # Retrieval is scoped to the user, so it also checks ownership before the cache is consulted
+        context = await pipeline.search_context(user_id, file_id, request.query, request.top_k)
+        answer_cache = get_answer_cache()
+        cache_key = f"{file_id}:smart"
+        cached, query_embedding = await asyncio.to_thread(answer_cache.lookup, cache_key, request.query)
+        if cached:
+            return {"file_id": file_id, "query": request.query, "answer": cached["answer"],
+                    "token_usage": None, "cached": True, "similarity": cached["similarity"]}
+
+        metadata = await pipeline.storage(user_id, "get_metadata", file_id)
+        answer, token_usage = await pipeline.answer(request.query, context, metadata, groq_api_key)
+        await asyncio.to_thread(answer_cache.store, cache_key, request.query, answer, token_usage, query_embedding)
+        if token_usage and token_usage.get("input_tokens"):
+            await pipeline.storage(user_id, "save_token_usage", file_id, "qa",
+                                   token_usage["input_tokens"], token_usage["output_tokens"],
+                                   token_usage["estimated_cost"])
+        return {"file_id": file_id, "query": request.query, "answer": answer,
+                "token_usage": token_usage, "cached": False, "similarity": None}
+
+    return app
+
+
+app = create_app()
@@ -2,14 +2,15 @@ import streamlit as st
 from transcribe import process_content
 from embed_store import store_embeddings, search_embeddings
 from qa_engine import answer_query, answer_query_with_metadata
-from utils import allowed_file, generate_video_metadata
-from supabase_storage import get_storage_manager
+from answer_cache import get_answer_cache
+from summary_tree import build_summary_tree, select_summary_context, is_tree_current, DEFAULT_DIRECT_CONTEXT_TOKENS
+from utils import allowed_file, generate_video_metadata, is_error_text, save_upload_to_temp, youtube_filename
+from streamlit_storage import get_session_storage, get_session_write_queue
 from supabase_auth import show_auth_ui
 import os
 import json
 import time
 import uuid
-from groq import Groq
 
 def initialize_session():
     """Initialize session state for user management."""
@@ -63,6 +64,7 @@ def show_login_section():
 def validate_groq_api_key(api_key):
     """Validate Groq API key by making a test request."""
     try:
+        from groq import Groq
         client = Groq(api_key=api_key)
         # Make a simple test request
         response = client.chat.completions.create(
@@ -106,6 +108,26 @@ def show_notification(message, notification_type="success", duration=10):
     </style>
     """, unsafe_allow_html=True)
 
+def current_file_id():
+    """Stored id of the file being analyzed; None until its background save has been written."""
+    if st.session_state.get('current_file_id') is None and st.session_state.get('pending_ingest_op'):
+        file_id = get_session_write_queue().file_id_for(st.session_state['pending_ingest_op'])
+        if file_id is not None:
+            st.session_state['current_file_id'] = file_id
+            st.session_state.pop('pending_ingest_op')
+    return st.session_state.get('current_file_id')
+
+def record_token_usage(operation, tokens):
+    """Queue token usage for the current file; rows are written in batches in the background."""
+    file_id = current_file_id()
+    file_ref = st.session_state.get('pending_ingest_op')
+    if not tokens or (file_id is None and file_ref is None):
+        return
+    get_session_write_queue().save_token_usage(
+        operation, tokens['input_tokens'], tokens['output_tokens'], tokens['estimated_cost'],
+        file_id=file_id, file_ref=file_ref if file_id is None else None
+    )
+
 # Initialize session
 initialize_session()
 
@@ -309,6 +331,8 @@ if 'current_query' not in st.session_state:
     st.session_state['current_query'] = None
 if 'qa_mode' not in st.session_state:
     st.session_state['qa_mode'] = None
+if 'summary_tree' not in st.session_state:
+    st.session_state['summary_tree'] = None
 
 # Step 1: Groq API Key Input
 st.markdown("## 🔑 Step 1: API Configuration")
@@ -391,6 +415,28 @@ with col2:
         help="Enter a valid YouTube video URL"
     )
 
+# Transcription settings (audio and video only)
+TRANSCRIPTION_LANGUAGES = {"Auto-detect": None, "English": "en", "Hindi": "hi", "Spanish": "es",
+                           "French": "fr", "German": "de", "Portuguese": "pt", "Japanese": "ja"}
+with st.expander("🎙️ Transcription Settings (audio & video)"):
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        transcription_mode = st.radio(
+            "Speed / accuracy:",
+            ["Balanced", "Preview (fastest)", "Final (most accurate)"],
+            help="Preview uses the tiny model with greedy decoding; Final uses the small model with beam search"
+        )
+    with col2:
+        transcription_language = st.selectbox(
+            "Spoken language:",
+            list(TRANSCRIPTION_LANGUAGES),
+            help="Choosing the language skips automatic detection"
+        )
+asr_options = {
+    "mode": transcription_mode.split()[0].lower(),
+    "language": TRANSCRIPTION_LANGUAGES[transcription_language]
+}
+
 # Processing button
 if (video_file or youtube_url) and groq_api_key:
     # Check if API key is validated
@@ -403,140 +449,121 @@ if (video_file or youtube_url) and groq_api_key:
             st.session_state['processing_complete'] = False
             st.session_state['embeddings_generated'] = False
             st.session_state['token_usage'] = {'input_tokens': 0, 'output_tokens': 0, 'estimated_cost': 0}
-            
-            # Initialize storage manager
-            storage_manager = get_storage_manager()
+            st.session_state.pop('current_file_id', None)
+            st.session_state.pop('pending_ingest_op', None)
+            st.session_state['summary_tree'] = None
             
             # Process content
             if video_file:
-                video_path = f"temp_{video_file.name}"
-                with open(video_path, "wb") as f:
-                    f.write(video_file.read())
+                # Stream the upload to a unique temp file in chunks, hashing as we go
+                video_path, content_hash, file_size = save_upload_to_temp(video_file)
+                st.session_state['current_content_hash'] = content_hash
                 st.info(f"📁 Processing uploaded file: {video_file.name}")
                 filename = video_file.name
-                file_size = video_file.size
                 source_url = None
             elif youtube_url:
                 video_path = youtube_url
                 st.info("📺 Processing YouTube URL...")
-                filename = f"youtube_{int(time.time())}.mp4"
+                filename = youtube_filename()
                 file_size = None
                 source_url = youtube_url
             
-            # Content processing
-            with st.spinner("🔄 Extracting content..."):
-                transcript = process_content(video_path)
+            try:
+                # Content processing
+                with st.spinner("🔄 Extracting content..."):
+                    transcript = process_content(video_path, filename, asr_options)
                 
-            if isinstance(transcript, str) and transcript.startswith("[Error:"):
-                st.error(transcript)
-            else:
-                st.session_state['transcript'] = transcript
-                st.success("✅ Content extraction complete!")
-                
-                # Save transcript to Supabase
-                with st.spinner("💾 Saving transcript to database..."):
-                    file_type = filename.split('.')[-1] if '.' in filename else 'unknown'
-                    # Ensure transcript is a string
-                    transcript_str = str(transcript) if transcript is not None else ""
-                    save_result = storage_manager.save_transcript(
-                        filename=filename,
-                        transcript=transcript_str,
-                        file_type=file_type,
-                        file_size=file_size,
-                        source_url=source_url
-                    )
-                    
-                    if save_result['success']:
-                        file_id = save_result['file_id']
-                        st.session_state['current_file_id'] = file_id
-                        st.success("✅ Transcript saved to database!")
-                    else:
-                        st.error(f"❌ Failed to save transcript: {save_result.get('error', 'Unknown error')}")
+                if is_error_text(transcript):
+                    st.error(transcript)
+                else:
+                    st.session_state['transcript'] = transcript
+                    st.success("✅ Content extraction complete!")
                 
-                # Generate metadata
-                with st.spinner("🧠 Generating comprehensive metadata..."):
-                    metadata = generate_video_metadata(transcript, groq_api_key)
-                    st.session_state['metadata'] = metadata
-                    
-                    # Update token usage if available
-                    if metadata and 'token_usage' in metadata:
-                        st.session_state['token_usage'] = metadata['token_usage']
+                    # Metadata and embeddings are derived from the transcript; if either fails,
+                    # the transcript is still saved below without it
+                    metadata = None
+                    try:
+                        with st.spinner("🧠 Generating comprehensive metadata..."):
+                            metadata = generate_video_metadata(transcript, groq_api_key)
+                            st.session_state['metadata'] = metadata
                         
-                st.success("✅ Metadata generation complete!")
-                
-                # Save metadata to Supabase
-                if 'current_file_id' in st.session_state and metadata and 'error' not in metadata:
-                    with st.spinner("💾 Saving metadata to database..."):
-                        # Remove token_usage from metadata before saving
-                        metadata_to_save = {k: v for k, v in metadata.items() if k != 'token_usage'}
-                        save_metadata_result = storage_manager.save_metadata(
-                            file_id=st.session_state['current_file_id'],
-                            metadata=metadata_to_save
-                        )
+                            # Update token usage if available
+                            if metadata and 'token_usage' in metadata:
+                                st.session_state['token_usage'] = metadata['token_usage']
                         
-                        if save_metadata_result['success']:
-                            st.success("✅ Metadata saved to database!")
-                        else:
-                            st.warning(f"⚠️ Failed to save metadata: {save_metadata_result.get('error', 'Unknown error')}")
+                        st.success("✅ Metadata generation complete!")
+                    except Exception as e:
+                        st.session_state['metadata'] = None
+                        st.error(f"❌ Metadata generation failed: {str(e)} - the transcript will be saved without it")
                 
-                # Generate embeddings automatically
-                with st.spinner("🔍 Generating embeddings for Q&A..."):
-                    store_embeddings(transcript)
-                    st.session_state['embeddings_generated'] = True
-                st.success("✅ Embeddings generated!")
+                    # Generate embeddings automatically
+                    try:
+                        with st.spinner("🔍 Generating embeddings for Q&A..."):
+                            store_embeddings(transcript)
+                            st.session_state['embeddings_generated'] = True
+                        st.success("✅ Embeddings generated!")
+                    except Exception as e:
+                        st.error(f"❌ Embedding generation failed: {str(e)} - the transcript will be saved without them")
                 
-                # Save embeddings to Supabase
-                if 'current_file_id' in st.session_state:
-                    with st.spinner("💾 Saving embeddings to database..."):
-                        # Get embeddings from embed_store
+                    # Save transcript, metadata, embeddings and token usage in one transaction
+                    with st.spinner("💾 Saving to database..."):
+                        file_type = filename.split('.')[-1] if '.' in filename else 'unknown'
+                        # Ensure transcript is a string
+                        transcript_str = str(transcript) if transcript is not None else ""
+                        
+                        # Remove token_usage from metadata before saving
+                        metadata_to_save = None
+                        if metadata and 'error' not in metadata:
+                            metadata_to_save = {k: v for k, v in metadata.items() if k != 'token_usage'}
+                        
+                        # Reuse the vectors already in the FAISS index instead of re-encoding
                         from embed_store import embedding_index, chunks_store
-                        if embedding_index is not None and chunks_store:
-                            # Convert FAISS index to list for storage
-                            embeddings_list = []
-                            for i, chunk in enumerate(chunks_store):
-                                # Get embedding for this chunk
-                                from sentence_transformers import SentenceTransformer
-                                model = SentenceTransformer('all-MiniLM-L6-v2')
-                                embedding = model.encode([chunk])[0].tolist()
-                                embeddings_list.append({
-                                    'chunk': chunk,
-                                    'embedding': embedding
-                                })
-                            
-                            save_embeddings_result = storage_manager.save_embeddings(
-                                file_id=st.session_state['current_file_id'],
-                                embeddings=embeddings_list,
-                                texts=chunks_store
-                            )
-                            
-                            if save_embeddings_result['success']:
-                                st.success("✅ Embeddings saved to database!")
-                            else:
-                                st.warning(f"⚠️ Failed to save embeddings: {save_embeddings_result.get('error', 'Unknown error')}")
-                
-                # Save token usage to Supabase
-                if 'current_file_id' in st.session_state and st.session_state['token_usage']['input_tokens'] > 0:
-                    storage_manager.save_token_usage(
-                        file_id=st.session_state['current_file_id'],
-                        operation="metadata_generation",
-                        input_tokens=st.session_state['token_usage']['input_tokens'],
-                        output_tokens=st.session_state['token_usage']['output_tokens'],
-                        estimated_cost=st.session_state['token_usage']['estimated_cost']
-                    )
+                        embeddings_list = None
+                        if st.session_state['embeddings_generated'] and embedding_index is not None and chunks_store:
+                            embeddings_list = [
+                                {'chunk': chunk, 'embedding': embedding_index.reconstruct(i).tolist()}
+                                for i, chunk in enumerate(chunks_store)
+                            ]
+                        
+                        usage_rows = []
+                        if st.session_state['token_usage']['input_tokens'] > 0:
+                            usage_rows.append({
+                                "operation": "metadata_generation",
+                                "input_tokens": st.session_state['token_usage']['input_tokens'],
+                                "output_tokens": st.session_state['token_usage']['output_tokens'],
+                                "estimated_cost": st.session_state['token_usage']['estimated_cost']
+                            })
+                        
+                        # Written in the background; later writes refer to the file through the op id
+                        st.session_state['pending_ingest_op'] = get_session_write_queue().ingest_content(
+                            filename=filename,
+                            transcript=transcript_str,
+                            file_type=file_type,
+                            file_size=file_size,
+                            source_url=source_url,
+                            metadata=metadata_to_save,
+                            embeddings=embeddings_list,
+                            texts=chunks_store if embeddings_list else None,
+                            token_usage=usage_rows
+                        )
+                        st.success("✅ Queued for saving - the file will appear under File Management shortly")
                 
-                # Mark processing as complete
-                st.session_state['processing_complete'] = True
+                    # Mark processing as complete
+                    st.session_state['processing_complete'] = True
                 
-                # Clean up temporary file
+                    st.success("🎉 All processing complete! Scroll down to view results.")
+            finally:
+                # Clean up the temporary upload on every exit path, including errors
                 if video_file and os.path.exists(video_path):
                     os.remove(video_path)
-                
-                st.success("🎉 All processing complete! Scroll down to view results.")
 
 # Display results if processing is complete
 if st.session_state['processing_complete'] and st.session_state['transcript']:
     st.markdown("## 📊 Analysis Results")
     
+    if get_session_write_queue().dead_letters():
+        st.warning("⚠️ Some changes could not be saved - see File Management to retry them")
+    
     # Create tabs for different sections
     tab1, tab2, tab3, tab4 = st.tabs(["📊 Metadata Analysis", "📝 Content", "🔍 Q&A", "🗂️ File Management"])
     
@@ -670,7 +697,7 @@ if st.session_state['processing_complete'] and st.session_state['transcript']:
         qa_mode = st.radio(
             "Choose Q&A Mode:",
             ["Smart Search (Recommended)", "Direct Analysis"],
-            help="Smart Search uses embeddings for precise answers. Direct Analysis uses the full content for comprehensive responses."
+            help="Smart Search uses embeddings for precise answers. Direct Analysis uses a layered summary of the whole content for comprehensive responses."
         )
         
         # Q&A interface using form to prevent tab jumping
@@ -684,7 +711,22 @@ if st.session_state['processing_complete'] and st.session_state['transcript']:
                 st.session_state['qa_mode'] = qa_mode
                 
                 # Process the Q&A
-                if qa_mode == "Smart Search (Recommended)" and st.session_state['embeddings_generated']:
+                use_smart_search = qa_mode == "Smart Search (Recommended)" and st.session_state['embeddings_generated']
+                answer_cache = get_answer_cache()
+                cache_key = None
+                cached = None
+                query_embedding = None
+                if current_file_id() is not None:
+                    cache_key = f"{current_file_id()}:{'smart' if use_smart_search else 'direct'}"
+                    cached, query_embedding = answer_cache.lookup(cache_key, user_query)
+                
+                if cached:
+                    # Near-duplicate question for this file - reuse the stored answer
+                    st.session_state['answer'] = cached['answer']
+                    st.session_state['answer_similarity'] = cached['similarity']
+                    st.session_state['context'] = f"(Reused answer to a similar question: \"{cached['query']}\")"
+                elif use_smart_search:
+                    st.session_state['answer_similarity'] = None
                     with st.spinner("🔍 Searching for relevant context..."):
                         context = search_embeddings(user_query)
                         st.session_state['context'] = context
@@ -692,25 +734,51 @@ if st.session_state['processing_complete'] and st.session_state['transcript']:
                     with st.spinner("🧠 Generating answer..."):
                         answer, qa_tokens = answer_query_with_metadata(user_query, context, st.session_state['metadata'], groq_api_key)
                         st.session_state['answer'] = answer
+                        if cache_key:
+                            answer_cache.store(cache_key, user_query, answer, qa_tokens, query_embedding)
                         
                         # Update total token usage
                         if qa_tokens:
                             st.session_state['token_usage']['input_tokens'] += qa_tokens['input_tokens']
                             st.session_state['token_usage']['output_tokens'] += qa_tokens['output_tokens']
                             st.session_state['token_usage']['estimated_cost'] += qa_tokens['estimated_cost']
+                            record_token_usage("qa", qa_tokens)
                 else:
-                    # Direct Analysis mode - use full content
-                    with st.spinner("🧠 Analyzing full content..."):
-                        full_content = st.session_state['transcript']
-                        answer, qa_tokens = answer_query_with_metadata(user_query, full_content, st.session_state['metadata'], groq_api_key)
+                    st.session_state['answer_similarity'] = None
+                    # Direct Analysis mode - bounded context from the file's summary tree
+                    full_content = st.session_state['transcript']
+                    if len(full_content) > DEFAULT_DIRECT_CONTEXT_TOKENS * 4 and not is_tree_current(st.session_state.get('summary_tree'), full_content):
+                        with st.spinner("🌳 Building summary tree (one-time per file)..."):
+                            summary_tree = build_summary_tree(full_content, groq_api_key)
+                        if 'error' in summary_tree:
+                            st.warning(f"⚠️ Summary tree unavailable, using the start of the content: {summary_tree['error']}")
+                        else:
+                            tree_tokens = summary_tree['token_usage']
+                            st.session_state['summary_tree'] = summary_tree
+                            st.session_state['token_usage']['input_tokens'] += tree_tokens['input_tokens']
+                            st.session_state['token_usage']['output_tokens'] += tree_tokens['output_tokens']
+                            st.session_state['token_usage']['estimated_cost'] += tree_tokens['estimated_cost']
+                            if current_file_id() is not None or st.session_state.get('pending_ingest_op'):
+                                get_session_write_queue().save_summary_tree(
+                                    summary_tree, file_id=current_file_id(),
+                                    file_ref=st.session_state.get('pending_ingest_op')
+                                )
+                                record_token_usage("summary_tree", tree_tokens)
+                    
+                    with st.spinner("🧠 Analyzing content..."):
+                        context = select_summary_context(st.session_state.get('summary_tree'), full_content, user_query)
+                        answer, qa_tokens = answer_query_with_metadata(user_query, context, st.session_state['metadata'], groq_api_key)
                         st.session_state['answer'] = answer
-                        st.session_state['context'] = "(Using full content for analysis)"
+                        st.session_state['context'] = context if context is not full_content else "(Using full content for analysis)"
+                        if cache_key:
+                            answer_cache.store(cache_key, user_query, answer, qa_tokens, query_embedding)
                         
                         # Update total token usage
                         if qa_tokens:
                             st.session_state['token_usage']['input_tokens'] += qa_tokens['input_tokens']
                             st.session_state['token_usage']['output_tokens'] += qa_tokens['output_tokens']
                             st.session_state['token_usage']['estimated_cost'] += qa_tokens['estimated_cost']
+                            record_token_usage("qa", qa_tokens)
                 
                 show_notification("✅ Answer generated successfully!", "success", 5)
                 st.success("✅ Answer ready!")
@@ -719,6 +787,8 @@ if st.session_state['processing_complete'] and st.session_state['transcript']:
         if st.session_state.get('answer'):
             st.markdown("### 💡 Answer")
             st.markdown(f"**{st.session_state['answer']}**")
+            if st.session_state.get('answer_similarity') is not None:
+                st.caption(f"♻️ Reused cached answer for a similar question (similarity {st.session_state['answer_similarity']:.2f}) - no API call made")
             
             # Show context used
             with st.expander("🔍 Show context used"):
@@ -733,6 +803,7 @@ if st.session_state['processing_complete'] and st.session_state['transcript']:
                 st.session_state['answer'] = None
                 st.session_state['current_query'] = None
                 st.session_state['context'] = None
+                st.session_state['answer_similarity'] = None
                 st.rerun()
         
         # Example questions
@@ -762,12 +833,14 @@ if st.session_state['processing_complete'] and st.session_state['transcript']:
         st.subheader("🗂️ File Management")
         
         # Initialize storage manager
-        storage_manager = get_storage_manager()
+        storage_manager = get_session_storage()
         
         # Search functionality
         st.markdown("### 🔍 Search Files")
-        search_query = st.text_input("Search by filename or content:", placeholder="Enter search terms...")
+        search_query = st.text_input("Search by filename or content:", placeholder="Enter search terms...",
+                                     help='Supports "exact phrases", OR, and -excluded words')
         
+        next_cursor = None
         if search_query:
             search_results = storage_manager.search_files(search_query)
             if search_results:
@@ -775,10 +848,13 @@ if st.session_state['processing_complete'] and st.session_state['transcript']:
             else:
                 st.info("No files found matching your search.")
         else:
-            # Show all files
-            all_files = storage_manager.get_all_files()
+            # Show one page of files; earlier page cursors are kept for "Previous"
+            page_cursors = st.session_state.setdefault('file_page_cursors', [None])
+            page = storage_manager.list_files(cursor=page_cursors[-1])
+            all_files = page["files"]
+            next_cursor = page["next_cursor"]
             if all_files:
-                st.success(f"Found {len(all_files)} files in database")
+                st.success(f"Showing page {len(page_cursors)} ({len(all_files)} files)")
             else:
                 st.info("No files found in database.")
         
@@ -804,17 +880,21 @@ if st.session_state['processing_complete'] and st.session_state['transcript']:
                         if file_data['source_url']:
                             st.markdown(f"**Source:** {file_data['source_url']}")
                         
-                        # Show transcript preview
-                        if file_data['transcript']:
-                            transcript_preview = file_data['transcript'][:200] + "..." if len(file_data['transcript']) > 200 else file_data['transcript']
+                        # Show where a search matched the content
+                        if file_data.get('snippet'):
+                            st.markdown(f"**Match:** ...{file_data['snippet']}...")
+                        
+                        # Show transcript preview (computed server-side)
+                        if file_data['transcript_preview']:
+                            transcript_preview = file_data['transcript_preview'] + "..." if (file_data['transcript_length'] or 0) > 200 else file_data['transcript_preview']
                             st.markdown(f"**Transcript Preview:** {transcript_preview}")
                     
                     with col2:
-                        # Action buttons
+                        # Action buttons - the full transcript is only fetched when needed
                         if st.button(f"📥 Download", key=f"download_{file_data['id']}"):
                             st.download_button(
                                 "📥 Download Transcript",
-                                file_data['transcript'],
+                                storage_manager.get_transcript(file_data['id']) or "",
                                 file_name=f"{file_data['filename']}_transcript.txt",
                                 mime="text/plain"
                             )
@@ -829,26 +909,54 @@ if st.session_state['processing_complete'] and st.session_state['transcript']:
                         # Load file for analysis
                         if st.button(f"📊 Analyze", key=f"analyze_{file_data['id']}"):
                             # Load transcript into session state
-                            st.session_state['transcript'] = file_data['transcript']
+                            transcript = storage_manager.get_transcript(file_data['id'])
+                            st.session_state['transcript'] = transcript
                             
                             # Load metadata
                             metadata = storage_manager.get_metadata(file_data['id'])
+                            st.session_state['summary_tree'] = metadata.get('summary_tree') if metadata else None
                             if metadata:
-                                st.session_state['metadata'] = metadata
+                                st.session_state['metadata'] = {k: v for k, v in metadata.items() if k != 'summary_tree'}
                             
                             # Load embeddings
                             embeddings_data = storage_manager.get_embeddings(file_data['id'])
                             if embeddings_data:
                                 # Reconstruct FAISS index
                                 from embed_store import store_embeddings
-                                store_embeddings(file_data['transcript'])
+                                store_embeddings(transcript)
                                 st.session_state['embeddings_generated'] = True
                             
                             st.session_state['processing_complete'] = True
                             st.session_state['current_file_id'] = file_data['id']
+                            st.session_state.pop('pending_ingest_op', None)
                             
                             st.success("✅ File loaded for analysis! Switch to other tabs to view results.")
                             st.rerun()
+            
+            # Bulk delete of the listed files
+            with st.expander("🗑️ Delete multiple files"):
+                file_labels = {f"{file_data['id']} - {file_data['filename']}": file_data['id'] for file_data in files_to_display}
+                selected_files = st.multiselect("Files to delete:", list(file_labels))
+                if selected_files and st.button(f"🗑️ Delete {len(selected_files)} files", type="primary"):
+                    delete_result = storage_manager.delete_files([file_labels[label] for label in selected_files])
+                    if delete_result['success']:
+                        st.success(f"✅ Deleted {len(delete_result['deleted_ids'])} files")
+                        st.rerun()
+                    else:
+                        st.error(f"❌ Error deleting files: {delete_result['error']}")
+            
+            # Page navigation (not used for search results)
+            if not search_query:
+                page_cursors = st.session_state['file_page_cursors']
+                col1, col2 = st.columns([1, 1])
+                with col1:
+                    if len(page_cursors) > 1 and st.button("⬅️ Previous page"):
+                        page_cursors.pop()
+                        st.rerun()
+                with col2:
+                    if next_cursor and st.button("Next page ➡️"):
+                        page_cursors.append(next_cursor)
+                        st.rerun()
         
         # Token usage summary
         st.markdown("### 💰 Token Usage Summary")
@@ -863,6 +971,45 @@ if st.session_state['processing_complete'] and st.session_state['transcript']:
             st.metric("Total Cost", f"${usage_summary['total_cost']:.4f}")
         with col4:
             st.metric("Operations", usage_summary['operations_count'])
+        
+        if usage_summary['operations_count']:
+            with st.expander("📊 Usage by operation"):
+                try:
+                    breakdown = storage_manager.get_token_usage_breakdown(group_by="operation")
+                    st.dataframe([{
+                        "Operation": row["group_key"] or "unknown",
+                        "Input Tokens": row["total_input_tokens"],
+                        "Output Tokens": row["total_output_tokens"],
+                        "Cost ($)": round(float(row["total_cost"]), 4),
+                        "Calls": row["operations_count"]
+                    } for row in breakdown], use_container_width=True)
+                except Exception as e:
+                    st.error(f"❌ Error fetching usage breakdown: {str(e)}")
+
+        session_queue = get_session_write_queue()
+        queue_stats = session_queue.stats()
+        if queue_stats['pending']:
+            st.caption(f"⏳ {queue_stats['pending']} changes waiting to be saved")
+        
+        failed_saves = session_queue.dead_letters()
+        if failed_saves:
+            st.error(f"❌ {len(failed_saves)} change(s) could not be saved")
+            for failed in failed_saves:
+                st.caption(f"• {failed['filename'] or failed['kind']}: {failed['error']}")
+            col_retry, col_dismiss = st.columns(2)
+            with col_retry:
+                if st.button("🔁 Retry failed saves", use_container_width=True):
+                    session_queue.requeue([failed['id'] for failed in failed_saves])
+                    st.rerun()
+            with col_dismiss:
+                if st.button("🗑️ Dismiss", use_container_width=True):
+                    session_queue.discard([failed['id'] for failed in failed_saves])
+                    st.rerun()
+        
+        if hasattr(storage_manager, "stats"):
+            cache_stats = storage_manager.stats()
+            st.caption(f"⚡ Storage cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                       f"({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['entries']} entries")
 
 # Cost estimation (placeholder - would need actual token counting)
 if st.session_state['token_usage']['input_tokens'] > 0:
@@ -0,0 +1,240 @@
+# asr.py
+
+import os
+import subprocess
+import threading
+import wave
+
+# Speech recognition backend: "whisper" (openai-whisper, PyTorch) or
+# "faster-whisper" (CTranslate2, int8 on CPU by default)
+DEFAULT_ASR_BACKEND = os.getenv("ASR_BACKEND", "whisper")
+DEFAULT_MODEL_SIZE = os.getenv("ASR_MODEL_SIZE", "base")
+FASTER_WHISPER_DEVICE = os.getenv("ASR_DEVICE", "cpu")
+FASTER_WHISPER_COMPUTE_TYPE = os.getenv("ASR_COMPUTE_TYPE", "int8")
+FASTER_WHISPER_CPU_THREADS = int(os.getenv("ASR_CPU_THREADS", "0"))  # 0 = library default
+DEFAULT_LANGUAGE = os.getenv("ASR_LANGUAGE") or None  # None = detect
+DEFAULT_MODE = os.getenv("ASR_MODE", "balanced")
+# Wall-clock seconds a transcription may take (0 = no limit)
+DEFAULT_LATENCY_BUDGET = float(os.getenv("ASR_LATENCY_BUDGET", "0"))
+
+# Whisper model sizes, smallest (fastest) first
+MODEL_SIZES = ["tiny", "base", "small", "medium", "large-v3"]
+
+# Rough CPU seconds per second of audio for openai-whisper in fp32
+MODEL_SECONDS_PER_AUDIO_SECOND = {"tiny": 0.08, "base": 0.15, "small": 0.45, "medium": 1.3, "large-v3": 2.6}
+# How much faster each backend is than openai-whisper on CPU
+BACKEND_SPEEDUP = {"whisper": 1.0, "faster-whisper": 4.0}
+
+# Whisper's own fallback schedule: retry at higher temperature when decoding fails
+TEMPERATURE_FALLBACK = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+# Speed/accuracy presets. "model_size" is the largest model the mode uses;
+# a latency budget can only move it down. beam_size is always explicit because
+# the backends differ when it's omitted (whisper decodes greedily, faster-whisper uses 5 beams).
+TRANSCRIPTION_MODES = {
+    "preview": {"model_size": "tiny", "beam_size": 1, "temperature": 0.0},
+    "balanced": {"model_size": DEFAULT_MODEL_SIZE, "beam_size": 1, "temperature": TEMPERATURE_FALLBACK},
+    "final": {"model_size": "small", "beam_size": 5, "temperature": TEMPERATURE_FALLBACK},
+}
+
+
+class ASRBackend:
+    """
+    Base class for speech recognition engines.
+
+    `transcribe` returns the same structure for every backend:
+        {"text": str, "language": str or None, "duration": float or None,
+         "segments": [{"start": float, "end": float, "text": str}, ...]}
+    Models are loaded on first use and cached per size for the process.
+    """
+
+    name = None
+
+    def __init__(self, model_size=DEFAULT_MODEL_SIZE):
+        self.model_size = model_size
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _load_model(self, model_size):
+        raise NotImplementedError
+
+    def get_model(self, model_size=None):
+        """Return the cached model for a size, loading it on first use."""
+        model_size = model_size or self.model_size
+        with self._lock:
+            if model_size not in self._models:
+                self._models[model_size] = self._load_model(model_size)
+            return self._models[model_size]
+
+    def transcribe(self, audio_path, model_size=None, **options):
+        raise NotImplementedError
+
+
+class WhisperBackend(ASRBackend):
+    """openai-whisper running on PyTorch."""
+
+    name = "whisper"
+
+    def _load_model(self, model_size):
+        import whisper
+        return whisper.load_model(model_size)
+
+    def transcribe(self, audio_path, model_size=None, **options):
+        model = self.get_model(model_size)
+        if model.device.type == "cpu":
+            # fp16 isn't supported on CPU; whisper would warn and fall back anyway
+            options.setdefault("fp16", False)
+        if options.get("beam_size") == 1:
+            # A single beam is plain greedy decoding, which whisper does faster without the beam search
+            options.pop("beam_size")
+        result = model.transcribe(audio_path, **options)
+        segments = [{"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+                    for segment in result.get("segments", [])]
+        return {
+            "text": result["text"],
+            "language": result.get("language"),
+            "duration": segments[-1]["end"] if segments else None,
+            "segments": segments
+        }
+
+
+class FasterWhisperBackend(ASRBackend):
+    """faster-whisper (CTranslate2) with int8 weights - several times faster on CPU."""
+
+    name = "faster-whisper"
+
+    def __init__(self, model_size=DEFAULT_MODEL_SIZE, device=FASTER_WHISPER_DEVICE,
+                 compute_type=FASTER_WHISPER_COMPUTE_TYPE, cpu_threads=FASTER_WHISPER_CPU_THREADS):
+        super().__init__(model_size)
+        self.device = device
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+
+    def _load_model(self, model_size):
+        from faster_whisper import WhisperModel
+        return WhisperModel(model_size, device=self.device, compute_type=self.compute_type,
+                            cpu_threads=self.cpu_threads)
+
+    def transcribe(self, audio_path, model_size=None, **options):
+        model = self.get_model(model_size)
+        # Segments are generated lazily; decoding happens while we iterate
+        segment_iter, info = model.transcribe(audio_path, **options)
+        segments = [{"start": segment.start, "end": segment.end, "text": segment.text}
+                    for segment in segment_iter]
+        return {
+            # Joined the way openai-whisper builds its text (segments keep their leading space)
+            "text": "".join(segment["text"] for segment in segments),
+            "language": info.language,
+            "duration": info.duration,
+            "segments": segments
+        }
+
+
+def estimate_transcription_seconds(model_size, duration, backend_name=DEFAULT_ASR_BACKEND):
+    """Rough wall-clock estimate for transcribing `duration` seconds of audio."""
+    per_second = MODEL_SECONDS_PER_AUDIO_SECOND.get(model_size, MODEL_SECONDS_PER_AUDIO_SECOND["base"])
+    return duration * per_second / BACKEND_SPEEDUP.get(backend_name, 1.0)
+
+
+def choose_model_size(max_model_size, duration=None, latency_budget=None, backend_name=DEFAULT_ASR_BACKEND):
+    """
+    Pick the largest model up to `max_model_size` whose estimated time for
+    `duration` seconds of audio fits the latency budget. Without a duration
+    or budget the ceiling is used as-is; if nothing fits, the smallest model is.
+    """
+    if not duration or not latency_budget or max_model_size not in MODEL_SIZES:
+        return max_model_size
+    candidates = MODEL_SIZES[:MODEL_SIZES.index(max_model_size) + 1]
+    for model_size in reversed(candidates):
+        if estimate_transcription_seconds(model_size, duration, backend_name) <= latency_budget:
+            return model_size
+    return MODEL_SIZES[0]
+
+
+def resolve_transcription_options(options=None, duration=None):
+    """
+    Turn per-job options into (backend_name, model_size, decode_options).
+
+    Recognised options: backend, mode ("preview", "balanced", "final"),
+    model_size (overrides the policy), language (skips detection when set),
+    beam_size, temperature and latency_budget (seconds).
+    """
+    options = dict(options or {})
+    backend_name = (options.get("backend") or DEFAULT_ASR_BACKEND).strip().lower()
+    mode = (options.get("mode") or DEFAULT_MODE).strip().lower()
+    if mode not in TRANSCRIPTION_MODES:
+        raise ValueError(f"Unknown transcription mode '{mode}' (choose from: {', '.join(TRANSCRIPTION_MODES)})")
+    preset = TRANSCRIPTION_MODES[mode]
+
+    model_size = options.get("model_size")
+    if not model_size:
+        latency_budget = options.get("latency_budget", DEFAULT_LATENCY_BUDGET)
+        model_size = choose_model_size(preset["model_size"], duration, latency_budget, backend_name)
+
+    decode_options = {}
+    language = options.get("language", DEFAULT_LANGUAGE)
+    if language and language.lower() != "auto":
+        # A known language skips the detection pass over the first 30 seconds
+        decode_options["language"] = language.lower()
+    beam_size = options.get("beam_size", preset["beam_size"])
+    if beam_size:
+        decode_options["beam_size"] = int(beam_size)
+    decode_options["temperature"] = options.get("temperature", preset["temperature"])
+    return backend_name, model_size, decode_options
+
+
+def probe_duration(file_path):
+    """Audio/video duration in seconds, or None if it can't be determined."""
+    try:
+        with wave.open(file_path, "rb") as audio:
+            return audio.getnframes() / float(audio.getframerate())
+    except (wave.Error, EOFError, OSError):
+        pass
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", file_path],
+            capture_output=True, text=True, check=True
+        )
+        return float(result.stdout.strip())
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError):
+        return None
+
+
+def transcribe_with_options(audio_path, options=None, duration=None):
+    """
+    Transcribe an audio file with per-job options and the speed/accuracy policy.
+    Returns the backend result plus the "model_size" and "backend" that were used.
+    """
+    options = options or {}
+    if duration is None and options.get("latency_budget", DEFAULT_LATENCY_BUDGET) and not options.get("model_size"):
+        duration = probe_duration(audio_path)
+    backend_name, model_size, decode_options = resolve_transcription_options(options, duration)
+    result = get_asr_backend(backend_name).transcribe(audio_path, model_size=model_size, **decode_options)
+    result["model_size"] = model_size
+    result["backend"] = backend_name
+    return result
+
+
+# name -> backend class
+ASR_BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+# One instance per backend name, so loaded models are reused across calls
+_backend_instances = {}
+_backend_lock = threading.Lock()
+
+
+def get_asr_backend(name=None):
+    """
+    Return the shared ASR backend, chosen by `name` or the ASR_BACKEND
+    environment variable. Raises ValueError for an unknown backend.
+    """
+    name = (name or DEFAULT_ASR_BACKEND).strip().lower()
+    if name not in ASR_BACKENDS:
+        raise ValueError(f"Unknown ASR backend '{name}' (choose from: {', '.join(sorted(ASR_BACKENDS))})")
+    with _backend_lock:
+        if name not in _backend_instances:
+            _backend_instances[name] = ASR_BACKENDS[name]()
+        return _backend_instances[name]
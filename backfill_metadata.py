@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Headless metadata backfill for content_files rows that have a transcript but
+no metadata yet.
+
+Streams pending rows page by page, generates metadata concurrently under the
+shared LLM scheduler's rate budget, and writes results in bulk. Progress is
+tracked through processing_status, so an interrupted run can simply be
+restarted: finished files are marked 'metadata_saved' and skipped, failures
+are marked 'metadata_failed' and only retried with --retry-failed.
+
+Usage:
+    python backfill_metadata.py --workers 4 --requests-per-minute 30
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+import llm_scheduler
+from llm_scheduler import LLMScheduler
+from supabase_storage import get_storage_manager
+from utils import generate_video_metadata, is_error_text
+
+load_dotenv()
+
+
+def iter_pending_files(storage_manager, page_size=100, include_failed=False):
+    """
+    Yield pending files one at a time, fetching them a page at a time.
+    Files whose transcript is a stored extraction error are marked
+    metadata_failed instead of being sent to the LLM.
+    """
+    after_id = 0
+    while True:
+        page = storage_manager.get_files_pending_metadata(after_id, page_size, include_failed)
+        if page["last_id"] is None:
+            return
+        unusable_ids = [row["id"] for row in page["rows"]
+                        if row.get("transcript") and is_error_text(row["transcript"])]
+        if unusable_ids:
+            storage_manager.update_processing_status(unusable_ids, "metadata_failed")
+        for row in page["rows"]:
+            if row.get("transcript") and row["id"] not in unusable_ids:
+                yield row
+        after_id = page["last_id"]
+
+
+def generate_for_file(row, groq_api_key):
+    """Generate metadata for one file row. Returns (row, metadata)."""
+    return row, generate_video_metadata(row["transcript"], groq_api_key)
+
+
+def flush_results(storage_manager, metadata_items, usage_rows, failed_ids):
+    """Write buffered results in bulk and clear the buffers."""
+    if metadata_items:
+        result = storage_manager.save_metadata_bulk(metadata_items)
+        if not result["success"]:
+            print(f"❌ Bulk metadata save failed: {result['error']}")
+            # Leave those files pending so the next run picks them up again
+            unsaved_ids = {item["file_id"] for item in metadata_items}
+            usage_rows[:] = [row for row in usage_rows if row["file_id"] not in unsaved_ids]
+    if usage_rows:
+        result = storage_manager.save_token_usage_bulk(usage_rows)
+        if not result["success"]:
+            print(f"⚠️ Token usage save failed: {result['error']}")
+    if failed_ids:
+        storage_manager.update_processing_status(failed_ids, "metadata_failed")
+    metadata_items.clear()
+    usage_rows.clear()
+    failed_ids.clear()
+
+
+def run_backfill(storage_manager, groq_api_key, workers=4, page_size=100, write_batch=25,
+                 max_files=None, max_cost=None, include_failed=False):
+    """
+    Process every pending file. Returns a summary dict with counts and cost.
+    """
+    summary = {"processed": 0, "saved": 0, "failed": 0, "cost": 0.0}
+    metadata_items, usage_rows, failed_ids = [], [], []
+    started = time.time()
+    budget_exhausted = False
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = iter_pending_files(storage_manager, page_size, include_failed)
+        in_flight = set()
+
+        def submit_next():
+            nonlocal budget_exhausted
+            if budget_exhausted or (max_files is not None and summary["processed"] + len(in_flight) >= max_files):
+                return False
+            if max_cost is not None and summary["cost"] >= max_cost:
+                budget_exhausted = True
+                print(f"💰 Cost budget of ${max_cost:.4f} reached - not starting new files")
+                return False
+            row = next(pending, None)
+            if row is None:
+                return False
+            in_flight.add(executor.submit(generate_for_file, row, groq_api_key))
+            return True
+
+        # Keep a bounded number of files in flight rather than loading the whole backlog
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+
+        while in_flight:
+            future = next(as_completed(in_flight))
+            in_flight.discard(future)
+            row, metadata = future.result()
+            summary["processed"] += 1
+
+            if not metadata or "error" in metadata:
+                error = metadata.get("error") if metadata else "No metadata returned"
+                print(f"❌ File {row['id']}: {error}")
+                failed_ids.append(row["id"])
+                summary["failed"] += 1
+            else:
+                usage = metadata.pop("token_usage", None)
+                metadata_items.append({"file_id": row["id"], "metadata": metadata})
+                summary["saved"] += 1
+                if usage:
+                    summary["cost"] += usage.get("estimated_cost", 0)
+                    usage_rows.append({
+                        "file_id": row["id"],
+                        "operation": "metadata_generation",
+                        "input_tokens": usage.get("input_tokens", 0),
+                        "output_tokens": usage.get("output_tokens", 0),
+                        "estimated_cost": usage.get("estimated_cost", 0),
+                        "user_id": row.get("user_id")
+                    })
+
+            if len(metadata_items) + len(failed_ids) >= write_batch:
+                flush_results(storage_manager, metadata_items, usage_rows, failed_ids)
+
+            if summary["processed"] % 10 == 0:
+                rate = summary["processed"] / max(time.time() - started, 1e-6)
+                print(f"🔄 {summary['processed']} processed ({summary['saved']} saved, "
+                      f"{summary['failed']} failed) - {rate:.2f} files/s, ${summary['cost']:.4f}")
+
+            submit_next()
+
+    flush_results(storage_manager, metadata_items, usage_rows, failed_ids)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill metadata for transcripts that have none.")
+    parser.add_argument("--groq-api-key", default=os.getenv("GROK_API_KEY"),
+                        help="Groq API key (defaults to GROK_API_KEY)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent metadata requests")
+    parser.add_argument("--page-size", type=int, default=100, help="Rows fetched per page")
+    parser.add_argument("--write-batch", type=int, default=25, help="Results buffered per bulk write")
+    parser.add_argument("--max-files", type=int, default=None, help="Stop after this many files")
+    parser.add_argument("--max-cost", type=float, default=None, help="Stop starting new files after this estimated cost (USD)")
+    parser.add_argument("--requests-per-minute", type=int, default=llm_scheduler.DEFAULT_REQUESTS_PER_MINUTE)
+    parser.add_argument("--tokens-per-minute", type=int, default=llm_scheduler.DEFAULT_TOKENS_PER_MINUTE)
+    parser.add_argument("--retry-failed", action="store_true", help="Also retry files marked metadata_failed")
+    args = parser.parse_args()
+
+    if not args.groq_api_key:
+        print("[Error: GROK_API_KEY not set]")
+        sys.exit(1)
+
+    # Size the shared scheduler for this run; every metadata call goes through it
+    llm_scheduler.scheduler = LLMScheduler(
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        max_concurrency=args.workers
+    )
+
+    storage_manager = get_storage_manager()
+    print("🚀 Starting metadata backfill")
+    summary = run_backfill(
+        storage_manager,
+        args.groq_api_key,
+        workers=args.workers,
+        page_size=args.page_size,
+        write_batch=args.write_batch,
+        max_files=args.max_files,
+        max_cost=args.max_cost,
+        include_failed=args.retry_failed
+    )
+    print(f"🎉 Backfill finished: {summary['processed']} processed, {summary['saved']} saved, "
+          f"{summary['failed']} failed, estimated cost ${summary['cost']:.4f}")
+    refreshed = storage_manager.refresh_usage_rollups()
+    if not refreshed["success"]:
+        print(f"⚠️ Could not refresh daily usage rollup: {refreshed['error']}")
+    print(f"📊 Scheduler stats: {llm_scheduler.scheduler.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for the app and its heavy dependencies.
+
+Each module is imported in a fresh interpreter with `python -X importtime`,
+so results are cold-start costs and don't hide behind modules that an
+earlier import already loaded.
+
+Usage:
+    python bench_imports.py
+    python bench_imports.py --repeat 3 transcribe embed_store
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Our modules, in the order app.py imports them
+APP_MODULES = [
+    "transcribe",
+    "asr",
+    "embed_store",
+    "qa_engine",
+    "answer_cache",
+    "summary_tree",
+    "utils",
+    "extractors",
+    "llm_scheduler",
+    "storage_backend",
+    "local_storage",
+    "storage_cache",
+    "streamlit_storage",
+    "write_queue",
+    "supabase_storage",
+    "supabase_auth",
+]
+
+# Third-party backends that should only load on first use
+HEAVY_MODULES = [
+    "streamlit",
+    "whisper",
+    "faster_whisper",
+    "torch",
+    "sentence_transformers",
+    "faiss",
+    "moviepy",
+    "yt_dlp",
+    "pandas",
+    "openpyxl",
+    "PyPDF2",
+    "docx",
+    "pptx",
+    "groq",
+    "supabase",
+    "numpy",
+]
+
+
+def measure_import(module, cwd):
+    """
+    Import one module in a fresh interpreter.
+    Returns (cumulative_ms, error) from the -X importtime report.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=cwd
+    )
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"
+        return None, last_line
+
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        # The top-level entry has no indentation before the module name
+        if len(parts) == 3 and parts[2] == module:
+            try:
+                cumulative_us = int(parts[1])
+            except ValueError:
+                pass
+    if cumulative_us is None:
+        return None, "no importtime entry"
+    return cumulative_us / 1000.0, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the cold import cost of each module.")
+    parser.add_argument("modules", nargs="*", help="Modules to measure (defaults to app and heavy modules)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per module; the fastest is reported")
+    args = parser.parse_args()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    modules = args.modules or APP_MODULES + HEAVY_MODULES
+
+    print(f"{'module':<24} {'import time':>12}")
+    print("-" * 37)
+    for module in modules:
+        timings = []
+        error = None
+        for _ in range(args.repeat):
+            elapsed, error = measure_import(module, repo_dir)
+            if elapsed is None:
+                break
+            timings.append(elapsed)
+        if timings:
+            print(f"{module:<24} {min(timings):>9.1f} ms")
+        else:
+            print(f"{module:<24} {'n/a':>12}  ({error})")
+
+
+if __name__ == "__main__":
+    main()
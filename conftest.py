@@ -0,0 +1,5 @@
+# conftest.py
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: needs a disposable PostgreSQL database (TEST_DATABASE_URL)")
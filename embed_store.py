@@ -1,66 +1,242 @@
 # embed_store.py
 
 
-import faiss
-from sentence_transformers import SentenceTransformer
-import numpy as np
-from utils import chunk_text
+import threading
+from collections import OrderedDict
+from utils import chunk_spans
 
 # In-memory store for demo (replace with persistent DB for production)
 embedding_index = None
 chunks_store = []
+chunk_offsets = []   # (start, end) of each chunk in source_text
+source_text = ""
 
-def store_embeddings(transcript):
+# Default prompt budget for retrieved context (1 token ≈ 4 characters)
+DEFAULT_CONTEXT_TOKENS = 1500
+
+# Shared encoder, loaded once per process instead of on every call
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+_embedding_model = None
+
+def get_embedding_model():
     """
-    Chunk transcript, generate embeddings, and store in FAISS index.
+    Return the shared SentenceTransformer encoder, loading it on first use.
     """
-    global embedding_index, chunks_store
-    chunks = chunk_text(transcript)
-    if not chunks:
-        raise ValueError("No chunks to embed from transcript.")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    embeddings = model.encode(chunks)
+    global _embedding_model
+    if _embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+        _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
+
+def encode_texts(texts):
+    """
+    Encode a list of texts into a 2-D float32 array of embeddings.
+    """
+    import numpy as np
+    embeddings = get_embedding_model().encode(texts)
     embeddings = np.asarray(embeddings, dtype=np.float32)
     if embeddings.ndim == 1:
         embeddings = embeddings.reshape(1, -1)
+    return embeddings
+
+def embed_transcript(transcript):
+    """
+    Chunk a transcript and embed every chunk without touching the global index.
+    Returns (spans, chunks, embeddings).
+    """
+    spans = chunk_spans(transcript)
+    chunks = [transcript[start:end] for start, end in spans]
+    if not chunks:
+        raise ValueError("No chunks to embed from transcript.")
+    embeddings = encode_texts(chunks)
     if embeddings.shape[0] == 0:
         raise ValueError("No embeddings to add to FAISS index.")
-    dim = embeddings.shape[1]
-    embedding_index = faiss.IndexFlatL2(dim)
-    embedding_index.add(embeddings)  # type: ignore
+    return spans, chunks, embeddings
+
+def store_embeddings(transcript):
+    """
+    Chunk transcript, generate embeddings, and store in FAISS index.
+    """
+    global embedding_index, chunks_store, chunk_offsets, source_text
+    spans, chunks, embeddings = embed_transcript(transcript)
+    embedding_index = _build_index(embeddings)
     chunks_store = chunks
+    chunk_offsets = spans
+    source_text = transcript
 
-def search_embeddings(query, top_k=5):
+def pack_context(spans, text, max_tokens=DEFAULT_CONTEXT_TOKENS):
     """
-    Search FAISS index for relevant transcript chunks.
-    Returns concatenated context string with improved fallback.
+    Assemble prompt context from retrieved chunk spans.
+    Spans are taken in relevance order while they fit the token budget,
+    overlapping or adjacent spans are merged so no text is sent twice,
+    and the merged passages are emitted in document order.
     """
-    global embedding_index, chunks_store
-    if embedding_index is None or not chunks_store:
-        return "(No embeddings found - please generate embeddings first)"
-    
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    query_emb = model.encode([query])
-    query_emb = np.asarray(query_emb, dtype=np.float32)
-    if query_emb.ndim == 1:
-        query_emb = query_emb.reshape(1, -1)
+    max_chars = max_tokens * 4
+    merged = []  # sorted, non-overlapping [start, end] intervals
+    used_chars = 0
+    for start, end in spans:
+        # Characters this span would add beyond what is already selected
+        new_chars = end - start
+        for m_start, m_end in merged:
+            new_chars -= max(0, min(end, m_end) - max(start, m_start))
+        if new_chars <= 0:
+            continue
+        if used_chars + new_chars > max_chars:
+            continue
+        used_chars += new_chars
+
+        # Insert and merge with anything it overlaps or touches
+        intervals = merged + [[start, end]]
+        intervals.sort()
+        merged = []
+        for interval in intervals:
+            if merged and interval[0] <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], interval[1])
+            else:
+                merged.append(list(interval))
+    if not merged and spans:
+        # Budget smaller than a single chunk - send the best chunk truncated
+        start, end = spans[0]
+        return text[start:min(end, start + max_chars)].strip()
+    return '\n---\n'.join(text[start:end].strip() for start, end in merged)
+
+def _build_index(embeddings):
+    """Build a FAISS index over a 2-D float32 embedding array."""
+    import faiss
+    index = faiss.IndexFlatL2(embeddings.shape[1])
+    index.add(embeddings)  # type: ignore
+    return index
+
+def _search_index(index, chunks, spans, text, query, top_k, max_tokens):
+    """Search one FAISS index and assemble the context string."""
+    query_emb = encode_texts([query])
     if query_emb.shape[0] == 0:
         return "(No embeddings found)"
     
-    D, I = embedding_index.search(query_emb, top_k)  # type: ignore
-    results = [chunks_store[i] for i in I[0] if i < len(chunks_store)]
+    D, I = index.search(query_emb, top_k)  # type: ignore
+    hit_ids = [i for i in I[0] if 0 <= i < len(chunks)]
+    results = [chunks[i] for i in hit_ids]
     
     # If no relevant context, return a sample of the content
     if not results or all(r.strip() == '' for r in results):
         # Return first few chunks as general context
-        sample_size = min(3, len(chunks_store))
+        sample_size = min(3, len(chunks))
         if sample_size > 0:
-            return f"(No specific matches found. Here's a sample of the content: {' '.join(chunks_store[:sample_size])})"
+            return f"(No specific matches found. Here's a sample of the content: {' '.join(chunks[:sample_size])})"
         else:
             return "(No content available for analysis)"
     
+    if spans and text:
+        return pack_context([spans[i] for i in hit_ids], text, max_tokens)
     return '\n---\n'.join(results)
 
+def search_embeddings(query, top_k=5, max_tokens=DEFAULT_CONTEXT_TOKENS):
+    """
+    Search FAISS index for relevant transcript chunks.
+    Returns a deduplicated context string within the token budget, with improved fallback.
+    """
+    global embedding_index, chunks_store
+    if embedding_index is None or not chunks_store:
+        return "(No embeddings found - please generate embeddings first)"
+    return _search_index(embedding_index, chunks_store, chunk_offsets, source_text, query, top_k, max_tokens)
+
+
+def context_from_matches(matches, max_tokens=DEFAULT_CONTEXT_TOKENS):
+    """
+    Build prompt context from chunks ranked in the database (match_chunks rows).
+    Whole chunks are taken in relevance order while they fit the token budget
+    (a chunk that doesn't fit is skipped, never cut) and emitted in document order.
+    The best match is always included.
+    """
+    max_chars = max_tokens * 4
+    separator = '\n---\n'
+    selected = []
+    used_chars = 0
+    for match in matches:
+        content = match["content"].strip()
+        cost = len(content) + (len(separator) if selected else 0)
+        if selected and used_chars + cost > max_chars:
+            continue
+        selected.append({**match, "content": content})
+        used_chars += cost
+    selected.sort(key=lambda match: (match["file_id"], match["chunk_index"]))
+    return separator.join(match["content"] for match in selected)
+
+class IndexManager:
+    """
+    Keeps per-file FAISS indexes warm in an LRU, so a long-running service can
+    answer searches for many files without rebuilding indexes on every request
+    or sharing the single module-level index.
+    """
+
+    def __init__(self, max_files=32):
+        self.max_files = max_files
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, chunks, embeddings, text=None):
+        """Index a file's chunk embeddings under `key`."""
+        import numpy as np
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        # Offsets can be recovered when the transcript was chunked the default way
+        spans = chunk_spans(text) if text else []
+        if len(spans) != len(chunks):
+            spans = []
+        entry = {"index": _build_index(embeddings), "chunks": list(chunks), "spans": spans, "text": text}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_files:
+                self._entries.popitem(last=False)
+        return entry
+
+    def put_transcript(self, key, transcript):
+        """Chunk, embed and index a transcript."""
+        _, chunks, embeddings = embed_transcript(transcript)
+        return self.put(key, chunks, embeddings, transcript)
+
+    def put_stored(self, key, embeddings_data, transcript=None):
+        """Index embeddings in the format saved by SupabaseStorageManager.save_embeddings."""
+        items = embeddings_data.get("embeddings") or []
+        chunks = [item["chunk"] for item in items]
+        vectors = [item["embedding"] for item in items]
+        if not chunks:
+            raise ValueError("No stored embeddings to index.")
+        return self.put(key, chunks, vectors, transcript)
+
+    def get(self, key):
+        """Return the cached entry for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def evict(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def search(self, key, query, top_k=5, max_tokens=DEFAULT_CONTEXT_TOKENS):
+        """Search one file's index. Returns None if the file is not loaded."""
+        entry = self.get(key)
+        if entry is None:
+            return None
+        return _search_index(entry["index"], entry["chunks"], entry["spans"], entry["text"],
+                             query, top_k, max_tokens)
+
+
+# Global index manager instance
+index_manager = None
+
+def get_index_manager() -> IndexManager:
+    """Get or create global index manager instance."""
+    global index_manager
+    if index_manager is None:
+        index_manager = IndexManager()
+    return index_manager
+
 # def search_embeddings(query):
 #     """
 #     Search vector DB for relevant transcript chunks.
@@ -0,0 +1,209 @@
+# extractors.py
+
+import importlib
+import os
+import zipfile
+
+# Bytes read from the start of a file for signature sniffing
+SNIFF_BYTES = 4096
+
+
+class Extractor:
+    """
+    A registered content extractor.
+
+    `handler` is a "module:function" path imported on first use, so heavy
+    backends (PyPDF2, whisper, moviepy, ...) are only loaded for files that
+    need them. `cost_per_mb` is a rough processing-time hint in seconds per MB.
+    """
+
+    def __init__(self, name, category, handler, extensions=(), mime_types=(), cost_per_mb=1.0):
+        self.name = name
+        self.category = category
+        self.handler = handler
+        self.extensions = tuple(extensions)
+        self.mime_types = tuple(mime_types)
+        self.cost_per_mb = cost_per_mb
+        self._function = None
+
+    def load(self):
+        """Import the backend and return the extraction function."""
+        if self._function is None:
+            module_name, function_name = self.handler.split(":")
+            self._function = getattr(importlib.import_module(module_name), function_name)
+        return self._function
+
+    def extract(self, file_path, **options):
+        """Run the extractor on a file. Extra options go to the handler as keyword arguments."""
+        return self.load()(file_path, **options)
+
+    def estimate_seconds(self, file_path):
+        """Rough processing time estimate for a file."""
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        return size_mb * self.cost_per_mb
+
+
+# name -> Extractor
+_registry = {}
+
+
+def register_extractor(name, category, handler, extensions=(), mime_types=(), cost_per_mb=1.0):
+    """Register (or replace) an extractor for a file type."""
+    extractor = Extractor(name, category, handler, extensions or (name,), mime_types, cost_per_mb)
+    _registry[name] = extractor
+    return extractor
+
+
+def get_extractor(file_type):
+    """Return the extractor registered for a file type name, or None."""
+    return _registry.get(file_type)
+
+
+def supported_extensions():
+    """All file extensions with a registered extractor."""
+    return sorted({ext for extractor in _registry.values() for ext in extractor.extensions})
+
+
+# Documents
+register_extractor("pdf", "document", "utils:extract_text_from_pdf",
+                   mime_types=("application/pdf",), cost_per_mb=0.5)
+register_extractor("docx", "document", "utils:extract_text_from_docx",
+                   mime_types=("application/vnd.openxmlformats-officedocument.wordprocessingml.document",), cost_per_mb=0.2)
+register_extractor("doc", "document", "utils:extract_text_from_docx",
+                   mime_types=("application/msword",), cost_per_mb=0.2)
+register_extractor("pptx", "document", "utils:extract_text_from_ppt",
+                   mime_types=("application/vnd.openxmlformats-officedocument.presentationml.presentation",), cost_per_mb=0.3)
+register_extractor("ppt", "document", "utils:extract_text_from_ppt",
+                   mime_types=("application/vnd.ms-powerpoint",), cost_per_mb=0.3)
+register_extractor("xlsx", "document", "utils:extract_text_from_excel",
+                   mime_types=("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",), cost_per_mb=0.3)
+register_extractor("xls", "document", "utils:extract_text_from_excel",
+                   mime_types=("application/vnd.ms-excel",), cost_per_mb=0.3)
+register_extractor("txt", "document", "utils:extract_text_from_txt",
+                   mime_types=("text/plain",), cost_per_mb=0.01)
+
+# Audio - Whisper transcription dominates (~1 MB per minute of audio)
+register_extractor("wav", "audio", "transcribe:transcribe_audio_file",
+                   mime_types=("audio/x-wav", "audio/wav", "audio/vnd.wave"), cost_per_mb=1.0)
+register_extractor("mp3", "audio", "transcribe:transcribe_audio_file",
+                   mime_types=("audio/mpeg", "audio/mp3"), cost_per_mb=6.0)
+register_extractor("m4a", "audio", "transcribe:transcribe_audio_file",
+                   mime_types=("audio/x-m4a", "audio/mp4", "audio/m4a"), cost_per_mb=6.0)
+
+# Video - audio extraction plus transcription
+register_extractor("mp4", "video", "transcribe:transcribe_video_file",
+                   mime_types=("video/mp4",), cost_per_mb=2.0)
+register_extractor("mov", "video", "transcribe:transcribe_video_file",
+                   mime_types=("video/quicktime",), cost_per_mb=2.0)
+register_extractor("avi", "video", "transcribe:transcribe_video_file",
+                   mime_types=("video/x-msvideo", "video/avi"), cost_per_mb=2.0)
+register_extractor("mkv", "video", "transcribe:transcribe_video_file",
+                   mime_types=("video/x-matroska", "video/webm"), cost_per_mb=2.0)
+
+
+def _extension(filename):
+    return filename.rsplit('.', 1)[-1].lower() if '.' in os.path.basename(filename) else None
+
+
+def _magic_mime(file_path):
+    """MIME type from libmagic, or None if python-magic/libmagic is unavailable."""
+    try:
+        import magic
+        return magic.from_file(file_path, mime=True)
+    except Exception:
+        return None
+
+
+def _sniff_zip(file_path):
+    """Tell Office Open XML formats apart by their top-level folders."""
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            names = archive.namelist()
+    except zipfile.BadZipFile:
+        return None
+    if any(name.startswith("word/") for name in names):
+        return "docx"
+    if any(name.startswith("ppt/") for name in names):
+        return "pptx"
+    if any(name.startswith("xl/") for name in names):
+        return "xlsx"
+    return None
+
+
+def _sniff_signature(header, file_path, claimed):
+    """Identify a file from its leading bytes without libmagic."""
+    if header.startswith(b"%PDF"):
+        return "pdf"
+    if header.startswith(b"PK\x03\x04"):
+        return _sniff_zip(file_path)
+    if header.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        # Legacy OLE container - can't cheaply tell doc/xls/ppt apart
+        return claimed if claimed in ("doc", "xls", "ppt") else "doc"
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"RIFF" and header[8:12] == b"AVI ":
+        return "avi"
+    if header.startswith(b"ID3") or header[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "mp3"
+    if header[4:8] == b"ftyp":
+        brand = header[8:12]
+        if brand.startswith(b"M4A"):
+            return "m4a"
+        if brand == b"qt  ":
+            return "mov"
+        # Generic ISO brands are used by both audio-only and video files
+        return claimed if claimed in ("mp4", "m4a", "mov") else "mp4"
+    if header.startswith(b"\x1a\x45\xdf\xa3"):
+        return "mkv"
+    if header and b"\x00" not in header:
+        try:
+            header.decode("utf-8")
+            return "txt"
+        except UnicodeDecodeError:
+            # A multi-byte character may be cut at the sniff boundary
+            try:
+                header[:-3].decode("utf-8")
+                return "txt"
+            except UnicodeDecodeError:
+                return None
+    return None
+
+
+def sniff_file_type(file_path, claimed=None):
+    """
+    Identify a file's type from its content. Uses libmagic when available and
+    falls back to built-in signatures. Returns a registered type name or None.
+    """
+    with open(file_path, "rb") as file:
+        header = file.read(SNIFF_BYTES)
+
+    mime = _magic_mime(file_path)
+    if mime:
+        matches = [name for name, extractor in _registry.items() if mime in extractor.mime_types]
+        if claimed in matches:
+            return claimed
+        # Container formats (zip/OLE/ISO media) need a closer look
+        if len(matches) == 1 and mime not in ("video/mp4", "application/msword"):
+            return matches[0]
+        if mime.startswith("text/") and not matches:
+            return "txt"
+    return _sniff_signature(header, file_path, claimed)
+
+
+def resolve_extractor(file_path, filename=None):
+    """
+    Pick the extractor for a file by content, not by name.
+    A mislabelled file is routed by what it actually contains; content that
+    matches no supported format raises ValueError before any heavy work starts.
+    """
+    claimed = _extension(filename or file_path)
+    if not os.path.exists(file_path):
+        raise ValueError(f"File not found: {os.path.basename(file_path)}")
+    if os.path.getsize(file_path) == 0:
+        raise ValueError("File is empty")
+
+    sniffed = sniff_file_type(file_path, claimed)
+    if sniffed is None or sniffed not in _registry:
+        label = f".{claimed}" if claimed else "unknown"
+        raise ValueError(f"File content does not match any supported format (file type: {label})")
+    return _registry[sniffed]
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Headless batch ingestion for directories, globs and lists of YouTube URLs.
+
+Each source goes through the same pipeline as the Streamlit app: extract or
+transcribe the content, generate metadata and embeddings, and save them with
+the transcript and token usage in one transaction. CPU-heavy stages (extraction,
+transcription, embedding) run in a process pool; network stages (YouTube
+downloads, Groq calls, Supabase writes) run as asyncio tasks under a
+concurrency cap. Completed sources are appended to a JSONL state file, so
+re-running the same command resumes where it stopped.
+
+Usage:
+    python ingest_cli.py ./archive "./more/**/*.pdf" --urls urls.txt --workers 2
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from tqdm import tqdm
+
+load_dotenv()
+
+DEFAULT_STATE_FILE = ".ingest_state.jsonl"
+
+
+def discover_sources(paths, urls_file=None):
+    """
+    Expand directories (recursively), globs and plain files into a sorted list
+    of supported files, followed by the URLs listed in urls_file.
+    """
+    from extractors import supported_extensions
+    extensions = set(supported_extensions())
+
+    def is_supported(path):
+        return os.path.isfile(path) and path.rsplit('.', 1)[-1].lower() in extensions
+
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.update(os.path.join(root, name) for name in names
+                             if is_supported(os.path.join(root, name)))
+        elif os.path.isfile(path):
+            files.add(path)
+        else:
+            files.update(match for match in glob.glob(path, recursive=True) if is_supported(match))
+
+    sources = [os.path.abspath(path) for path in sorted(files)]
+    if urls_file:
+        with open(urls_file, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    sources.append(line)
+    return sources
+
+
+def source_key(source):
+    """Identity used for resume: URLs as-is, files by path, size and mtime."""
+    if source.startswith('http'):
+        return source
+    stat = os.stat(source)
+    return f"{source}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def client_op_id_for(key, owner_id):
+    """
+    Idempotency key for saving a source: stable across runs, so a source that
+    was saved but not yet recorded in the state file isn't saved twice.
+    """
+    return "ingest:" + hashlib.sha256(f"{owner_id}:{key}".encode("utf-8")).hexdigest()
+
+
+def load_completed(state_file):
+    """Return the set of source keys already saved (including those saved without metadata or embeddings)."""
+    completed = set()
+    if not os.path.exists(state_file):
+        return completed
+    with open(state_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written last line after a crash
+            if entry.get("status") in ("done", "done_with_errors"):
+                completed.add(entry["key"])
+    return completed
+
+
+# Process-pool workers (top level so they can be pickled)
+
+def _extract_worker(file_path, filename, asr_options=None):
+    from transcribe import process_content
+    return process_content(file_path, filename, asr_options)
+
+
+def _embed_worker(transcript):
+    from embed_store import embed_transcript
+    _, chunks, embeddings = embed_transcript(transcript)
+    return chunks, embeddings.tolist()
+
+
+class IngestRunner:
+    """Runs the ingestion pipeline for many sources with bounded concurrency."""
+
+    def __init__(self, storage_manager, groq_api_key, workers=2, io_concurrency=8,
+                 with_metadata=True, with_embeddings=True, state_file=DEFAULT_STATE_FILE, asr_options=None):
+        self.storage_manager = storage_manager
+        self.groq_api_key = groq_api_key
+        self.workers = workers
+        self.io_concurrency = io_concurrency
+        self.with_metadata = with_metadata
+        self.with_embeddings = with_embeddings
+        self.state_file = state_file
+        self.asr_options = asr_options
+        self.summary = {"done": 0, "incomplete": 0, "failed": 0, "skipped": 0, "cost": 0.0}
+
+    def _record(self, key, source, status, **extra):
+        """Append one result to the resume state file."""
+        with open(self.state_file, 'a', encoding='utf-8') as file:
+            file.write(json.dumps({"key": key, "source": source, "status": status,
+                                   "at": time.time(), **extra}) + "\n")
+
+    async def _io(self, function, *args, **kwargs):
+        """Run a blocking network call in a thread under the I/O concurrency cap."""
+        async with self._io_slots:
+            return await asyncio.to_thread(function, *args, **kwargs)
+
+    async def _cpu(self, function, *args):
+        """Run a CPU-heavy stage in the process pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, function, *args)
+
+    async def ingest_one(self, source, key=None):
+        """Ingest a single file or URL. Returns (status, detail)."""
+        from transcribe import download_youtube_video
+        from utils import generate_video_metadata, is_error_text, youtube_filename
+
+        is_url = source.startswith('http')
+        if is_url:
+            file_path = await self._io(download_youtube_video, source)
+            if file_path.startswith('['):
+                return "failed", file_path
+            filename = youtube_filename()
+            file_size = None
+        else:
+            file_path = source
+            filename = os.path.basename(source)
+            file_size = os.path.getsize(source)
+
+        try:
+            transcript = await self._cpu(_extract_worker, file_path, filename, self.asr_options)
+        finally:
+            if is_url and os.path.exists(file_path):
+                os.remove(file_path)
+        if is_error_text(transcript):
+            return "failed", transcript
+
+        # Metadata (network) and embeddings (CPU) for the same file run side by side
+        stages = []
+        if self.with_metadata:
+            stages.append(self._io(generate_video_metadata, transcript, self.groq_api_key))
+        if self.with_embeddings:
+            stages.append(self._cpu(_embed_worker, transcript))
+        results = await asyncio.gather(*stages, return_exceptions=True)
+
+        problems = []
+        metadata = None
+        usage_rows = []
+        if self.with_metadata:
+            generated = results.pop(0)
+            if isinstance(generated, Exception) or "error" in generated:
+                problems.append(f"metadata: {generated if isinstance(generated, Exception) else generated['error']}")
+            else:
+                usage = generated.pop("token_usage", None)
+                metadata = generated
+                if usage:
+                    self.summary["cost"] += usage.get("estimated_cost", 0)
+                    usage_rows.append({"operation": "metadata_generation",
+                                       "input_tokens": usage.get("input_tokens", 0),
+                                       "output_tokens": usage.get("output_tokens", 0),
+                                       "estimated_cost": usage.get("estimated_cost", 0)})
+        chunks = embeddings_list = None
+        if self.with_embeddings:
+            embedded = results.pop(0)
+            if isinstance(embedded, Exception):
+                problems.append(f"embeddings: {embedded}")
+            else:
+                chunks, embeddings = embedded
+                embeddings_list = [{'chunk': chunk, 'embedding': embedding}
+                                   for chunk, embedding in zip(chunks, embeddings)]
+
+        # Everything for this file is written in one transaction
+        file_type = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'unknown'
+        saved = await self._io(self.storage_manager.ingest_content, filename=filename,
+                               transcript=transcript, file_type=file_type,
+                               file_size=file_size, source_url=source if is_url else None,
+                               metadata=metadata, embeddings=embeddings_list, texts=chunks,
+                               token_usage=usage_rows,
+                               client_op_id=client_op_id_for(key or source_key(source),
+                                                             self.storage_manager._get_owner_id()))
+        if not saved["success"]:
+            return "failed", saved.get("error", "Failed to save content")
+        file_id = saved["file_id"]
+
+        # The file is saved either way; re-running must not ingest it again
+        if problems:
+            return "done_with_errors", {"file_id": file_id, "problems": problems}
+        return "done", file_id
+
+    async def run(self, sources):
+        """Ingest all sources that are not already recorded as done."""
+        completed = load_completed(self.state_file)
+        pending = []
+        for source in sources:
+            try:
+                key = source_key(source)
+            except OSError as e:
+                print(f"❌ {source}: {e}")
+                self.summary["failed"] += 1
+                continue
+            if key in completed:
+                self.summary["skipped"] += 1
+            else:
+                pending.append((key, source))
+
+        self._io_slots = asyncio.Semaphore(self.io_concurrency)
+        # Only as many sources in flight as the CPU pool can keep busy, plus one queued each
+        in_flight = asyncio.Semaphore(self.workers * 2)
+        progress = tqdm(total=len(pending), unit="file", desc="Ingesting")
+
+        async def guarded(key, source):
+            async with in_flight:
+                try:
+                    status, detail = await self.ingest_one(source, key)
+                except Exception as e:
+                    status, detail = "failed", str(e)
+            if status == "done":
+                self.summary["done"] += 1
+                self._record(key, source, status, file_id=detail)
+            elif status == "done_with_errors":
+                self.summary["done"] += 1
+                self.summary["incomplete"] += 1
+                self._record(key, source, status, **detail)
+                tqdm.write(f"⚠️ {source}: saved as file {detail['file_id']} without "
+                           + "; ".join(detail["problems"]))
+            else:
+                self.summary["failed"] += 1
+                self._record(key, source, status, error=str(detail)[:500])
+                tqdm.write(f"❌ {source}: {detail}")
+            progress.update(1)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            self._pool = pool
+            await asyncio.gather(*(guarded(key, source) for key, source in pending))
+        progress.close()
+        return self.summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory, glob or URL list into the content library.")
+    parser.add_argument("sources", nargs="*", help="Directories, glob patterns or files")
+    parser.add_argument("--urls", help="File with one YouTube URL per line")
+    parser.add_argument("--user-id", default=os.getenv("INGEST_USER_ID", "cli_ingest"),
+                        help="Owner user_id for the ingested files")
+    parser.add_argument("--groq-api-key", default=os.getenv("GROK_API_KEY"),
+                        help="Groq API key (defaults to GROK_API_KEY)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Processes for extraction, transcription and embedding")
+    parser.add_argument("--io-concurrency", type=int, default=8,
+                        help="Concurrent downloads, API calls and database writes")
+    parser.add_argument("--no-metadata", action="store_true", help="Skip metadata generation")
+    parser.add_argument("--no-embeddings", action="store_true", help="Skip embeddings")
+    parser.add_argument("--state-file", default=DEFAULT_STATE_FILE, help="Resume state (JSONL)")
+    parser.add_argument("--asr-mode", choices=["preview", "balanced", "final"],
+                        help="Transcription speed/accuracy preset (defaults to ASR_MODE)")
+    parser.add_argument("--language", help="Spoken language code (e.g. en); skips language detection")
+    parser.add_argument("--latency-budget", type=float,
+                        help="Seconds a single transcription may take; picks a smaller model for long audio")
+    args = parser.parse_args()
+
+    sources = discover_sources(args.sources, args.urls)
+    if not sources:
+        print("[Error: No supported files or URLs found]")
+        sys.exit(1)
+    if not args.no_metadata and not args.groq_api_key:
+        print("[Error: GROK_API_KEY not set - pass --groq-api-key or use --no-metadata]")
+        sys.exit(1)
+
+    from supabase_storage import get_storage_manager
+    storage_manager = get_storage_manager()
+    storage_manager.set_current_user(args.user_id)
+
+    runner = IngestRunner(
+        storage_manager,
+        args.groq_api_key,
+        workers=args.workers,
+        io_concurrency=args.io_concurrency,
+        with_metadata=not args.no_metadata,
+        with_embeddings=not args.no_embeddings,
+        state_file=args.state_file,
+        asr_options={key: value for key, value in (("mode", args.asr_mode), ("language", args.language),
+                                                   ("latency_budget", args.latency_budget)) if value}
+    )
+    print(f"🚀 Ingesting {len(sources)} sources with {args.workers} workers")
+    summary = asyncio.run(runner.run(sources))
+    print(f"🎉 Ingestion finished: {summary['done']} done ({summary['incomplete']} without metadata or embeddings), "
+          f"{summary['failed']} failed, "
+          f"{summary['skipped']} already ingested, estimated cost ${summary['cost']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# llm_scheduler.py
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Default budgets (Groq free tier is roughly 30 requests / 6000 tokens per minute)
+DEFAULT_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "4"))
+DEFAULT_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "5"))
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_request_tokens(messages, max_tokens=0):
+    """
+    Rough token estimate for a chat request (1 token ≈ 4 characters),
+    including the completion budget.
+    """
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // 4 + (max_tokens or 0)
+
+
+def _default_client_factory(api_key):
+    """Build a Groq client with SDK retries disabled - the scheduler owns retries."""
+    from groq import Groq
+    return Groq(api_key=api_key, max_retries=0)
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` units and refills continuously
+    at `refill_per_second`. Not thread-safe on its own; callers hold a lock.
+    """
+
+    def __init__(self, capacity, refill_per_second, clock=time.monotonic):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated_at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units are available (0 if available now)."""
+        self._refill()
+        amount = min(float(amount), self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        if self.refill_per_second <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount):
+        """Take units from the bucket; may go negative to record debt."""
+        self._refill()
+        self.tokens -= min(float(amount), self.capacity)
+
+    def refund(self, amount):
+        """Give units back, e.g. when a request was over-estimated."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + float(amount))
+
+
+class _KeyBudget:
+    """Request and token buckets for one API key."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute, clock):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0, clock)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0, clock)
+        self.blocked_until = 0.0
+
+
+class LLMScheduler:
+    """
+    Central gate for all Groq chat completions.
+
+    Every call waits for its API key's request/token budget, runs under a
+    global concurrency cap, and is retried with jittered exponential backoff
+    on rate limits and transient server errors (honouring Retry-After).
+    `client_factory`, `sleep` and `clock` are injectable so the scheduler can
+    be exercised against a fake server.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=1.0, max_delay=60.0,
+                 client_factory=None, sleep=time.sleep, clock=time.monotonic):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.client_factory = client_factory or _default_client_factory
+        self.sleep = sleep
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._budgets = {}
+        self._clients = {}
+        self._concurrency = threading.BoundedSemaphore(max_concurrency)
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failures": 0, "waited_seconds": 0.0}
+
+    def _count(self, name, amount=1):
+        """Update a stats counter (callers run on many threads)."""
+        with self._lock:
+            self.stats[name] += amount
+
+    def _budget(self, api_key):
+        budget = self._budgets.get(api_key)
+        if budget is None:
+            budget = _KeyBudget(self.requests_per_minute, self.tokens_per_minute, self.clock)
+            self._budgets[api_key] = budget
+        return budget
+
+    def _client(self, api_key):
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                client = self.client_factory(api_key)
+                self._clients[api_key] = client
+            return client
+
+    def _acquire_budget(self, api_key, estimated_tokens):
+        """Block until the key has one request and `estimated_tokens` available."""
+        while True:
+            with self._lock:
+                budget = self._budget(api_key)
+                wait = max(budget.blocked_until - self.clock(),
+                           budget.requests.wait_time(1),
+                           budget.tokens.wait_time(estimated_tokens))
+                if wait <= 0:
+                    budget.requests.consume(1)
+                    budget.tokens.consume(estimated_tokens)
+                    return
+            self._count("waited_seconds", wait)
+            self.sleep(wait)
+
+    def _settle_tokens(self, api_key, estimated_tokens, response):
+        """Correct the token bucket with the usage the server actually reported."""
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "total_tokens", None) if usage else None
+        if not actual:
+            return
+        with self._lock:
+            budget = self._budget(api_key)
+            if actual > estimated_tokens:
+                budget.tokens.consume(actual - estimated_tokens)
+            else:
+                budget.tokens.refund(estimated_tokens - actual)
+
+    def _release_tokens(self, api_key, estimated_tokens):
+        """Give back the token reservation of an attempt that failed (nothing was generated)."""
+        with self._lock:
+            self._budget(api_key).tokens.refund(estimated_tokens)
+
+    def _block_key(self, api_key, seconds):
+        """Pause every caller sharing this key, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            budget = self._budget(api_key)
+            budget.blocked_until = max(budget.blocked_until, self.clock() + seconds)
+
+    def _backoff(self, attempt):
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def chat_completion(self, api_key, messages, model, max_tokens=512, temperature=0.3, **kwargs):
+        """
+        Run a chat completion through the scheduler and return the raw response.
+        Raises the last error once retries are exhausted or on a non-retryable error.
+        """
+        estimated_tokens = estimate_request_tokens(messages, max_tokens)
+        client = self._client(api_key)
+        attempt = 0
+        while True:
+            self._acquire_budget(api_key, estimated_tokens)
+            try:
+                with self._concurrency:
+                    self._count("requests")
+                    response = client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        **kwargs
+                    )
+            except Exception as e:
+                # The request slot stays spent, but the tokens weren't used
+                self._release_tokens(api_key, estimated_tokens)
+                status = get_status_code(e)
+                if not is_retryable_error(e) or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                retry_after = get_retry_after(e)
+                delay = self._backoff(attempt)
+                if status == 429:
+                    self._count("rate_limited")
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                    self._block_key(api_key, retry_after)
+                self._count("retries")
+                attempt += 1
+                self.sleep(delay)
+                continue
+            self._settle_tokens(api_key, estimated_tokens, response)
+            return response
+
+
+def get_status_code(error):
+    """Extract an HTTP status code from an SDK exception, if any."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def is_retryable_error(error):
+    """Rate limits, server errors, timeouts and dropped connections are retried."""
+    status = get_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def get_retry_after(error):
+    """Return the server's Retry-After delay in seconds, if it sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Global scheduler instance
+scheduler = None
+
+def get_scheduler() -> LLMScheduler:
+    """Get or create global LLM scheduler instance."""
+    global scheduler
+    if scheduler is None:
+        scheduler = LLMScheduler()
+    return scheduler
@@ -0,0 +1,601 @@
+"""
+Local Storage Manager for AI Content Analyzer
+Single-node storage backend: SQLite (with FTS5 full-text search) for files,
+metadata and token usage, and one memory-mapped .npy file of chunk vectors
+per file. Same interface and result shapes as SupabaseStorageManager; select
+it with STORAGE_BACKEND=local.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from storage_backend import (StorageBackend, FILES_PAGE_SIZE, EMPTY_USAGE, SaveResult, IngestResult,
+                             DeleteResult, FilePage, UsageSummary, PendingPage)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    filename TEXT NOT NULL,
+    file_type TEXT,
+    file_size INTEGER,
+    source_url TEXT,
+    transcript TEXT,
+    processing_status TEXT DEFAULT 'pending',
+    user_id TEXT,
+    client_op_id TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_content_files_user_created ON content_files(user_id, created_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS metadata (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id INTEGER REFERENCES content_files(id) ON DELETE CASCADE,
+    metadata TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_metadata_file_id ON metadata(file_id);
+
+-- Chunk texts; the vectors live in vectors/<file_id>.npy in the same order
+CREATE TABLE IF NOT EXISTS embedding_chunks (
+    file_id INTEGER REFERENCES content_files(id) ON DELETE CASCADE,
+    chunk_index INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (file_id, chunk_index)
+);
+
+CREATE TABLE IF NOT EXISTS token_usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_id INTEGER REFERENCES content_files(id) ON DELETE CASCADE,
+    operation TEXT,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    estimated_cost REAL,
+    user_id TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_token_usage_user_created ON token_usage(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_token_usage_file_id ON token_usage(file_id);
+
+-- Full-text index over transcripts, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS content_files_fts USING fts5(
+    transcript, content='content_files', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS content_files_fts_insert AFTER INSERT ON content_files BEGIN
+    INSERT INTO content_files_fts(rowid, transcript) VALUES (new.id, new.transcript);
+END;
+CREATE TRIGGER IF NOT EXISTS content_files_fts_delete AFTER DELETE ON content_files BEGIN
+    INSERT INTO content_files_fts(content_files_fts, rowid, transcript) VALUES ('delete', old.id, old.transcript);
+END;
+CREATE TRIGGER IF NOT EXISTS content_files_fts_update AFTER UPDATE OF transcript ON content_files BEGIN
+    INSERT INTO content_files_fts(content_files_fts, rowid, transcript) VALUES ('delete', old.id, old.transcript);
+    INSERT INTO content_files_fts(rowid, transcript) VALUES (new.id, new.transcript);
+END;
+"""
+
+SUMMARY_COLUMNS = """id, filename, file_type, file_size, source_url, processing_status, created_at,
+    substr(transcript, 1, 200) AS transcript_preview, length(transcript) AS transcript_length"""
+
+
+def to_fts_query(query):
+    """
+    Translate web-search style input ("exact phrase", OR, -excluded) into an
+    FTS5 query with every term quoted, so user input can't break the syntax.
+    Returns None if there is nothing to match on.
+    """
+    tokens = re.findall(r'(-?)"([^"]*)"|(\S+)', query)
+    positive, negative = [], []
+    for minus, phrase, word in tokens:
+        if word:
+            if word == "OR":
+                if positive and positive[-1] != "OR":
+                    positive.append("OR")
+                continue
+            minus, text = ("-", word[1:]) if word.startswith("-") else ("", word)
+        else:
+            text = phrase
+        text = " ".join(re.findall(r"\w+", text))
+        if not text:
+            continue
+        (negative if minus else positive).append(f'"{text}"')
+    while positive and positive[-1] == "OR":
+        positive.pop()
+    if not positive:
+        return None
+    fts_query = " ".join(positive)
+    for term in negative:
+        fts_query = f"({fts_query}) NOT {term}"
+    return fts_query
+
+
+class LocalStorageManager(StorageBackend):
+    name = "local"
+    supports_chunk_matching = True
+
+    def __init__(self, root_dir: str = "local_data"):
+        """Open (or create) the local store under root_dir."""
+        super().__init__()
+        self.root_dir = root_dir
+        self.vectors_dir = os.path.join(root_dir, "vectors")
+        os.makedirs(self.vectors_dir, exist_ok=True)
+        self.db_path = os.path.join(root_dir, "storage.db")
+        # One connection shared by all threads; the lock serializes access
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+            # Stores created before ingests carried an idempotency key
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(content_files)")}
+            if "client_op_id" not in columns:
+                self._conn.execute("ALTER TABLE content_files ADD COLUMN client_op_id TEXT")
+            self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_content_files_client_op "
+                               "ON content_files(client_op_id)")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _owns(self, file_id):
+        """Whether the current user owns file_id (writes about other users' files are refused)."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM content_files WHERE id = ? AND user_id = ?",
+                                      (int(file_id), self._get_owner_id())).fetchone() is not None
+
+    def _vector_path(self, file_id):
+        return os.path.join(self.vectors_dir, f"{int(file_id)}.npy")
+
+    def _load_vectors(self, file_id):
+        """Memory-map a file's chunk vectors, or None if it has none."""
+        import numpy as np
+        path = self._vector_path(file_id)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    # Writes
+
+    def _insert_file(self, filename, transcript, file_type, file_size, source_url, status, user_id,
+                     client_op_id=None):
+        now = datetime.now().isoformat()
+        cursor = self._conn.execute(
+            "INSERT INTO content_files (filename, file_type, file_size, source_url, transcript, "
+            "processing_status, user_id, client_op_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (filename, file_type, file_size, source_url, transcript, status, user_id, client_op_id, now, now)
+        )
+        return cursor.lastrowid
+
+    def _set_status(self, file_ids, status):
+        now = datetime.now().isoformat()
+        self._conn.executemany("UPDATE content_files SET processing_status = ?, updated_at = ? WHERE id = ?",
+                               [(status, now, int(file_id)) for file_id in file_ids])
+
+    def _write_chunks(self, file_id, embeddings):
+        """Insert chunk rows and stage the vector file. Returns the staged path."""
+        import numpy as np
+        self._conn.execute("DELETE FROM embedding_chunks WHERE file_id = ?", (file_id,))
+        self._conn.executemany(
+            "INSERT INTO embedding_chunks (file_id, chunk_index, content) VALUES (?, ?, ?)",
+            [(file_id, i, item["chunk"]) for i, item in enumerate(embeddings)]
+        )
+        vectors = np.asarray([item["embedding"] for item in embeddings], dtype=np.float32)
+        staged_path = self._vector_path(file_id) + ".tmp"
+        with open(staged_path, "wb") as file:
+            np.save(file, vectors)
+        return staged_path
+
+    def _publish_vectors(self, file_id, staged_path):
+        os.replace(staged_path, self._vector_path(file_id))
+
+    def save_transcript(self, filename: str, transcript: str, file_type: str = "unknown",
+                        file_size: Optional[int] = None, source_url: Optional[str] = None) -> SaveResult:
+        """Save transcript with user isolation."""
+        try:
+            with self._lock, self._conn:
+                file_id = self._insert_file(filename, transcript, file_type, file_size, source_url,
+                                            "transcript_saved", self._get_owner_id())
+            return {"success": True, "file_id": file_id, "data": self.get_file_details(file_id)}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def save_metadata(self, file_id: int, metadata: Dict) -> SaveResult:
+        """Save metadata and mark the file metadata_saved."""
+        try:
+            with self._lock, self._conn:
+                if not self._owns(file_id):
+                    return {"success": False, "error": "File not found or access denied"}
+                cursor = self._conn.execute("INSERT INTO metadata (file_id, metadata, created_at) VALUES (?, ?, ?)",
+                                            (file_id, json.dumps(metadata), datetime.now().isoformat()))
+                self._set_status([file_id], "metadata_saved")
+            return {"success": True, "data": {"id": cursor.lastrowid, "file_id": file_id}}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def save_summary_tree(self, file_id: int, summary_tree: Dict) -> SaveResult:
+        """Persist a file's hierarchical summary tree inside its existing metadata row."""
+        try:
+            with self._lock, self._conn:
+                row = self._conn.execute(
+                    "SELECT m.id, m.metadata FROM metadata m JOIN content_files f ON f.id = m.file_id "
+                    "WHERE m.file_id = ? AND f.user_id = ? ORDER BY m.id LIMIT 1",
+                    (file_id, self._get_owner_id())
+                ).fetchone()
+                if row is None:
+                    return {"success": False, "error": "No metadata row for file"}
+                metadata = json.loads(row["metadata"]) if row["metadata"] else {}
+                metadata["summary_tree"] = summary_tree
+                self._conn.execute("UPDATE metadata SET metadata = ? WHERE id = ?", (json.dumps(metadata), row["id"]))
+            return {"success": True}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def save_embeddings(self, file_id: int, embeddings: List, texts: List[str]) -> SaveResult:
+        """Save chunk texts in SQLite and their vectors as a .npy file."""
+        staged_path = None
+        try:
+            with self._lock, self._conn:
+                if not self._owns(file_id):
+                    return {"success": False, "error": "File not found or access denied"}
+                staged_path = self._write_chunks(file_id, embeddings)
+                self._set_status([file_id], "embeddings_saved")
+            self._publish_vectors(file_id, staged_path)
+            return {"success": True, "data": {"file_id": file_id, "chunk_count": len(embeddings)}}
+        except Exception as e:
+            if staged_path and os.path.exists(staged_path):
+                os.remove(staged_path)
+            return {"success": False, "error": str(e)}
+
+    def ingest_content(self, filename: str, transcript: str, file_type: str = "unknown",
+                       file_size: Optional[int] = None, source_url: Optional[str] = None,
+                       metadata: Optional[Dict] = None, embeddings: Optional[List] = None,
+                       texts: Optional[List[str]] = None, token_usage: Optional[List[Dict]] = None,
+                       client_op_id: Optional[str] = None) -> IngestResult:
+        """
+        Save a processed file - transcript, metadata, embeddings and token usage -
+        in one SQLite transaction. The vector file is only published after commit.
+        A repeated client_op_id returns the file saved the first time (duplicate=True).
+        """
+        status = "transcript_saved"
+        if embeddings is not None:
+            status = "embeddings_saved"
+        elif metadata is not None:
+            status = "metadata_saved"
+
+        staged_path = None
+        try:
+            user_id = self._get_owner_id()
+            now = datetime.now().isoformat()
+            metadata_id = None
+            token_usage_ids = []
+            with self._lock, self._conn:
+                if client_op_id is not None:
+                    existing = self._conn.execute(
+                        "SELECT id, processing_status FROM content_files WHERE client_op_id = ? AND user_id = ?",
+                        (client_op_id, user_id)
+                    ).fetchone()
+                    if existing:
+                        metadata_row = self._conn.execute(
+                            "SELECT MAX(id) AS id FROM metadata WHERE file_id = ?", (existing["id"],)).fetchone()
+                        return {
+                            "success": True,
+                            "file_id": existing["id"],
+                            "metadata_id": metadata_row["id"],
+                            "embeddings_id": existing["id"] if os.path.exists(self._vector_path(existing["id"])) else None,
+                            "token_usage_ids": [],
+                            "chunk_count": 0,
+                            "processing_status": existing["processing_status"],
+                            "duplicate": True
+                        }
+                file_id = self._insert_file(filename, transcript, file_type, file_size, source_url, status, user_id,
+                                            client_op_id)
+                if metadata is not None:
+                    metadata_id = self._conn.execute(
+                        "INSERT INTO metadata (file_id, metadata, created_at) VALUES (?, ?, ?)",
+                        (file_id, json.dumps(metadata), now)
+                    ).lastrowid
+                if embeddings is not None:
+                    staged_path = self._write_chunks(file_id, embeddings)
+                for usage in token_usage or []:
+                    token_usage_ids.append(self._conn.execute(
+                        "INSERT INTO token_usage (file_id, operation, input_tokens, output_tokens, estimated_cost, "
+                        "user_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (file_id, usage["operation"], int(usage["input_tokens"]), int(usage["output_tokens"]),
+                         float(usage["estimated_cost"]), user_id, now)
+                    ).lastrowid)
+            if staged_path:
+                self._publish_vectors(file_id, staged_path)
+            return {
+                "success": True,
+                "file_id": file_id,
+                "metadata_id": metadata_id,
+                "embeddings_id": file_id if embeddings is not None else None,
+                "token_usage_ids": token_usage_ids,
+                "chunk_count": len(embeddings) if embeddings is not None else 0,
+                "processing_status": status,
+                "duplicate": False
+            }
+        except Exception as e:
+            if staged_path and os.path.exists(staged_path):
+                os.remove(staged_path)
+            return {"success": False, "error": str(e)}
+
+    def save_token_usage(self, file_id: int, operation: str, input_tokens: int,
+                         output_tokens: int, estimated_cost: float) -> SaveResult:
+        """Save token usage for the current user."""
+        return self.save_token_usage_bulk([{
+            "file_id": file_id,
+            "operation": operation,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "estimated_cost": estimated_cost,
+            "user_id": self._get_owner_id()
+        }])
+
+    def save_token_usage_bulk(self, usage_rows: List[Dict]) -> SaveResult:
+        """Save many token usage rows in one transaction (rows carry their own user_id)."""
+        if not usage_rows:
+            return {"success": True, "data": []}
+        try:
+            now = datetime.now().isoformat()
+            rows = [{**row, "created_at": row.get("created_at", now)} for row in usage_rows]
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO token_usage (file_id, operation, input_tokens, output_tokens, estimated_cost, "
+                    "user_id, created_at) VALUES (:file_id, :operation, :input_tokens, :output_tokens, "
+                    ":estimated_cost, :user_id, :created_at)",
+                    [{"user_id": None, **row} for row in rows]
+                )
+            return {"success": True, "data": rows}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def save_metadata_bulk(self, items: List[Dict]) -> SaveResult:
+        """Save metadata for many files and mark them metadata_saved, in one transaction."""
+        if not items:
+            return {"success": True, "data": []}
+        try:
+            now = datetime.now().isoformat()
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT INTO metadata (file_id, metadata, created_at) VALUES (?, ?, ?)",
+                                       [(item["file_id"], json.dumps(item["metadata"]), now) for item in items])
+                self._set_status([item["file_id"] for item in items], "metadata_saved")
+            return {"success": True, "data": items}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def update_processing_status(self, file_ids: List[int], status: str) -> SaveResult:
+        """Set processing_status for many files."""
+        if not file_ids:
+            return {"success": True}
+        try:
+            with self._lock, self._conn:
+                self._set_status(file_ids, status)
+            return {"success": True}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def delete_file(self, file_id: int) -> bool:
+        """Delete file and all associated data for current user."""
+        result = self.delete_files([file_id])
+        return result["success"] and bool(result["deleted_ids"])
+
+    def delete_files(self, file_ids: List[int]) -> DeleteResult:
+        """Delete many of the current user's files; related rows cascade."""
+        if not file_ids:
+            return {"success": True, "deleted_ids": []}
+        try:
+            ids = [int(file_id) for file_id in file_ids]
+            placeholders = ", ".join("?" for _ in ids)
+            with self._lock, self._conn:
+                rows = self._conn.execute(
+                    f"DELETE FROM content_files WHERE user_id = ? AND id IN ({placeholders}) RETURNING id",
+                    [self._get_owner_id(), *ids]
+                ).fetchall()
+            deleted_ids = [row["id"] for row in rows]
+            for file_id in deleted_ids:
+                if os.path.exists(self._vector_path(file_id)):
+                    os.remove(self._vector_path(file_id))
+            return {"success": True, "deleted_ids": deleted_ids}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    # Reads
+
+    def get_all_files(self) -> List[Dict]:
+        """Get all files for current user (summary columns and a transcript preview)."""
+        return self._query(f"SELECT {SUMMARY_COLUMNS} FROM content_files WHERE user_id = ? "
+                           "ORDER BY created_at DESC, id DESC", (self._get_owner_id(),))
+
+    def list_files(self, limit: int = FILES_PAGE_SIZE, cursor: Optional[Dict] = None) -> FilePage:
+        """One page of the current user's files, newest first, without transcripts."""
+        params = [self._get_owner_id()]
+        keyset = ""
+        if cursor:
+            keyset = "AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params += [cursor["created_at"], cursor["created_at"], int(cursor["id"])]
+        rows = self._query(f"SELECT {SUMMARY_COLUMNS} FROM content_files WHERE user_id = ? {keyset} "
+                           "ORDER BY created_at DESC, id DESC LIMIT ?", (*params, limit + 1))
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = {"created_at": rows[-1]["created_at"], "id": rows[-1]["id"]}
+        return {"files": rows, "next_cursor": next_cursor}
+
+    def search_files(self, query: str, limit: int = 50) -> List[Dict]:
+        """
+        Search the current user's files: FTS5 matches on the transcript (ranked
+        by BM25, with a highlighted snippet) merged with filename matches.
+        """
+        fts_query = to_fts_query(query)
+        if fts_query:
+            matches = ("SELECT rowid AS id, -bm25(content_files_fts) AS rank, "
+                       "snippet(content_files_fts, 0, '**', '**', '', 24) AS snippet "
+                       "FROM content_files_fts WHERE content_files_fts MATCH ?")
+            params = [fts_query]
+        else:
+            matches = "SELECT NULL AS id, 0.0 AS rank, NULL AS snippet WHERE 0"
+            params = []
+        sql = f"""
+            SELECT f.id, f.filename, f.file_type, f.file_size, f.source_url, f.processing_status, f.created_at,
+                   substr(f.transcript, 1, 200) AS transcript_preview, length(f.transcript) AS transcript_length,
+                   instr(lower(f.filename), lower(?)) > 0 AS filename_match,
+                   COALESCE(m.rank, 0) AS rank, m.snippet
+            FROM content_files f LEFT JOIN ({matches}) m ON m.id = f.id
+            WHERE f.user_id = ? AND (m.id IS NOT NULL OR instr(lower(f.filename), lower(?)) > 0)
+            ORDER BY filename_match DESC, rank DESC, f.created_at DESC
+            LIMIT ?
+        """
+        rows = self._query(sql, (query, *params, self._get_owner_id(), query, limit))
+        for row in rows:
+            row["filename_match"] = bool(row["filename_match"])
+        return rows
+
+    def get_file_details(self, file_id: int) -> Optional[Dict]:
+        """Get detailed information about a specific file."""
+        rows = self._query("SELECT * FROM content_files WHERE id = ? AND user_id = ?",
+                           (file_id, self._get_owner_id()))
+        return rows[0] if rows else None
+
+    def get_transcript(self, file_id: int) -> Optional[str]:
+        """Get transcript for a specific file."""
+        rows = self._query("SELECT transcript FROM content_files WHERE id = ? AND user_id = ?",
+                           (file_id, self._get_owner_id()))
+        return rows[0]["transcript"] if rows else None
+
+    def get_metadata(self, file_id: int) -> Optional[Dict]:
+        """Get metadata for a specific file."""
+        rows = self._query("SELECT m.metadata FROM metadata m JOIN content_files f ON f.id = m.file_id "
+                           "WHERE m.file_id = ? AND f.user_id = ? ORDER BY m.id LIMIT 1",
+                           (file_id, self._get_owner_id()))
+        return json.loads(rows[0]["metadata"]) if rows and rows[0]["metadata"] else None
+
+    def get_embeddings(self, file_id: int) -> Optional[Dict]:
+        """Get embeddings for a specific file, in the format save_embeddings takes."""
+        if not self._owns(file_id):
+            return None
+        vectors = self._load_vectors(file_id)
+        if vectors is None:
+            return None
+        chunks = [row["content"] for row in self._query(
+            "SELECT content FROM embedding_chunks WHERE file_id = ? ORDER BY chunk_index", (file_id,))]
+        items = [{"chunk": chunk, "embedding": vectors[i].tolist()} for i, chunk in enumerate(chunks)]
+        return {"embeddings": items, "texts": chunks, "file_id": file_id}
+
+    def match_chunks(self, query_embedding: List[float], file_id: Optional[int] = None,
+                     match_count: int = 5) -> List[Dict]:
+        """
+        Nearest chunks by cosine similarity for the current user, optionally
+        within one file. Vectors are read through memory maps, not loaded whole.
+        """
+        import numpy as np
+        if file_id is not None:
+            owned = self._query("SELECT id FROM content_files WHERE id = ? AND user_id = ?",
+                                (file_id, self._get_owner_id()))
+        else:
+            owned = self._query("SELECT id FROM content_files WHERE user_id = ?", (self._get_owner_id(),))
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        candidates = []  # (similarity, file_id, chunk_index)
+        for row in owned:
+            vectors = self._load_vectors(row["id"])
+            if vectors is None or len(vectors) == 0:
+                continue
+            norms = np.linalg.norm(vectors, axis=1)
+            norms[norms == 0] = 1.0
+            similarities = (vectors @ query) / norms
+            top = np.argsort(-similarities)[:match_count]
+            candidates.extend((float(similarities[i]), row["id"], int(i)) for i in top)
+
+        candidates.sort(reverse=True)
+        results = []
+        for similarity, match_file_id, chunk_index in candidates[:match_count]:
+            content = self._query("SELECT content FROM embedding_chunks WHERE file_id = ? AND chunk_index = ?",
+                                  (match_file_id, chunk_index))
+            if content:
+                results.append({"file_id": match_file_id, "chunk_index": chunk_index,
+                                "content": content[0]["content"], "similarity": similarity})
+        return results
+
+    def get_token_usage_summary(self, file_id: Optional[int] = None) -> UsageSummary:
+        """Get token usage totals for current user."""
+        rows = self.get_token_usage_breakdown(file_id=file_id)
+        if not rows:
+            return dict(EMPTY_USAGE)
+        row = rows[0]
+        return {
+            "total_input_tokens": row["total_input_tokens"],
+            "total_output_tokens": row["total_output_tokens"],
+            "total_cost": row["total_cost"],
+            "operations_count": row["operations_count"]
+        }
+
+    def get_token_usage_breakdown(self, group_by: Optional[str] = None,
+                                  file_id: Optional[int] = None) -> List[Dict]:
+        """Token usage totals grouped by "day", "operation" or "file" (or one total row)."""
+        group_key = {
+            "day": "substr(created_at, 1, 10)",
+            "operation": "operation",
+            "file": "CAST(file_id AS TEXT)"
+        }.get(group_by, "NULL")
+        return self._query(f"""
+            SELECT {group_key} AS group_key,
+                   COALESCE(SUM(input_tokens), 0) AS total_input_tokens,
+                   COALESCE(SUM(output_tokens), 0) AS total_output_tokens,
+                   COALESCE(SUM(estimated_cost), 0) AS total_cost,
+                   COUNT(*) AS operations_count
+            FROM token_usage
+            WHERE user_id = ? AND (? IS NULL OR file_id = ?)
+            GROUP BY 1
+            HAVING COUNT(*) > 0
+            ORDER BY 1
+        """, (self._get_owner_id(), file_id, file_id))
+
+    def get_token_usage_daily(self, since: Optional[str] = None) -> List[Dict]:
+        """Daily per-operation usage for current user (computed on the fly)."""
+        return self._query("""
+            SELECT user_id, substr(created_at, 1, 10) AS day, operation,
+                   SUM(input_tokens) AS total_input_tokens, SUM(output_tokens) AS total_output_tokens,
+                   SUM(estimated_cost) AS total_cost, COUNT(*) AS operations_count
+            FROM token_usage
+            WHERE user_id = ? AND (? IS NULL OR created_at >= ?)
+            GROUP BY user_id, day, operation
+            ORDER BY day
+        """, (self._get_owner_id(), since, since))
+
+    def refresh_usage_rollups(self) -> SaveResult:
+        """Nothing to refresh: daily usage is computed on the fly."""
+        return {"success": True}
+
+    def get_files_pending_metadata(self, after_id: int = 0, limit: int = 100,
+                                   include_failed: bool = False) -> PendingPage:
+        """One page (keyset by id, across all users) of files with a transcript but no metadata."""
+        excluded = ("metadata_saved",) if include_failed else ("metadata_saved", "metadata_failed")
+        rows = self._query(f"""
+            SELECT id, user_id, processing_status FROM content_files
+            WHERE id > ? AND transcript IS NOT NULL
+              AND (processing_status IS NULL OR processing_status NOT IN ({", ".join("?" for _ in excluded)}))
+            ORDER BY id LIMIT ?
+        """, (after_id, *excluded, limit))
+        if not rows:
+            return {"rows": [], "last_id": None}
+
+        ids = [row["id"] for row in rows]
+        placeholders = ", ".join("?" for _ in ids)
+        done_ids = {row["file_id"] for row in self._query(
+            f"SELECT file_id FROM metadata WHERE file_id IN ({placeholders})", ids)}
+        pending = [row for row in rows if row["id"] not in done_ids]
+        if pending:
+            pending_ids = [row["id"] for row in pending]
+            transcripts = {row["id"]: row["transcript"] for row in self._query(
+                f"SELECT id, transcript FROM content_files WHERE id IN ({', '.join('?' for _ in pending_ids)})",
+                pending_ids)}
+            for row in pending:
+                row["transcript"] = transcripts.get(row["id"])
+        return {"rows": pending, "last_id": rows[-1]["id"]}
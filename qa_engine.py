@@ -1,8 +1,8 @@
 # qa_engine.py
 
 import os
-from groq import Groq
 from dotenv import load_dotenv
+from llm_scheduler import get_scheduler
 
 load_dotenv()
 
@@ -17,8 +17,6 @@ def answer_query(query, context, groq_api_key=None):
         return "[Error: GROK_API_KEY not set]"
     
     try:
-        client = Groq(api_key=groq_api_key)
-        
         # Enhanced system prompt for better responses
         system_prompt = """You are a knowledgeable and helpful AI assistant. Your role is to:
 
@@ -43,7 +41,8 @@ User Question: {query}
 
 Please provide a helpful and informative response. If the exact answer isn't in the context, provide relevant general knowledge or insights instead of saying "I don't know." """
         
-        response = client.chat.completions.create(
+        response = get_scheduler().chat_completion(
+            groq_api_key,
             model="llama3-70b-8192",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -73,8 +72,6 @@ def answer_query_with_metadata(query, context, metadata=None, groq_api_key=None)
         return "[Error: GROK_API_KEY not set]"
     
     try:
-        client = Groq(api_key=groq_api_key)
-        
         # Build enhanced context with metadata
         enhanced_context = f"Content: {context}\n"
         if metadata and isinstance(metadata, dict) and 'error' not in metadata:
@@ -104,7 +101,8 @@ User Question: {query}
 
 Please provide a comprehensive and helpful response using both the content and metadata when available."""
         
-        response = client.chat.completions.create(
+        response = get_scheduler().chat_completion(
+            groq_api_key,
             model="llama3-70b-8192",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -14,10 +14,14 @@ CREATE TABLE IF NOT EXISTS content_files (
     transcript TEXT,
     processing_status VARCHAR(50) DEFAULT 'pending',
     user_id VARCHAR(255), -- For user isolation
+    client_op_id TEXT UNIQUE, -- Idempotency key for retried ingests
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Databases created before ingests carried an idempotency key
+ALTER TABLE content_files ADD COLUMN IF NOT EXISTS client_op_id TEXT UNIQUE;
+
 -- Metadata table
 CREATE TABLE IF NOT EXISTS metadata (
     id BIGSERIAL PRIMARY KEY,
@@ -59,6 +63,317 @@ CREATE INDEX IF NOT EXISTS idx_token_usage_user_id ON token_usage(user_id);
 -- Create full-text search index on transcript
 CREATE INDEX IF NOT EXISTS idx_content_files_transcript_fts ON content_files USING GIN (to_tsvector('english', transcript));
 
+-- Keyset pagination of a user's files (newest first)
+CREATE INDEX IF NOT EXISTS idx_content_files_user_created ON content_files(user_id, created_at DESC, id DESC);
+
+-- File listing without the full transcript: summary columns plus a short preview
+-- computed server-side (security_invoker keeps the table's RLS policies in force)
+CREATE OR REPLACE VIEW content_files_summary WITH (security_invoker = true) AS
+SELECT
+    id,
+    filename,
+    file_type,
+    file_size,
+    source_url,
+    processing_status,
+    user_id,
+    created_at,
+    updated_at,
+    LEFT(transcript, 200) AS transcript_preview,
+    LENGTH(transcript) AS transcript_length
+FROM content_files;
+
+-- Substring matches on filenames are served by a trigram index
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_content_files_filename_trgm ON content_files USING GIN (LOWER(filename) gin_trgm_ops);
+
+-- Ranked search over a user's files: full-text matches on the transcript (served by
+-- idx_content_files_transcript_fts) and filename matches (served by
+-- idx_content_files_filename_trgm) are looked up separately, so each side can use its
+-- index, then merged into one row per file. Snippets are only built for returned rows.
+CREATE OR REPLACE FUNCTION search_content_files(p_user_id TEXT, p_query TEXT, p_limit INTEGER DEFAULT 50)
+RETURNS TABLE (
+    id BIGINT,
+    filename VARCHAR,
+    file_type VARCHAR,
+    file_size BIGINT,
+    source_url TEXT,
+    processing_status VARCHAR,
+    created_at TIMESTAMP WITH TIME ZONE,
+    transcript_preview TEXT,
+    transcript_length INTEGER,
+    filename_match BOOLEAN,
+    rank REAL,
+    snippet TEXT
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH search AS (
+        SELECT websearch_to_tsquery('english', p_query) AS query,
+               -- LIKE pattern for the query as a literal substring
+               '%' || REPLACE(REPLACE(REPLACE(LOWER(p_query), '\', '\\'), '%', '\%'), '_', '\_') || '%' AS pattern
+    ),
+    transcript_hits AS (
+        SELECT f.id
+        FROM content_files f, search
+        WHERE f.user_id = p_user_id
+          AND to_tsvector('english', f.transcript) @@ search.query
+    ),
+    filename_hits AS (
+        SELECT f.id
+        FROM content_files f, search
+        WHERE f.user_id = p_user_id
+          AND LOWER(f.filename) LIKE search.pattern
+    ),
+    hits AS (
+        SELECT id, BOOL_OR(filename_match) AS filename_match
+        FROM (
+            SELECT id, FALSE AS filename_match FROM transcript_hits
+            UNION ALL
+            SELECT id, TRUE FROM filename_hits
+        ) AS hit
+        GROUP BY id
+    ),
+    matches AS (
+        SELECT
+            f.*,
+            h.filename_match,
+            COALESCE(ts_rank(to_tsvector('english', f.transcript), search.query), 0) AS rank
+        FROM hits h
+        JOIN content_files f ON f.id = h.id
+        CROSS JOIN search
+        ORDER BY h.filename_match DESC, rank DESC, f.created_at DESC
+        LIMIT p_limit
+    )
+    SELECT
+        m.id,
+        m.filename,
+        m.file_type,
+        m.file_size,
+        m.source_url,
+        m.processing_status,
+        m.created_at,
+        LEFT(m.transcript, 200),
+        LENGTH(m.transcript),
+        m.filename_match,
+        m.rank,
+        CASE WHEN m.rank > 0 THEN
+            ts_headline('english', m.transcript, search.query,
+                        'StartSel=**, StopSel=**, MaxWords=35, MinWords=15, MaxFragments=2')
+        END
+    FROM matches m, search
+    ORDER BY m.filename_match DESC, m.rank DESC, m.created_at DESC;
+$$;
+
+-- Token usage totals for a user, aggregated in the database. With p_group_by NULL
+-- this returns a single row; 'day', 'operation' or 'file' return one row per group.
+CREATE INDEX IF NOT EXISTS idx_token_usage_user_created ON token_usage(user_id, created_at);
+
+CREATE OR REPLACE FUNCTION token_usage_summary(p_user_id TEXT, p_file_id BIGINT DEFAULT NULL,
+                                               p_group_by TEXT DEFAULT NULL)
+RETURNS TABLE (
+    group_key TEXT,
+    total_input_tokens BIGINT,
+    total_output_tokens BIGINT,
+    total_cost NUMERIC,
+    operations_count BIGINT
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        CASE p_group_by
+            WHEN 'day' THEN DATE_TRUNC('day', created_at)::DATE::TEXT
+            WHEN 'operation' THEN operation
+            WHEN 'file' THEN file_id::TEXT
+        END AS group_key,
+        COALESCE(SUM(input_tokens), 0),
+        COALESCE(SUM(output_tokens), 0),
+        COALESCE(SUM(estimated_cost), 0),
+        COUNT(*)
+    FROM token_usage
+    WHERE user_id = p_user_id
+      AND (p_file_id IS NULL OR file_id = p_file_id)
+    GROUP BY 1
+    ORDER BY 1;
+$$;
+
+-- Daily rollup for dashboards. Materialized views don't apply RLS, so API roles
+-- can't read it directly; token_usage_daily_for() returns the signed-in user's rows.
+-- Refreshed every 15 minutes by pg_cron where available, and after each metadata
+-- backfill run with the service role key.
+CREATE MATERIALIZED VIEW IF NOT EXISTS token_usage_daily AS
+SELECT
+    user_id,
+    DATE_TRUNC('day', created_at)::DATE AS day,
+    operation,
+    SUM(input_tokens) AS total_input_tokens,
+    SUM(output_tokens) AS total_output_tokens,
+    SUM(estimated_cost) AS total_cost,
+    COUNT(*) AS operations_count
+FROM token_usage
+GROUP BY user_id, DATE_TRUNC('day', created_at)::DATE, operation;
+
+-- Unique index required for REFRESH ... CONCURRENTLY (operation may be NULL)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_token_usage_daily_key
+    ON token_usage_daily(user_id, day, operation) NULLS NOT DISTINCT;
+
+REVOKE ALL ON token_usage_daily FROM anon, authenticated;
+
+-- The caller's id comes from their JWT, never from a parameter
+DROP FUNCTION IF EXISTS token_usage_daily_for(TEXT, DATE);
+CREATE OR REPLACE FUNCTION token_usage_daily_for(p_since DATE DEFAULT NULL)
+RETURNS SETOF token_usage_daily
+LANGUAGE sql STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT *
+    FROM token_usage_daily
+    WHERE user_id = auth.uid()::text
+      AND (p_since IS NULL OR day >= p_since)
+    ORDER BY day;
+$$;
+
+REVOKE EXECUTE ON FUNCTION token_usage_daily_for(DATE) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION token_usage_daily_for(DATE) TO authenticated;
+
+-- SECURITY DEFINER: refreshing requires owning the view
+CREATE OR REPLACE FUNCTION refresh_token_usage_daily()
+RETURNS VOID
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    REFRESH MATERIALIZED VIEW CONCURRENTLY token_usage_daily;
+$$;
+
+REVOKE EXECUTE ON FUNCTION refresh_token_usage_daily() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION refresh_token_usage_daily() TO service_role;
+
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_cron;
+    PERFORM cron.schedule('refresh-token-usage-daily', '*/15 * * * *', 'SELECT refresh_token_usage_daily()');
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'pg_cron unavailable (%): token_usage_daily is only refreshed by the metadata backfill', SQLERRM;
+END;
+$$;
+
+-- Save a processed file in one transaction: the content row plus (optionally) its
+-- metadata, embeddings and token usage. Either everything is written or nothing is.
+-- metadata and embeddings are stored as JSON text, matching rows written by the app.
+-- p_token_usage is an array of {operation, input_tokens, output_tokens, estimated_cost}.
+-- p_chunks (pgvector mode, see setup_pgvector.sql) is an array of
+-- {chunk_index, content, embedding} rows for embedding_chunks.
+-- p_client_op_id makes retries safe: if a file was already saved under that key,
+-- nothing is written and the existing file is returned with duplicate = true.
+DROP FUNCTION IF EXISTS ingest_content(TEXT, TEXT, TEXT, TEXT, BIGINT, TEXT, JSONB, JSONB, JSONB);
+DROP FUNCTION IF EXISTS ingest_content(TEXT, TEXT, TEXT, TEXT, BIGINT, TEXT, JSONB, JSONB, JSONB, JSONB);
+CREATE OR REPLACE FUNCTION ingest_content(
+    p_user_id TEXT,
+    p_filename TEXT,
+    p_transcript TEXT,
+    p_file_type TEXT DEFAULT 'unknown',
+    p_file_size BIGINT DEFAULT NULL,
+    p_source_url TEXT DEFAULT NULL,
+    p_metadata JSONB DEFAULT NULL,
+    p_embeddings_data JSONB DEFAULT NULL,
+    p_token_usage JSONB DEFAULT '[]'::JSONB,
+    p_chunks JSONB DEFAULT NULL,
+    p_client_op_id TEXT DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_file_id BIGINT;
+    v_metadata_id BIGINT;
+    v_embeddings_id BIGINT;
+    v_token_usage_ids BIGINT[];
+    v_chunk_count INTEGER := 0;
+    v_status TEXT := 'transcript_saved';
+BEGIN
+    IF p_client_op_id IS NOT NULL THEN
+        SELECT id, processing_status INTO v_file_id, v_status
+        FROM content_files
+        WHERE client_op_id = p_client_op_id AND user_id = p_user_id;
+        IF FOUND THEN
+            RETURN jsonb_build_object(
+                'file_id', v_file_id,
+                'metadata_id', (SELECT MAX(id) FROM metadata WHERE file_id = v_file_id),
+                'embeddings_id', (SELECT MAX(id) FROM embeddings WHERE file_id = v_file_id),
+                'token_usage_ids', '[]'::JSONB,
+                'chunk_count', 0,
+                'processing_status', v_status,
+                'duplicate', true
+            );
+        END IF;
+        v_status := 'transcript_saved';
+    END IF;
+
+    IF p_embeddings_data IS NOT NULL OR p_chunks IS NOT NULL THEN
+        v_status := 'embeddings_saved';
+    ELSIF p_metadata IS NOT NULL THEN
+        v_status := 'metadata_saved';
+    END IF;
+
+    INSERT INTO content_files (filename, file_type, file_size, source_url, transcript, processing_status, user_id, client_op_id)
+    VALUES (p_filename, p_file_type, p_file_size, p_source_url, p_transcript, v_status, p_user_id, p_client_op_id)
+    RETURNING id INTO v_file_id;
+
+    IF p_metadata IS NOT NULL THEN
+        INSERT INTO metadata (file_id, metadata)
+        VALUES (v_file_id, to_jsonb(p_metadata::TEXT))
+        RETURNING id INTO v_metadata_id;
+    END IF;
+
+    IF p_embeddings_data IS NOT NULL THEN
+        INSERT INTO embeddings (file_id, embeddings_data)
+        VALUES (v_file_id, to_jsonb((p_embeddings_data || jsonb_build_object('file_id', v_file_id))::TEXT))
+        RETURNING id INTO v_embeddings_id;
+    END IF;
+
+    IF p_chunks IS NOT NULL THEN
+        INSERT INTO embedding_chunks (file_id, user_id, chunk_index, content, embedding)
+        SELECT v_file_id, p_user_id, (chunk->>'chunk_index')::INTEGER, chunk->>'content',
+               (chunk->>'embedding')::vector
+        FROM jsonb_array_elements(p_chunks) AS chunk;
+        GET DIAGNOSTICS v_chunk_count = ROW_COUNT;
+    END IF;
+
+    WITH inserted AS (
+        INSERT INTO token_usage (file_id, operation, input_tokens, output_tokens, estimated_cost, user_id)
+        SELECT v_file_id, usage.operation, usage.input_tokens, usage.output_tokens, usage.estimated_cost, p_user_id
+        FROM jsonb_to_recordset(COALESCE(p_token_usage, '[]'::JSONB))
+            AS usage(operation TEXT, input_tokens INTEGER, output_tokens INTEGER, estimated_cost NUMERIC)
+        RETURNING id
+    )
+    SELECT COALESCE(ARRAY_AGG(id), '{}') INTO v_token_usage_ids FROM inserted;
+
+    RETURN jsonb_build_object(
+        'file_id', v_file_id,
+        'metadata_id', v_metadata_id,
+        'embeddings_id', v_embeddings_id,
+        'token_usage_ids', to_jsonb(v_token_usage_ids),
+        'chunk_count', v_chunk_count,
+        'processing_status', v_status,
+        'duplicate', false
+    );
+END;
+$$;
+
+-- Delete a user's files in one statement; metadata, embeddings and token usage go
+-- with them through ON DELETE CASCADE. Returns the ids that were actually deleted
+-- (ids the user doesn't own are ignored).
+CREATE OR REPLACE FUNCTION delete_files(p_user_id TEXT, p_file_ids BIGINT[])
+RETURNS SETOF BIGINT
+LANGUAGE sql
+AS $$
+    DELETE FROM content_files
+    WHERE user_id = p_user_id AND id = ANY(p_file_ids)
+    RETURNING id;
+$$;
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE content_files ENABLE ROW LEVEL SECURITY;
 ALTER TABLE metadata ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,80 @@
+-- Optional pgvector embedding storage for AI Content Analyzer
+-- Run this in your Supabase SQL Editor after setup_database.sql, then set
+-- EMBEDDING_STORAGE=pgvector so the app stores one row per chunk here instead
+-- of a JSON blob in the embeddings table.
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- One row per transcript chunk; 384 dimensions = all-MiniLM-L6-v2
+CREATE TABLE IF NOT EXISTS embedding_chunks (
+    id BIGSERIAL PRIMARY KEY,
+    file_id BIGINT REFERENCES content_files(id) ON DELETE CASCADE,
+    user_id VARCHAR(255), -- For user isolation
+    chunk_index INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    embedding vector(384) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (file_id, chunk_index)
+);
+
+CREATE INDEX IF NOT EXISTS idx_embedding_chunks_user_file ON embedding_chunks(user_id, file_id);
+
+-- Approximate nearest-neighbour index for searches across a user's library.
+-- MiniLM embeddings are unit length, so cosine distance ranks like the FAISS L2 index.
+CREATE INDEX IF NOT EXISTS idx_embedding_chunks_hnsw
+    ON embedding_chunks USING hnsw (embedding vector_cosine_ops);
+
+ALTER TABLE embedding_chunks ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow anonymous read access" ON embedding_chunks FOR SELECT USING (true);
+CREATE POLICY "Allow anonymous insert access" ON embedding_chunks FOR INSERT WITH CHECK (true);
+CREATE POLICY "Allow anonymous update access" ON embedding_chunks FOR UPDATE USING (true);
+CREATE POLICY "Allow anonymous delete access" ON embedding_chunks FOR DELETE USING (true);
+
+-- Nearest chunks to a query embedding for one user, optionally within one file.
+-- HNSW filters by user only after it has picked its candidates, so for a user who
+-- owns a small share of the table it can return fewer than p_match_count rows.
+-- One file, or a user with up to 20000 chunks, is therefore ranked exactly (the
+-- "+ 0" keeps the planner off the HNSW index); larger libraries use HNSW with
+-- ef_search raised well above p_match_count.
+CREATE OR REPLACE FUNCTION match_chunks(
+    p_user_id TEXT,
+    p_query_embedding vector(384),
+    p_file_id BIGINT DEFAULT NULL,
+    p_match_count INTEGER DEFAULT 5
+)
+RETURNS TABLE (
+    id BIGINT,
+    file_id BIGINT,
+    chunk_index INTEGER,
+    content TEXT,
+    similarity DOUBLE PRECISION
+)
+LANGUAGE plpgsql STABLE
+AS $$
+BEGIN
+    IF p_file_id IS NOT NULL
+       OR (SELECT COUNT(*) FROM (SELECT 1 FROM embedding_chunks c
+                                 WHERE c.user_id = p_user_id LIMIT 20000) AS owned) < 20000 THEN
+        RETURN QUERY
+        SELECT c.id, c.file_id, c.chunk_index, c.content,
+               1 - (c.embedding <=> p_query_embedding) AS similarity
+        FROM embedding_chunks c
+        WHERE c.user_id = p_user_id
+          AND (p_file_id IS NULL OR c.file_id = p_file_id)
+        ORDER BY (c.embedding <=> p_query_embedding) + 0
+        LIMIT p_match_count;
+        RETURN;
+    END IF;
+
+    -- Transaction-local, so it ends with this RPC call
+    PERFORM set_config('hnsw.ef_search', LEAST(1000, GREATEST(100, p_match_count * 20))::TEXT, true);
+    RETURN QUERY
+    SELECT c.id, c.file_id, c.chunk_index, c.content,
+           1 - (c.embedding <=> p_query_embedding) AS similarity
+    FROM embedding_chunks c
+    WHERE c.user_id = p_user_id
+    ORDER BY c.embedding <=> p_query_embedding
+    LIMIT p_match_count;
+END;
+$$;
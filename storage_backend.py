@@ -0,0 +1,212 @@
+"""
+Storage backend interface for AI Content Analyzer
+Every backend (Supabase, local SQLite) implements these methods with the same
+arguments and result shapes, so callers can switch with STORAGE_BACKEND.
+Backends have no UI dependencies: they run the same in Streamlit, the API
+server, worker threads and CLIs (see streamlit_storage.py for the app adapter).
+"""
+
+import copy
+from typing import Dict, List, Optional, TypedDict
+
+FILES_PAGE_SIZE = 25
+
+
+class SaveResult(TypedDict, total=False):
+    """Result of a write: "error" is set when success is False."""
+    success: bool
+    error: str
+    file_id: int
+    data: object
+    chunk_count: int
+
+
+class IngestResult(TypedDict, total=False):
+    success: bool
+    error: str
+    file_id: int
+    metadata_id: Optional[int]
+    embeddings_id: Optional[int]
+    token_usage_ids: List[int]
+    chunk_count: int
+    processing_status: str
+    duplicate: bool
+
+
+class DeleteResult(TypedDict, total=False):
+    success: bool
+    error: str
+    deleted_ids: List[int]
+
+
+class FilePage(TypedDict):
+    files: List[Dict]
+    next_cursor: Optional[Dict]
+
+
+class UsageSummary(TypedDict):
+    total_input_tokens: int
+    total_output_tokens: int
+    total_cost: float
+    operations_count: int
+
+
+class PendingPage(TypedDict):
+    rows: List[Dict]
+    last_id: Optional[int]
+
+
+EMPTY_USAGE: UsageSummary = {"total_input_tokens": 0, "total_output_tokens": 0, "total_cost": 0, "operations_count": 0}
+
+
+class StorageBackend:
+    """
+    Persistent storage for transcripts, metadata, embeddings and token usage.
+
+    Rows are scoped to an explicit user context: set_current_user() on a
+    backend used by one user, or for_user() for a view bound to one user that
+    shares the underlying connection. Write methods return {"success": bool, ...}
+    dicts with an "error" message on failure; read methods return None/[] when
+    nothing is found and raise if the store itself fails.
+    """
+
+    # Backend name, as used in STORAGE_BACKEND
+    name = None
+    # True when match_chunks ranks chunk embeddings inside the store
+    supports_chunk_matching = False
+
+    def __init__(self):
+        self.current_user_id = None
+        self.session_id = None
+        self.access_token = None
+
+    def set_current_user(self, user_id: Optional[str], session_id: Optional[str] = None,
+                         access_token: Optional[str] = None):
+        """
+        Set the user that rows belong to. Anonymous users pass user_id=None and
+        the id of their session, which then owns their rows. Signed-in users
+        may also pass their auth access token for reads the store itself
+        scopes to the caller (e.g. the daily usage rollup).
+        """
+        self.current_user_id = user_id
+        self.session_id = session_id
+        self.access_token = access_token
+
+    def for_user(self, user_id: Optional[str], session_id: Optional[str] = None,
+                 access_token: Optional[str] = None) -> "StorageBackend":
+        """A view of this backend bound to one user (safe to use alongside other users' views)."""
+        view = copy.copy(self)
+        view.set_current_user(user_id, session_id, access_token)
+        return view
+
+    def get_current_user_id(self) -> Optional[str]:
+        """Get current user ID, or None for anonymous."""
+        return self.current_user_id
+
+    def _get_owner_id(self) -> str:
+        """User id that owns rows: the current user, or the anonymous session."""
+        return self.current_user_id or self.session_id or "anonymous"
+
+    # Writes
+
+    def save_transcript(self, filename: str, transcript: str, file_type: str = "unknown",
+                        file_size: Optional[int] = None, source_url: Optional[str] = None) -> SaveResult:
+        """Save a transcript. Returns {"success", "file_id", "data"}."""
+        raise NotImplementedError
+
+    def save_metadata(self, file_id: int, metadata: Dict) -> SaveResult:
+        raise NotImplementedError
+
+    def save_summary_tree(self, file_id: int, summary_tree: Dict) -> SaveResult:
+        """Store a summary tree inside the file's existing metadata."""
+        raise NotImplementedError
+
+    def save_embeddings(self, file_id: int, embeddings: List, texts: List[str]) -> SaveResult:
+        """`embeddings` is a list of {"chunk": str, "embedding": [float, ...]}."""
+        raise NotImplementedError
+
+    def ingest_content(self, filename: str, transcript: str, file_type: str = "unknown",
+                       file_size: Optional[int] = None, source_url: Optional[str] = None,
+                       metadata: Optional[Dict] = None, embeddings: Optional[List] = None,
+                       texts: Optional[List[str]] = None, token_usage: Optional[List[Dict]] = None,
+                       client_op_id: Optional[str] = None) -> IngestResult:
+        """
+        Save a processed file and everything derived from it atomically. With a
+        client_op_id, a repeated call returns the file already saved under that
+        key (duplicate=True) instead of saving it again.
+        """
+        raise NotImplementedError
+
+    def save_token_usage(self, file_id: int, operation: str, input_tokens: int,
+                         output_tokens: int, estimated_cost: float) -> SaveResult:
+        raise NotImplementedError
+
+    def save_token_usage_bulk(self, usage_rows: List[Dict]) -> SaveResult:
+        """Save many usage rows; each row carries its own user_id."""
+        raise NotImplementedError
+
+    def save_metadata_bulk(self, items: List[Dict]) -> SaveResult:
+        """Save {"file_id", "metadata"} items and mark those files metadata_saved."""
+        raise NotImplementedError
+
+    def update_processing_status(self, file_ids: List[int], status: str) -> SaveResult:
+        raise NotImplementedError
+
+    def delete_file(self, file_id: int) -> bool:
+        raise NotImplementedError
+
+    def delete_files(self, file_ids: List[int]) -> DeleteResult:
+        """Delete the current user's files. Returns {"success", "deleted_ids"}."""
+        raise NotImplementedError
+
+    # Reads
+
+    def get_all_files(self) -> List[Dict]:
+        """All of the current user's files as summary rows (no full transcript)."""
+        raise NotImplementedError
+
+    def list_files(self, limit: int = FILES_PAGE_SIZE, cursor: Optional[Dict] = None) -> FilePage:
+        """One keyset page of summary rows. Returns {"files", "next_cursor"}."""
+        raise NotImplementedError
+
+    def search_files(self, query: str, limit: int = 50) -> List[Dict]:
+        """Ranked filename/content search; rows add filename_match, rank and snippet."""
+        raise NotImplementedError
+
+    def get_file_details(self, file_id: int) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def get_transcript(self, file_id: int) -> Optional[str]:
+        raise NotImplementedError
+
+    def get_metadata(self, file_id: int) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def get_embeddings(self, file_id: int) -> Optional[Dict]:
+        """{"embeddings": [{"chunk", "embedding"}, ...], "texts": [...]} or None."""
+        raise NotImplementedError
+
+    def match_chunks(self, query_embedding: List[float], file_id: Optional[int] = None,
+                     match_count: int = 5) -> List[Dict]:
+        """Nearest chunks: rows with file_id, chunk_index, content and similarity."""
+        raise NotImplementedError
+
+    def get_token_usage_summary(self, file_id: Optional[int] = None) -> UsageSummary:
+        raise NotImplementedError
+
+    def get_token_usage_breakdown(self, group_by: Optional[str] = None,
+                                  file_id: Optional[int] = None) -> List[Dict]:
+        raise NotImplementedError
+
+    def get_token_usage_daily(self, since: Optional[str] = None) -> List[Dict]:
+        """Daily per-operation usage of the current user. `since` is an ISO date."""
+        raise NotImplementedError
+
+    def refresh_usage_rollups(self) -> SaveResult:
+        """Bring precomputed usage rollups up to date (after bulk writes such as the backfill)."""
+        raise NotImplementedError
+
+    def get_files_pending_metadata(self, after_id: int = 0, limit: int = 100,
+                                   include_failed: bool = False) -> PendingPage:
+        """One page (keyset by id, all users) of files without metadata. Returns {"rows", "last_id"}."""
+        raise NotImplementedError
@@ -0,0 +1,280 @@
+# storage_cache.py
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a cached read stays fresh; 0 disables the cache
+DEFAULT_TTL_SECONDS = float(os.getenv("STORAGE_CACHE_TTL", "60"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("STORAGE_CACHE_MAX_ENTRIES", "512"))
+
+# Tighter bounds for reads whose results are large (full transcripts, all chunk vectors)
+LARGE_RESULT_LIMITS = {"get_transcript": 64, "get_embeddings": 16}
+
+# Cached reads and what they depend on: "files" (the user's file list),
+# "usage" (token usage totals) or "file" (one file, keyed by its id)
+CACHED_READS = {
+    "get_all_files": "files",
+    "list_files": "files",
+    "search_files": "files",
+    "get_token_usage_summary": "usage",
+    "get_token_usage_breakdown": "usage",
+    "get_token_usage_daily": "usage",
+    "get_file_details": "file",
+    "get_transcript": "file",
+    "get_metadata": "file",
+    "get_embeddings": "file",
+}
+
+
+class CachedStorageManager:
+    """
+    Per-user read-through cache in front of a storage manager.
+
+    Reads listed in CACHED_READS are answered from memory while fresh (TTL)
+    and evicted least-recently-used beyond max_entries. Writes made through
+    this wrapper drop the entries they affect, so a user always sees their own
+    changes; the TTL bounds staleness from writes made elsewhere (other
+    processes, the backfill). Everything else is passed to the backend.
+    Callers get their own copy of cached dicts and lists, so mutating a
+    result can't change what the next caller sees; chunk vectors are cached
+    as tuples and shared rather than copied on every hit.
+    Views from for_user() share the cache and its counters.
+    """
+
+    def __init__(self, backend, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # (owner_id, method, args) -> (expires_at, dependency, value)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # "generation" is bumped on every invalidation so in-flight reads don't cache stale results
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "generation": 0}
+        self._method_stats = {}
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined here: uncached methods, name, etc.
+        if name == "backend":
+            # Not set yet (e.g. while copy.copy builds a view)
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    def for_user(self, user_id, session_id=None, access_token=None):
+        """A view bound to one user that shares this cache."""
+        view = copy.copy(self)
+        view.backend = self.backend.for_user(user_id, session_id, access_token)
+        return view
+
+    # Cache internals
+
+    def _read(self, method, *args, **kwargs):
+        owner_id = self.backend._get_owner_id()
+        key = (owner_id, method, _hashable(args), _hashable(tuple(sorted(kwargs.items()))))
+        with self._lock:
+            counters = self._method_stats.setdefault(method, {"hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                counters["hits"] += 1
+                return _copy_result(method, entry[2])
+            self._counters["misses"] += 1
+            counters["misses"] += 1
+            generation = self._counters["generation"]
+
+        value = getattr(self.backend, method)(*args, **kwargs)
+        # Don't remember misses: the row may be written by another process any moment
+        if value is None:
+            return value
+
+        if method == "get_embeddings":
+            value = _freeze_embeddings(value)
+        dependency = CACHED_READS[method]
+        if dependency == "file":
+            dependency = ("file", int(args[0] if args else kwargs["file_id"]))
+        with self._lock:
+            # A write invalidated entries while we were reading; this value may predate it
+            if generation != self._counters["generation"]:
+                return value
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dependency, value)
+            self._entries.move_to_end(key)
+            self._enforce_bounds(method)
+        return _copy_result(method, value)
+
+    def _enforce_bounds(self, method):
+        """Evict least-recently-used entries beyond the overall and per-method limits."""
+        limit = LARGE_RESULT_LIMITS.get(method)
+        if limit is not None:
+            same_method = [key for key in self._entries if key[1] == method]
+            for key in same_method[:max(0, len(same_method) - limit)]:
+                del self._entries[key]
+                self._counters["evictions"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def invalidate(self, owner_id=None, dependencies=None):
+        """
+        Drop cached reads for one owner (or all owners) that depend on any of
+        `dependencies` ("files", "usage", ("file", id)); None drops everything.
+        """
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if (owner_id is None or key[0] == owner_id)
+                     and (dependencies is None or entry[1] in dependencies)]
+            for key in stale:
+                del self._entries[key]
+            self._counters["generation"] += 1
+            self._counters["invalidations"] += len(stale)
+
+    def _invalidate_own(self, *dependencies):
+        self.invalidate(self.backend._get_owner_id(), set(dependencies))
+
+    def _file_dependencies(self, file_ids):
+        return {("file", int(file_id)) for file_id in file_ids}
+
+    def stats(self):
+        """Return hit/miss counters and cache size for monitoring."""
+        with self._lock:
+            counters = dict(self._counters)
+            entries = len(self._entries)
+            method_stats = {method: dict(counts) for method, counts in self._method_stats.items()}
+        total = counters["hits"] + counters["misses"]
+        return {
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "hit_rate": counters["hits"] / total if total else 0.0,
+            "entries": entries,
+            "evictions": counters["evictions"],
+            "invalidations": counters["invalidations"],
+            "methods": {
+                method: {**counts, "hit_rate": counts["hits"] / (counts["hits"] + counts["misses"])}
+                for method, counts in method_stats.items() if counts["hits"] + counts["misses"]
+            }
+        }
+
+    # Cached reads
+
+    def get_all_files(self):
+        return self._read("get_all_files")
+
+    def list_files(self, *args, **kwargs):
+        return self._read("list_files", *args, **kwargs)
+
+    def search_files(self, *args, **kwargs):
+        return self._read("search_files", *args, **kwargs)
+
+    def get_file_details(self, file_id):
+        return self._read("get_file_details", file_id)
+
+    def get_transcript(self, file_id):
+        return self._read("get_transcript", file_id)
+
+    def get_metadata(self, file_id):
+        return self._read("get_metadata", file_id)
+
+    def get_embeddings(self, file_id):
+        return self._read("get_embeddings", file_id)
+
+    def get_token_usage_summary(self, file_id=None):
+        return self._read("get_token_usage_summary", file_id=file_id)
+
+    def get_token_usage_breakdown(self, group_by=None, file_id=None):
+        return self._read("get_token_usage_breakdown", group_by=group_by, file_id=file_id)
+
+    def get_token_usage_daily(self, since=None):
+        return self._read("get_token_usage_daily", since=since)
+
+    # Writes (each drops the cached reads it affects)
+
+    def save_transcript(self, *args, **kwargs):
+        result = self.backend.save_transcript(*args, **kwargs)
+        self._invalidate_own("files")
+        return result
+
+    def ingest_content(self, *args, **kwargs):
+        result = self.backend.ingest_content(*args, **kwargs)
+        self._invalidate_own("files", "usage")
+        return result
+
+    def save_metadata(self, file_id, metadata):
+        result = self.backend.save_metadata(file_id, metadata)
+        self._invalidate_own("files", *self._file_dependencies([file_id]))
+        return result
+
+    def save_summary_tree(self, file_id, summary_tree):
+        result = self.backend.save_summary_tree(file_id, summary_tree)
+        self._invalidate_own(*self._file_dependencies([file_id]))
+        return result
+
+    def save_embeddings(self, file_id, embeddings, texts):
+        result = self.backend.save_embeddings(file_id, embeddings, texts)
+        self._invalidate_own("files", *self._file_dependencies([file_id]))
+        return result
+
+    def save_token_usage(self, *args, **kwargs):
+        result = self.backend.save_token_usage(*args, **kwargs)
+        self._invalidate_own("usage")
+        return result
+
+    def save_token_usage_bulk(self, usage_rows):
+        result = self.backend.save_token_usage_bulk(usage_rows)
+        # Rows carry their own user ids (the backfill writes for many users)
+        for owner_id in {row.get("user_id") for row in usage_rows}:
+            self.invalidate(owner_id or self.backend._get_owner_id(), {"usage"})
+        return result
+
+    def save_metadata_bulk(self, items):
+        result = self.backend.save_metadata_bulk(items)
+        # Files may belong to any user
+        self.invalidate(None, {"files"} | self._file_dependencies(item["file_id"] for item in items))
+        return result
+
+    def update_processing_status(self, file_ids, status):
+        result = self.backend.update_processing_status(file_ids, status)
+        self.invalidate(None, {"files"} | self._file_dependencies(file_ids))
+        return result
+
+    def delete_file(self, file_id):
+        result = self.backend.delete_file(file_id)
+        self._invalidate_own("files", "usage", *self._file_dependencies([file_id]))
+        return result
+
+    def delete_files(self, file_ids):
+        result = self.backend.delete_files(file_ids)
+        self._invalidate_own("files", "usage", *self._file_dependencies(file_ids))
+        return result
+
+
+def _hashable(value):
+    """Make call arguments usable in a cache key (list_files takes a cursor dict)."""
+    if isinstance(value, dict):
+        return tuple((name, _hashable(item)) for name, item in sorted(value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+def _freeze_embeddings(value):
+    """Store a get_embeddings result with its chunk vectors as (immutable) tuples."""
+    items = [{**item, "embedding": tuple(item["embedding"])} for item in value.get("embeddings") or []]
+    return {**value, "embeddings": items}
+
+
+def _copy_result(method, value):
+    """
+    A private copy of a cached result (strings, numbers and None are immutable
+    already). Embeddings only get their containers copied: the vectors are
+    tuples, and deep-copying them would cost as much as the read it saves.
+    """
+    if method == "get_embeddings":
+        copied = {**value, "embeddings": [dict(item) for item in value["embeddings"]]}
+        if isinstance(value.get("texts"), list):
+            copied["texts"] = list(value["texts"])
+        return copied
+    if isinstance(value, (dict, list)):
+        return copy.deepcopy(value)
+    return value
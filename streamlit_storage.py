@@ -0,0 +1,95 @@
+# streamlit_storage.py
+
+import streamlit as st
+from storage_backend import EMPTY_USAGE
+from supabase_storage import get_storage_manager
+
+# Reads that show an error and fall back to an empty result in the UI
+READ_FALLBACKS = {
+    "get_all_files": ("fetching files", list),
+    "list_files": ("fetching files", lambda: {"files": [], "next_cursor": None}),
+    "search_files": ("searching files", list),
+    "get_file_details": ("fetching file details", lambda: None),
+    "get_transcript": ("fetching transcript", lambda: None),
+    "get_metadata": ("fetching metadata", lambda: None),
+    "get_embeddings": ("fetching embeddings", lambda: None),
+    "match_chunks": ("matching chunks", list),
+    "get_token_usage_summary": ("fetching token usage", lambda: dict(EMPTY_USAGE)),
+    "get_token_usage_breakdown": ("fetching usage breakdown", list),
+    "get_token_usage_daily": ("fetching daily token usage", list),
+}
+
+
+class StreamlitStorage:
+    """
+    Streamlit adapter over the shared storage manager: every call runs as the
+    session's user (user_id, or the anonymous session_id), and results are
+    reported with st messages. The storage core itself never touches the UI.
+    """
+
+    def __init__(self, storage_manager):
+        self.storage_manager = storage_manager
+
+    def _session_storage(self):
+        return self.storage_manager.for_user(st.session_state.get('user_id'),
+                                             st.session_state.get('session_id'),
+                                             st.session_state.get('access_token'))
+
+    def __getattr__(self, name):
+        attribute = getattr(self._session_storage(), name)
+        if name not in READ_FALLBACKS:
+            return attribute
+
+        action, fallback = READ_FALLBACKS[name]
+        def read(*args, **kwargs):
+            try:
+                return attribute(*args, **kwargs)
+            except Exception as e:
+                st.error(f"❌ Error {action}: {str(e)}")
+                return fallback()
+        return read
+
+    def save_transcript(self, *args, **kwargs):
+        result = self._session_storage().save_transcript(*args, **kwargs)
+        if result["success"]:
+            st.success(f"✅ Transcript saved with ID: {result['file_id']}")
+        else:
+            st.error(f"❌ Error saving transcript: {result['error']}")
+        return result
+
+    def save_metadata(self, file_id, metadata):
+        result = self._session_storage().save_metadata(file_id, metadata)
+        if result["success"]:
+            st.success("✅ Metadata saved successfully")
+        else:
+            st.error(f"❌ Error saving metadata: {result['error']}")
+        return result
+
+    def save_embeddings(self, file_id, embeddings, texts):
+        result = self._session_storage().save_embeddings(file_id, embeddings, texts)
+        if result["success"]:
+            st.success("✅ Embeddings saved successfully")
+        else:
+            st.error(f"❌ Error saving embeddings: {result['error']}")
+        return result
+
+    def delete_file(self, file_id):
+        result = self._session_storage().delete_files([file_id])
+        if not result["success"]:
+            st.error(f"❌ Error deleting file: {result['error']}")
+            return False
+        if not result["deleted_ids"]:
+            st.error("❌ File not found or access denied")
+            return False
+        return True
+
+
+def get_session_storage() -> StreamlitStorage:
+    """Storage for the current Streamlit session."""
+    return StreamlitStorage(get_storage_manager())
+
+
+def get_session_write_queue():
+    """Write-behind queue bound to the current Streamlit session's user."""
+    from write_queue import get_write_queue
+    return get_write_queue().for_user(st.session_state.get('user_id'), st.session_state.get('session_id'))
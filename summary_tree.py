@@ -0,0 +1,216 @@
+# summary_tree.py
+
+import heapq
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from dotenv import load_dotenv
+from llm_scheduler import get_scheduler
+
+load_dotenv()
+
+# Leaf sections of ~1500 tokens, grouped four at a time into parent summaries
+SECTION_CHARS = 6000
+BRANCH_FACTOR = 4
+SUMMARY_MAX_TOKENS = 300
+SUMMARY_MODEL = "llama3-70b-8192"
+# Default prompt budget for Direct Analysis context (1 token ≈ 4 characters)
+DEFAULT_DIRECT_CONTEXT_TOKENS = 3000
+
+# Node embeddings are recomputed per process, not persisted with the tree;
+# the most recently used trees' embeddings are kept (LRU)
+NODE_EMBEDDING_CACHE_SIZE = 64
+_node_embedding_cache = OrderedDict()
+_node_embedding_lock = threading.Lock()
+
+
+def split_sections(text, section_chars=SECTION_CHARS):
+    """
+    Split text into (start, end) sections of roughly section_chars,
+    preferring to break on whitespace.
+    """
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + section_chars, len(text))
+        if end < len(text):
+            # Break at the last whitespace in the final 10% of the section
+            cut = text.rfind(' ', start + int(section_chars * 0.9), end)
+            if cut > start:
+                end = cut
+        spans.append((start, end))
+        start = end
+    return spans
+
+
+def _summarize(text, instruction, groq_api_key):
+    """Summarize one piece of text. Returns (summary, token_usage)."""
+    response = get_scheduler().chat_completion(
+        groq_api_key,
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": "You are an expert content analyst. Write dense, factual summaries that keep names, numbers and key claims."},
+            {"role": "user", "content": f"{instruction}\n\n{text}"}
+        ],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0.2
+    )
+    content = response.choices[0].message.content
+    usage = {
+        "input_tokens": getattr(response.usage, 'prompt_tokens', 0) if response.usage else 0,
+        "output_tokens": getattr(response.usage, 'completion_tokens', 0) if response.usage else 0
+    }
+    return (content or "").strip(), usage
+
+
+def build_summary_tree(transcript, groq_api_key=None, section_chars=SECTION_CHARS,
+                       branch_factor=BRANCH_FACTOR, max_workers=4):
+    """
+    Build a hierarchical summary tree for a transcript.
+
+    Level 0 nodes are transcript sections (stored as offsets plus a summary);
+    each higher level summarizes up to `branch_factor` children, up to a single
+    root overview. Returns a JSON-serializable dict, or {"error": ...}.
+    """
+    if groq_api_key is None:
+        groq_api_key = os.getenv("GROK_API_KEY")
+    if not groq_api_key:
+        return {"error": "GROK_API_KEY not set"}
+
+    token_usage = {"input_tokens": 0, "output_tokens": 0, "estimated_cost": 0}
+
+    def add_usage(usage):
+        token_usage["input_tokens"] += usage["input_tokens"]
+        token_usage["output_tokens"] += usage["output_tokens"]
+
+    try:
+        nodes = []
+        spans = split_sections(transcript, section_chars)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            leaf_results = list(executor.map(
+                lambda span: _summarize(transcript[span[0]:span[1]],
+                                        "Summarize this section of a transcript in 3-5 sentences:",
+                                        groq_api_key),
+                spans
+            ))
+            for (start, end), (summary, usage) in zip(spans, leaf_results):
+                add_usage(usage)
+                nodes.append({"id": len(nodes), "level": 0, "start": start, "end": end,
+                              "summary": summary, "children": []})
+
+            level_ids = [node["id"] for node in nodes]
+            level = 0
+            while len(level_ids) > 1:
+                level += 1
+                groups = [level_ids[i:i + branch_factor] for i in range(0, len(level_ids), branch_factor)]
+                group_results = list(executor.map(
+                    lambda group: _summarize("\n\n".join(nodes[i]["summary"] for i in group),
+                                             "Combine these consecutive section summaries into one summary of 4-6 sentences:",
+                                             groq_api_key),
+                    groups
+                ))
+                level_ids = []
+                for group, (summary, usage) in zip(groups, group_results):
+                    add_usage(usage)
+                    nodes.append({"id": len(nodes), "level": level,
+                                  "start": nodes[group[0]]["start"], "end": nodes[group[-1]]["end"],
+                                  "summary": summary, "children": group})
+                    level_ids.append(nodes[-1]["id"])
+    except Exception as e:
+        return {"error": f"Groq API error: {e}"}
+
+    input_cost = (token_usage["input_tokens"] / 1000) * 0.00005
+    output_cost = (token_usage["output_tokens"] / 1000) * 0.00010
+    token_usage["estimated_cost"] = input_cost + output_cost
+
+    return {
+        "root": level_ids[0] if level_ids else None,
+        "nodes": nodes,
+        "transcript_length": len(transcript),
+        "section_chars": section_chars,
+        "created_at": datetime.now().isoformat(),
+        "token_usage": token_usage
+    }
+
+
+def is_tree_current(tree, transcript):
+    """True if the tree was built for this transcript."""
+    return bool(tree) and 'error' not in tree and tree.get("root") is not None \
+        and tree.get("transcript_length") == len(transcript)
+
+
+def _node_embeddings(tree):
+    """Embeddings of every node summary, cached per tree."""
+    import numpy as np
+    from embed_store import encode_texts
+    key = (tree.get("created_at"), tree.get("transcript_length"), len(tree["nodes"]))
+    with _node_embedding_lock:
+        embeddings = _node_embedding_cache.get(key)
+        if embeddings is not None:
+            _node_embedding_cache.move_to_end(key)
+            return embeddings
+
+    embeddings = encode_texts([node["summary"] or " " for node in tree["nodes"]])
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = embeddings / np.maximum(norms, 1e-12)
+    with _node_embedding_lock:
+        _node_embedding_cache[key] = embeddings
+        while len(_node_embedding_cache) > NODE_EMBEDDING_CACHE_SIZE:
+            _node_embedding_cache.popitem(last=False)
+    return embeddings
+
+
+def select_summary_context(tree, transcript, query, max_tokens=DEFAULT_DIRECT_CONTEXT_TOKENS):
+    """
+    Pick the parts of the summary tree most relevant to the query within a
+    token budget. Always starts from the root overview and descends best-first
+    by similarity; relevant leaf sections are included verbatim when they fit.
+    """
+    import numpy as np
+    max_chars = max_tokens * 4
+    if len(transcript) <= max_chars:
+        return transcript
+    if not is_tree_current(tree, transcript):
+        return transcript[:max_chars]
+
+    from embed_store import encode_texts
+    nodes = tree["nodes"]
+    query_emb = encode_texts([query])[0]
+    query_emb = query_emb / max(np.linalg.norm(query_emb), 1e-12)
+    similarities = _node_embeddings(tree) @ query_emb
+
+    selected = {}  # node id -> (kind, text)
+    used = 0
+    root = nodes[tree["root"]]
+    heap = [(-float(similarities[root["id"]]), root["id"])]
+    while heap:
+        _, node_id = heapq.heappop(heap)
+        node = nodes[node_id]
+        if node["level"] == 0:
+            section = transcript[node["start"]:node["end"]].strip()
+            if used + len(section) <= max_chars:
+                selected[node_id] = ("excerpt", section)
+                used += len(section)
+                continue
+        if used + len(node["summary"]) > max_chars:
+            continue
+        selected[node_id] = ("summary", node["summary"])
+        used += len(node["summary"])
+        for child_id in node["children"]:
+            heapq.heappush(heap, (-float(similarities[child_id]), child_id))
+
+    # Overview first, then everything else in document order
+    ordered = sorted(selected, key=lambda i: (i != tree["root"], nodes[i]["start"], -nodes[i]["level"]))
+    parts = []
+    for node_id in ordered:
+        kind, text = selected[node_id]
+        node = nodes[node_id]
+        if node_id == tree["root"]:
+            label = "Overview"
+        else:
+            position = f"characters {node['start']:,}-{node['end']:,}"
+            label = f"Excerpt ({position})" if kind == "excerpt" else f"Summary ({position})"
+        parts.append(f"[{label}]\n{text}")
+    return "\n---\n".join(parts)
@@ -65,6 +65,7 @@ class SupabaseAuth:
                 return {
                     "success": True,
                     "user": response.user,
+                    "access_token": response.session.access_token if response.session else None,
                     "message": "Login successful!"
                 }
             else:
@@ -192,6 +193,7 @@ def show_auth_ui():
             if st.button("🚪 Logout", type="secondary"):
                 if auth.sign_out():
                     st.session_state['user_id'] = None
+                    st.session_state['access_token'] = None
                     st.session_state['is_authenticated'] = False
                     st.rerun()
         
@@ -241,6 +243,7 @@ def show_auth_ui():
                     result = auth.sign_in_with_email(email, password)
                     if result['success']:
                         st.session_state['user_id'] = result['user'].id
+                        st.session_state['access_token'] = result['access_token']
                         st.session_state['is_authenticated'] = True
                         st.session_state['user_email'] = result['user'].email
                         st.rerun()
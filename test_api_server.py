@@ -0,0 +1,105 @@
+# test_api_server.py
+
+import time
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+import answer_cache
+import embed_store
+from api_server import JobStore, Pipeline, create_app
+from embed_store import IndexManager
+from local_storage import LocalStorageManager
+
+TOKENS = {"alice-token": "alice", "bob-token": "bob"}
+ALICE = {"Authorization": "Bearer alice-token"}
+BOB = {"Authorization": "Bearer bob-token"}
+
+
+class FakeEncoder:
+    """Stands in for the MiniLM encoder: letter counts, so similar texts get similar vectors."""
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), 26), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text.lower():
+                if "a" <= char <= "z":
+                    vectors[row, ord(char) - ord("a")] += 1
+        return vectors
+
+
+@pytest.fixture
+def processed():
+    return []
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, processed):
+    monkeypatch.setattr(embed_store, "_embedding_model", FakeEncoder())
+    monkeypatch.setattr(answer_cache, "answer_cache", None)
+
+    def process(source, filename, asr_options=None):
+        processed.append((source, filename, asr_options))
+        return "the quick brown fox jumps over the lazy dog"
+
+    pipeline = Pipeline(storage_manager=LocalStorageManager(str(tmp_path)), process_fn=process,
+                        metadata_fn=lambda transcript, key: {"title": "Fox"},
+                        answer_fn=lambda query, context, metadata, key: (f"answer to {query}", None),
+                        index_manager=IndexManager(), verify_token_fn=TOKENS.get, groq_api_key="test")
+    with TestClient(create_app(pipeline)) as test_client:
+        yield test_client
+
+
+def wait_for_job(client, job_id, headers=ALICE):
+    for _ in range(200):
+        job = client.get(f"/jobs/{job_id}", headers=headers).json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def submit(client, headers=ALICE, **form):
+    response = client.post("/content", data={"url": "https://www.youtube.com/watch?v=x", **form}, headers=headers)
+    assert response.status_code == 202
+    return wait_for_job(client, response.json()["job_id"], headers)
+
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Bearer wrong"}, {"X-User-Id": "alice"}])
+def test_requests_without_a_valid_token_are_rejected(client, headers):
+    assert client.get("/metrics", headers=headers).status_code == 401
+    assert client.post("/content", data={"url": "https://example.com"}, headers=headers).status_code == 401
+    assert client.get("/files/1/transcript", headers=headers).status_code == 401
+
+
+def test_submitted_content_is_processed_and_saved(client, processed):
+    job = submit(client, mode="preview", language="en")
+
+    assert job["status"] == "completed"
+    assert processed[0][2] == {"mode": "preview", "language": "en"}
+    transcript = client.get(f"/files/{job['file_id']}/transcript", headers=ALICE).json()["transcript"]
+    assert transcript == "the quick brown fox jumps over the lazy dog"
+    assert client.get(f"/files/{job['file_id']}/metadata", headers=ALICE).json()["metadata"] == {"title": "Fox"}
+    assert client.get(f"/jobs/{job['job_id']}", headers=BOB).status_code == 404
+
+
+def test_qa_only_answers_about_the_callers_files(client):
+    file_id = submit(client)["file_id"]
+
+    response = client.post(f"/files/{file_id}/qa", json={"query": "what jumps?"}, headers=ALICE)
+    assert response.status_code == 200
+    assert response.json()["answer"] == "answer to what jumps?"
+
+    assert client.post(f"/files/{file_id}/qa", json={"query": "what jumps?"}, headers=BOB).status_code == 404
+    assert client.get(f"/files/{file_id}/transcript", headers=BOB).status_code == 404
+
+
+def test_job_store_keeps_live_jobs_when_full():
+    jobs = JobStore(max_jobs=2)
+    first = jobs.create("alice", "a")
+    second = jobs.create("alice", "b")
+    assert jobs.create("alice", "c") is None
+
+    jobs.update(first["job_id"], status="completed")
+    assert jobs.create("alice", "c") is not None
+    assert jobs.get(first["job_id"]) is None
+    assert jobs.get(second["job_id"])["status"] == "queued"
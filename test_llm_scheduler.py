@@ -0,0 +1,129 @@
+# test_llm_scheduler.py
+
+import threading
+from types import SimpleNamespace
+import pytest
+from llm_scheduler import LLMScheduler, estimate_request_tokens
+
+MESSAGES = [{"role": "user", "content": "x" * 400}]  # ~100 prompt tokens
+
+
+class FakeClock:
+    """Manual clock; sleeping advances it instead of blocking."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class FakeServer:
+    """Stands in for the Groq client: answers from a script of errors, then succeeds."""
+
+    def __init__(self, errors=(), total_tokens=None):
+        self.errors = list(errors)
+        self.total_tokens = total_tokens
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        usage = SimpleNamespace(total_tokens=self.total_tokens) if self.total_tokens else None
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))], usage=usage)
+
+
+def make_scheduler(server, clock, **kwargs):
+    return LLMScheduler(client_factory=lambda api_key: server, sleep=clock.sleep, clock=clock,
+                        base_delay=0.01, **kwargs)
+
+
+def available_tokens(scheduler, api_key="key"):
+    budget = scheduler._budget(api_key)
+    budget.tokens._refill()
+    return budget.tokens.tokens
+
+
+def test_retries_rate_limits_and_honours_retry_after():
+    clock = FakeClock()
+    server = FakeServer(errors=[FakeAPIError(429, {"retry-after": "7"}), FakeAPIError(503)])
+    scheduler = make_scheduler(server, clock)
+
+    response = scheduler.chat_completion("key", MESSAGES, model="m", max_tokens=50)
+
+    assert response.choices[0].message.content == "ok"
+    assert server.calls == 3
+    assert clock.slept[0] >= 7
+    assert scheduler.stats["retries"] == 2
+    assert scheduler.stats["rate_limited"] == 1
+    assert scheduler.stats["requests"] == 3
+    assert scheduler.stats["failures"] == 0
+
+
+def test_non_retryable_error_is_raised_without_retrying():
+    clock = FakeClock()
+    server = FakeServer(errors=[FakeAPIError(401)])
+    scheduler = make_scheduler(server, clock)
+
+    with pytest.raises(FakeAPIError):
+        scheduler.chat_completion("key", MESSAGES, model="m")
+    assert server.calls == 1
+    assert scheduler.stats["failures"] == 1
+
+
+def test_failed_attempts_give_their_token_reservation_back():
+    clock = FakeClock()
+    server = FakeServer(errors=[FakeAPIError(429), FakeAPIError(429), FakeAPIError(400)])
+    scheduler = make_scheduler(server, clock, tokens_per_minute=6000)
+
+    with pytest.raises(FakeAPIError):
+        scheduler.chat_completion("key", MESSAGES, model="m", max_tokens=1000)
+    # Three failed attempts, none of which spent tokens
+    assert available_tokens(scheduler) == pytest.approx(6000)
+
+
+def test_successful_call_is_settled_with_reported_usage():
+    clock = FakeClock()
+    server = FakeServer(total_tokens=150)
+    scheduler = make_scheduler(server, clock, tokens_per_minute=6000)
+
+    scheduler.chat_completion("key", MESSAGES, model="m", max_tokens=1000)
+    assert estimate_request_tokens(MESSAGES, 1000) == 1100
+    assert available_tokens(scheduler) == pytest.approx(6000 - 150)
+
+
+def test_stats_stay_consistent_across_threads():
+    clock = FakeClock()
+    server = FakeServer(errors=[FakeAPIError(503) for _ in range(50)])
+    scheduler = make_scheduler(server, clock, requests_per_minute=10 ** 6,
+                               tokens_per_minute=10 ** 9, max_concurrency=8, max_retries=100)
+
+    def worker():
+        for _ in range(25):
+            scheduler.chat_completion("key", MESSAGES, model="m", max_tokens=10)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert scheduler.stats["requests"] == server.calls == 200 + 50
+    assert scheduler.stats["retries"] == 50
@@ -0,0 +1,146 @@
+# test_local_storage.py
+
+import os
+import pytest
+from local_storage import LocalStorageManager, to_fts_query
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStorageManager(str(tmp_path)).for_user("alice")
+
+
+def embedding_items(vectors, prefix="chunk"):
+    return [{"chunk": f"{prefix} {i}", "embedding": vector} for i, vector in enumerate(vectors)]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("cats dogs", '"cats" "dogs"'),
+    ('"exact phrase" cats', '"exact phrase" "cats"'),
+    ("cats OR dogs", '"cats" OR "dogs"'),
+    ("cats OR", '"cats"'),
+    ("OR cats", '"cats"'),
+    ("cats -dogs", '("cats") NOT "dogs"'),
+    ('AND NEAR( "*"', '"AND" "NEAR"'),
+    ("-dogs", None),
+    ("", None),
+    ("*** ()", None),
+])
+def test_to_fts_query(query, expected):
+    assert to_fts_query(query) == expected
+
+
+def test_ingest_saves_everything_in_one_call(store):
+    result = store.ingest_content(
+        filename="talk.mp4", transcript="a talk about cats", file_type="mp4",
+        metadata={"title": "Cats"}, embeddings=embedding_items([[1.0, 0.0], [0.0, 1.0]]),
+        token_usage=[{"operation": "metadata_generation", "input_tokens": 10,
+                      "output_tokens": 5, "estimated_cost": 0.01}]
+    )
+    assert result["success"]
+    assert result["processing_status"] == "embeddings_saved"
+    assert result["chunk_count"] == 2
+
+    file_id = result["file_id"]
+    assert store.get_transcript(file_id) == "a talk about cats"
+    assert store.get_metadata(file_id) == {"title": "Cats"}
+    assert store.get_embeddings(file_id)["texts"] == ["chunk 0", "chunk 1"]
+    assert store.get_token_usage_summary()["total_input_tokens"] == 10
+
+
+def test_ingest_with_same_client_op_id_is_not_duplicated(store):
+    first = store.ingest_content(filename="a.txt", transcript="hello", client_op_id="op-1")
+    second = store.ingest_content(filename="a.txt", transcript="hello", client_op_id="op-1")
+    assert second["file_id"] == first["file_id"]
+    assert second["duplicate"]
+    assert len(store.get_all_files()) == 1
+
+
+def test_search_ranks_filename_matches_first(store):
+    transcript_hit = store.ingest_content(filename="notes.txt", transcript="quantum physics lecture")["file_id"]
+    filename_hit = store.ingest_content(filename="physics_101.pdf", transcript="unrelated text")["file_id"]
+    store.ingest_content(filename="other.txt", transcript="nothing here")
+
+    results = store.search_files("physics")
+    assert [row["id"] for row in results] == [filename_hit, transcript_hit]
+    assert results[0]["filename_match"] and not results[1]["filename_match"]
+    assert "**physics**" in results[1]["snippet"]
+
+
+def test_search_tolerates_fts_syntax(store):
+    store.ingest_content(filename="a.txt", transcript="cats and dogs")
+    assert store.search_files('"cats') != []
+    assert store.search_files("NEAR(") == []
+    assert store.search_files("cats -dogs") == []
+
+
+def test_match_chunks_returns_nearest_owned_chunks(store, tmp_path):
+    near = store.ingest_content(filename="a.txt", transcript="a",
+                                embeddings=embedding_items([[1.0, 0.0], [0.6, 0.8]], "a"))["file_id"]
+    far = store.ingest_content(filename="b.txt", transcript="b",
+                               embeddings=embedding_items([[0.0, 1.0]], "b"))["file_id"]
+    LocalStorageManager(str(tmp_path)).for_user("bob").ingest_content(
+        filename="c.txt", transcript="c", embeddings=embedding_items([[1.0, 0.0]], "c"))
+
+    matches = store.match_chunks([1.0, 0.0], match_count=2)
+    assert [(m["file_id"], m["content"]) for m in matches] == [(near, "a 0"), (near, "a 1")]
+    assert matches[0]["similarity"] == pytest.approx(1.0)
+
+    within_file = store.match_chunks([1.0, 0.0], file_id=far)
+    assert [m["content"] for m in within_file] == ["b 0"]
+
+
+def test_list_files_pages_with_keyset_cursor(store):
+    ids = [store.ingest_content(filename=f"{i}.txt", transcript=str(i))["file_id"] for i in range(5)]
+
+    seen = []
+    cursor = None
+    while True:
+        page = store.list_files(limit=2, cursor=cursor)
+        seen += [row["id"] for row in page["files"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == list(reversed(ids))
+
+
+def test_delete_cascades_to_related_rows_and_vectors(store):
+    file_id = store.ingest_content(
+        filename="a.txt", transcript="a", metadata={"title": "A"},
+        embeddings=embedding_items([[1.0, 0.0]]),
+        token_usage=[{"operation": "qa", "input_tokens": 1, "output_tokens": 1, "estimated_cost": 0.0}]
+    )["file_id"]
+    assert os.path.exists(store._vector_path(file_id))
+
+    assert store.delete_files([file_id, 9999]) == {"success": True, "deleted_ids": [file_id]}
+    assert not os.path.exists(store._vector_path(file_id))
+    for table in ("metadata", "embedding_chunks", "token_usage"):
+        assert store._query(f"SELECT * FROM {table} WHERE file_id = ?", (file_id,)) == []
+
+
+def test_other_users_files_are_neither_readable_nor_writable(store):
+    file_id = store.ingest_content(filename="a.txt", transcript="secret", metadata={"title": "A"},
+                                   embeddings=embedding_items([[1.0, 0.0]]))["file_id"]
+    bob = store.for_user("bob")
+
+    assert bob.get_transcript(file_id) is None
+    assert bob.get_metadata(file_id) is None
+    assert bob.get_embeddings(file_id) is None
+    assert not bob.save_metadata(file_id, {"title": "B"})["success"]
+    assert not bob.save_summary_tree(file_id, {"levels": []})["success"]
+    assert not bob.save_embeddings(file_id, embedding_items([[0.0, 1.0]]), ["x"])["success"]
+    assert bob.delete_files([file_id])["deleted_ids"] == []
+
+    assert store.get_metadata(file_id) == {"title": "A"}
+    assert store.get_embeddings(file_id)["embeddings"][0]["embedding"] == [1.0, 0.0]
+
+
+def test_pending_metadata_includes_files_without_a_status(store):
+    pending = store.ingest_content(filename="a.txt", transcript="a")["file_id"]
+    done = store.ingest_content(filename="b.txt", transcript="b", metadata={"title": "B"})["file_id"]
+    with store._lock, store._conn:
+        store._conn.execute("UPDATE content_files SET processing_status = NULL WHERE id = ?", (pending,))
+
+    rows = store.get_files_pending_metadata(0, 10)["rows"]
+    assert [row["id"] for row in rows] == [pending]
+    assert done not in [row["id"] for row in rows]
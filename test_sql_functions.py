@@ -0,0 +1,160 @@
+# test_sql_functions.py
+#
+# Runs setup_database.sql and setup_pgvector.sql against a real PostgreSQL
+# (with pgvector, pg_trgm and uuid-ossp, as on Supabase) and exercises the
+# SQL functions the app relies on. TEST_DATABASE_URL must point to a
+# throwaway database: its public schema is dropped and recreated.
+
+import json
+import os
+from contextlib import contextmanager
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = [
+    pytest.mark.postgres,
+    pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set"),
+]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DIMENSIONS = 384
+EXACT_SEARCH_MAX_CHUNKS = 20000
+
+# Supabase provides these; a plain PostgreSQL needs stand-ins
+SUPABASE_PREREQUISITES = """
+DO $$
+DECLARE
+    role_name TEXT;
+BEGIN
+    FOREACH role_name IN ARRAY ARRAY['anon', 'authenticated', 'service_role'] LOOP
+        IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = role_name) THEN
+            EXECUTE format('CREATE ROLE %I', role_name);
+        END IF;
+    END LOOP;
+END;
+$$;
+CREATE SCHEMA IF NOT EXISTS auth;
+CREATE OR REPLACE FUNCTION auth.uid() RETURNS UUID LANGUAGE sql STABLE AS $$
+    SELECT NULLIF(current_setting('request.jwt.claim.sub', true), '')::UUID
+$$;
+"""
+
+
+def vector(*hot, dimensions=DIMENSIONS):
+    """A unit-ish vector with 1.0 at the given positions, in pgvector's text form."""
+    values = [0.0] * dimensions
+    for position in hot:
+        values[position] = 1.0
+    return json.dumps(values)
+
+
+@pytest.fixture(scope="module")
+def db():
+    psycopg2 = pytest.importorskip("psycopg2")
+    connection = psycopg2.connect(TEST_DATABASE_URL)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+        cursor.execute(SUPABASE_PREREQUISITES)
+        for script in ("setup_database.sql", "setup_pgvector.sql"):
+            with open(os.path.join(HERE, script), encoding="utf-8") as file:
+                cursor.execute(file.read())
+    yield connection
+    connection.close()
+
+
+@contextmanager
+def transaction(db):
+    """Run statements in one transaction (so transaction-local settings can be inspected), then roll back."""
+    db.autocommit = False
+    try:
+        yield
+    finally:
+        db.rollback()
+        db.autocommit = True
+
+
+def call(db, sql, params=None):
+    with db.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def ingest(db, user_id, filename, **named):
+    arguments = ", ".join(f"{name} := %s" for name in named)
+    sql = f"SELECT ingest_content(p_user_id := %s, p_filename := %s, p_transcript := 'text'" \
+          f"{', ' + arguments if arguments else ''})"
+    return call(db, sql, (user_id, filename, *named.values()))[0][0]
+
+
+def test_ingest_with_the_same_client_op_id_returns_the_first_file(db):
+    first = ingest(db, "op-user", "a.txt", p_client_op_id="op-1", p_metadata=json.dumps({"title": "A"}))
+    second = ingest(db, "op-user", "a.txt", p_client_op_id="op-1", p_metadata=json.dumps({"title": "A"}))
+
+    assert not first["duplicate"] and second["duplicate"]
+    assert second["file_id"] == first["file_id"]
+    assert second["metadata_id"] == first["metadata_id"]
+    assert call(db, "SELECT COUNT(*) FROM content_files WHERE user_id = 'op-user'") == [(1,)]
+    assert call(db, "SELECT COUNT(*) FROM metadata WHERE file_id = %s", (first["file_id"],)) == [(1,)]
+
+
+def test_ingest_writes_everything_or_nothing(db):
+    chunks = [{"chunk_index": 0, "content": "a", "embedding": vector(0)}]
+    usage = [{"operation": "metadata_generation", "input_tokens": 3, "output_tokens": 2, "estimated_cost": 0.1}]
+    saved = ingest(db, "atomic-user", "a.txt", p_chunks=json.dumps(chunks), p_token_usage=json.dumps(usage))
+    assert saved["chunk_count"] == 1 and len(saved["token_usage_ids"]) == 1
+    assert saved["processing_status"] == "embeddings_saved"
+
+    # A chunk with the wrong dimension fails the insert after the content row was written
+    broken = [{"chunk_index": 0, "content": "b", "embedding": vector(0, dimensions=3)}]
+    with pytest.raises(Exception):
+        ingest(db, "atomic-user", "b.txt", p_chunks=json.dumps(broken), p_token_usage=json.dumps(usage))
+    assert call(db, "SELECT filename FROM content_files WHERE user_id = 'atomic-user'") == [("a.txt",)]
+    assert call(db, "SELECT COUNT(*) FROM token_usage WHERE user_id = 'atomic-user'") == [(1,)]
+
+
+def match(db, user_id, query, file_id=None, match_count=5):
+    return call(db, "SELECT file_id, content, similarity FROM match_chunks(%s, %s::vector, %s, %s)",
+                (user_id, query, file_id, match_count))
+
+
+def test_small_library_is_ranked_exactly_among_other_users_chunks(db):
+    # Plenty of other users' chunks closer to the query than any of small-user's:
+    # an HNSW scan filtered afterwards would come back short
+    call(db, f"""
+        INSERT INTO embedding_chunks (file_id, user_id, chunk_index, content, embedding)
+        SELECT NULL, 'crowd-user', n, 'crowd ' || n,
+               (SELECT ('[' || string_agg(CASE WHEN d = 1 THEN '1' WHEN d = 2 + n % 50 THEN '0.1' ELSE '0' END, ',')
+                        || ']') FROM generate_series(1, {DIMENSIONS}) AS d)::vector
+        FROM generate_series(1, 2000) AS n
+        RETURNING 1
+    """)
+    chunks = [{"chunk_index": i, "content": f"mine {i}", "embedding": vector(100 + i)} for i in range(5)]
+    file_id = ingest(db, "small-user", "mine.txt", p_chunks=json.dumps(chunks))["file_id"]
+
+    with transaction(db):
+        rows = match(db, "small-user", vector(0, 100))
+        assert call(db, "SELECT current_setting('hnsw.ef_search')") == [("40",)]
+    assert [content for _, content, _ in rows][0] == "mine 0"
+    assert len(rows) == 5 and {row[0] for row in rows} == {file_id}
+
+    within_file = match(db, "small-user", vector(101), file_id=file_id, match_count=1)
+    assert [content for _, content, _ in within_file] == ["mine 1"]
+
+
+def test_large_library_uses_hnsw_with_a_raised_ef_search(db):
+    call(db, f"""
+        INSERT INTO embedding_chunks (file_id, user_id, chunk_index, content, embedding)
+        SELECT NULL, 'large-user', n, 'large ' || n,
+               (SELECT ('[' || string_agg(CASE WHEN d = 1 + n % {DIMENSIONS} THEN '1' ELSE '0' END, ',')
+                        || ']') FROM generate_series(1, {DIMENSIONS}) AS d)::vector
+        FROM generate_series(1, {EXACT_SEARCH_MAX_CHUNKS}) AS n
+        RETURNING 1
+    """)
+
+    with transaction(db):
+        rows = match(db, "large-user", vector(7), match_count=10)
+        assert call(db, "SELECT current_setting('hnsw.ef_search')") == [("200",)]
+    assert len(rows) == 10
+    assert rows[0][2] == pytest.approx(1.0)
@@ -0,0 +1,57 @@
+# test_storage_cache.py
+
+import threading
+import pytest
+from local_storage import LocalStorageManager
+from storage_cache import CachedStorageManager
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CachedStorageManager(LocalStorageManager(str(tmp_path))).for_user("alice")
+
+
+def test_mutating_a_result_does_not_change_the_cache(cache):
+    file_id = cache.ingest_content(filename="a.txt", transcript="a", metadata={"title": "A", "topics": ["x"]},
+                                   embeddings=[{"chunk": "a", "embedding": [1.0, 0.0]}])["file_id"]
+
+    metadata = cache.get_metadata(file_id)
+    metadata["topics"].append("y")
+    metadata.pop("title")
+    assert cache.get_metadata(file_id) == {"title": "A", "topics": ["x"]}
+
+    embeddings = cache.get_embeddings(file_id)
+    embeddings["embeddings"][0]["chunk"] = "changed"
+    embeddings["texts"].append("extra")
+    assert cache.get_embeddings(file_id)["embeddings"] == [{"chunk": "a", "embedding": (1.0, 0.0)}]
+    assert cache.get_embeddings(file_id)["texts"] == ["a"]
+
+
+def test_hits_share_the_cached_vectors(cache):
+    file_id = cache.ingest_content(filename="a.txt", transcript="a",
+                                   embeddings=[{"chunk": "a", "embedding": [1.0, 0.0]}])["file_id"]
+    first = cache.get_embeddings(file_id)["embeddings"][0]["embedding"]
+    second = cache.get_embeddings(file_id)["embeddings"][0]["embedding"]
+    assert first is second
+    assert cache.stats()["methods"]["get_embeddings"]["hits"] == 1
+
+
+def test_stats_can_be_read_while_new_methods_are_recorded(cache):
+    file_ids = [cache.ingest_content(filename=f"{i}.txt", transcript=str(i))["file_id"] for i in range(20)]
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            cache.stats()
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        for file_id in file_ids:
+            cache.get_transcript(file_id)
+            cache.get_file_details(file_id)
+            cache.search_files(str(file_id))
+    finally:
+        stop.set()
+        thread.join()
+    assert cache.stats()["methods"]["get_transcript"]["misses"] == 20
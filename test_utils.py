@@ -0,0 +1,20 @@
+# test_utils.py
+
+from utils import join_pieces, piece_at
+
+
+def test_join_pieces_reports_where_each_piece_starts():
+    offsets = []
+    text = join_pieces(["  first page", "", "third page  "], offsets=offsets)
+    assert text == "first page\n\nthird page"
+    assert offsets == [(1, 0), (2, 11), (3, 12)]
+    assert [piece_at(offsets, position) for position in (0, 10, 12, len(text) - 1)] == [1, 1, 3, 3]
+
+
+def test_join_pieces_keeps_numbers_of_skipped_pieces():
+    offsets = []
+    text = join_pieces(["slide one", "", "slide three"], skip_empty=True, offsets=offsets)
+    assert text == "slide one\nslide three"
+    assert offsets == [(1, 0), (3, 10)]
+    assert text[offsets[1][1]:] == "slide three"
+
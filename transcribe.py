@@ -2,13 +2,11 @@
 
 import os
 import tempfile
-import whisper
-from moviepy.video.io.VideoFileClip import VideoFileClip
-import yt_dlp
 import shutil
 import re
 import subprocess
-from utils import extract_text_from_file, get_file_type
+from extractors import resolve_extractor
+from asr import transcribe_with_options
 
 def check_ffmpeg_available():
     """
@@ -36,122 +34,143 @@ def is_valid_youtube_url(url):
             return True
     return False
 
-def process_content(file_path_or_url):
+def download_youtube_video(url):
     """
-    Process video, audio, or document files to extract text content.
-    Returns transcript/text content as string.
+    Download a YouTube video to a temporary .mp4 file.
+    Returns the file path, or an error string starting with "[".
     """
-    # If input is a YouTube URL, download the video first
-    if file_path_or_url.startswith('http'):
-        # Validate YouTube URL first
-        if not is_valid_youtube_url(file_path_or_url):
-            return "[Error: Invalid YouTube URL. Please provide a valid YouTube video URL.]"
-            
-        with tempfile.TemporaryDirectory() as temp_dir:
-            output_path = os.path.join(temp_dir, 'video.mp4')
-            ydl_opts = {
-                'outtmpl': output_path,
-                'format': 'best[ext=mp4]/best',  # Simplified format selection
-                'merge_output_format': 'mp4',
-                'ignoreerrors': True,  # Continue on errors
-                'no_warnings': True,   # Reduce noise
-                'quiet': True,         # Quiet mode
-                'extract_flat': False, # Extract full video
-                'nocheckcertificate': True,  # Skip certificate verification
-                'prefer_ffmpeg': True, # Prefer ffmpeg for merging
-            }
-            try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    # First, try to extract info to validate URL
-                    info = ydl.extract_info(file_path_or_url, download=False)
-                    if info is None:
-                        return "[Error: Could not extract video info. Please check the URL and try again.]"
-                    
-                    # Download the video
-                    ydl.download([file_path_or_url])
-                    
-                    # Check if file was actually downloaded
-                    if not os.path.exists(output_path):
-                        return "[Error: Video download failed. Please check the URL and try again.]"
-                        
-            except Exception as e:
-                return f"[YouTube download error: {str(e)}. Please check the URL and try again.]"
-            
-            # Move the downloaded file to a temp file for processing
-            with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_vid:
-                shutil.copyfile(output_path, temp_vid.name)
-                file_path = temp_vid.name
-    else:
-        file_path = file_path_or_url
-
-    # Determine file type and process accordingly
-    file_type = get_file_type(file_path)
-    
-    # Handle document files
-    if file_type in ['pdf', 'doc', 'docx', 'txt', 'ppt', 'pptx', 'xls', 'xlsx']:
-        try:
-            content = extract_text_from_file(file_path, file_type)
-            if content.startswith("[Error:"):
-                return content
-            return content
-        except Exception as e:
-            return f"[Error processing document: {e}]"
-    
-    # Handle audio files
-    elif file_type in ['wav', 'mp3', 'm4a']:
+    # Validate YouTube URL first
+    if not is_valid_youtube_url(url):
+        return "[Error: Invalid YouTube URL. Please provide a valid YouTube video URL.]"
+        
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, 'video.mp4')
+        ydl_opts = {
+            'outtmpl': output_path,
+            'format': 'best[ext=mp4]/best',  # Simplified format selection
+            'merge_output_format': 'mp4',
+            'ignoreerrors': True,  # Continue on errors
+            'no_warnings': True,   # Reduce noise
+            'quiet': True,         # Quiet mode
+            'extract_flat': False, # Extract full video
+            'nocheckcertificate': True,  # Skip certificate verification
+            'prefer_ffmpeg': True, # Prefer ffmpeg for merging
+        }
         try:
-            # Load Whisper model and transcribe audio directly
-            model = whisper.load_model('base')
-            result = model.transcribe(file_path)
-            transcript = result['text']
-            
-            if isinstance(transcript, str) and not transcript.strip():
-                return "[Warning: Transcription completed but no text was detected. The audio might be silent or contain no speech.]"
+            import yt_dlp
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                # First, try to extract info to validate URL
+                info = ydl.extract_info(url, download=False)
+                if info is None:
+                    return "[Error: Could not extract video info. Please check the URL and try again.]"
                 
-            return transcript
-        except Exception as e:
-            return f"[Error transcribing audio: {e}]"
-    
-    # Handle video files
-    elif file_type in ['mp4', 'mov', 'avi', 'mkv']:
-        # Extract audio to a temporary file
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as audio_temp:
-            audio_path = audio_temp.name
-        try:
-            # Check if ffmpeg is available
-            if not check_ffmpeg_available():
-                return "[Error: ffmpeg is not available. This is required for video processing. Please contact support or try uploading an audio file instead.]"
-            
-            # Extract audio
-            video = VideoFileClip(file_path)
-            if video.audio is None:
-                return "[Error: No audio track found in the video.]"
+                # Download the video
+                ydl.download([url])
                 
-            video.audio.write_audiofile(audio_path, logger=None)
+                # Check if file was actually downloaded
+                if not os.path.exists(output_path):
+                    return "[Error: Video download failed. Please check the URL and try again.]"
+                    
+        except Exception as e:
+            return f"[YouTube download error: {str(e)}. Please check the URL and try again.]"
+        
+        # Move the downloaded file to a temp file for processing
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_vid:
+            shutil.copyfile(output_path, temp_vid.name)
+            return temp_vid.name
 
-            # Load Whisper model (use 'base' for speed, 'small' or 'medium' for better accuracy)
-            model = whisper.load_model('base')
-            result = model.transcribe(audio_path)
-            transcript = result['text']
+def transcribe_audio_file(file_path, options=None):
+    """
+    Transcribe an audio file with the configured ASR backend.
+    `options` are per-job transcription options (see asr.resolve_transcription_options).
+    """
+    try:
+        # Models are loaded once per process and reused
+        result = transcribe_with_options(file_path, options)
+        transcript = result['text']
+        
+        if isinstance(transcript, str) and not transcript.strip():
+            return "[Warning: Transcription completed but no text was detected. The audio might be silent or contain no speech.]"
             
-            if isinstance(transcript, str) and not transcript.strip():
-                return "[Warning: Transcription completed but no text was detected. The video might be silent or contain no speech.]"
-                
-        except Exception as e:
-            if "ffmpeg" in str(e).lower():
-                return "[Error: ffmpeg is not properly installed or configured. This is required for video processing.]"
-            else:
-                return f"[Transcription failed: {e}]"
-        finally:
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
-            # Clean up downloaded YouTube video
-            if file_path_or_url.startswith('http') and os.path.exists(file_path):
-                os.remove(file_path)
         return transcript
-    
+    except Exception as e:
+        return f"[Error transcribing audio: {e}]"
+
+def transcribe_video_file(file_path, options=None):
+    """
+    Extract the audio track of a video file and transcribe it with the
+    configured ASR backend.
+    `options` are per-job transcription options (see asr.resolve_transcription_options).
+    """
+    # Extract audio to a temporary file
+    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as audio_temp:
+        audio_path = audio_temp.name
+    try:
+        # Check if ffmpeg is available
+        if not check_ffmpeg_available():
+            return "[Error: ffmpeg is not available. This is required for video processing. Please contact support or try uploading an audio file instead.]"
+        
+        # Extract audio
+        from moviepy.video.io.VideoFileClip import VideoFileClip
+        video = VideoFileClip(file_path)
+        if video.audio is None:
+            return "[Error: No audio track found in the video.]"
+            
+        video.audio.write_audiofile(audio_path, logger=None)
+
+        result = transcribe_with_options(audio_path, options, duration=video.duration)
+        transcript = result['text']
+        
+        if isinstance(transcript, str) and not transcript.strip():
+            return "[Warning: Transcription completed but no text was detected. The video might be silent or contain no speech.]"
+            
+    except Exception as e:
+        if "ffmpeg" in str(e).lower():
+            return "[Error: ffmpeg is not properly installed or configured. This is required for video processing.]"
+        else:
+            return f"[Transcription failed: {e}]"
+    finally:
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+    return transcript
+
+def process_content(file_path_or_url, filename=None, asr_options=None):
+    """
+    Process video, audio, or document files to extract text content.
+    The file type is detected from the content; `filename` (e.g. the original
+    upload name) is only used as a hint. `asr_options` (mode, language,
+    model_size, ...) apply to audio and video only.
+    Returns transcript/text content as string.
+    """
+    # If input is a YouTube URL, download the video first
+    is_url = file_path_or_url.startswith('http')
+    if is_url:
+        file_path = download_youtube_video(file_path_or_url)
+        if file_path.startswith('['):
+            return file_path
     else:
-        return f"[Error: Unsupported file type: {file_type}]"
+        file_path = file_path_or_url
+
+    try:
+        # Determine file type from content and dispatch to the registered extractor
+        try:
+            extractor = resolve_extractor(file_path, filename)
+        except ValueError as e:
+            return f"[Error: {e}]"
+        
+        # Handle document files
+        if extractor.category == 'document':
+            try:
+                return extractor.extract(file_path)
+            except Exception as e:
+                return f"[Error processing document: {e}]"
+        
+        # Handle audio and video files
+        return extractor.extract(file_path, options=asr_options)
+    finally:
+        # Clean up downloaded YouTube video
+        if is_url and os.path.exists(file_path):
+            os.remove(file_path)
 
 # Keep the old function name for backward compatibility
 def transcribe_video(video_path_or_url):
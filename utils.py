@@ -1,61 +1,253 @@
 # utils.py
 
 import os
-from groq import Groq
-import PyPDF2
-import docx
-import pandas as pd
-from pptx import Presentation
+import bisect
+import hashlib
+import multiprocessing
+import tempfile
+import uuid
+from llm_scheduler import get_scheduler
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+# PDFs with at least this many pages are extracted across a process pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_PARALLEL_MAX_WORKERS = int(os.getenv("PDF_PARALLEL_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Caps for spreadsheet extraction - plenty for analysis without exhausting memory
+EXCEL_MAX_ROWS_PER_SHEET = int(os.getenv("EXCEL_MAX_ROWS_PER_SHEET", "5000"))
+EXCEL_MAX_COLUMNS = int(os.getenv("EXCEL_MAX_COLUMNS", "50"))
+
+# Uploads are copied to disk in pieces of this size
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Extraction, transcription (transcribe.py, this module) and Groq calls (qa_engine.py)
+# report failures in-band as bracketed messages such as "[Error: ...]"
+ERROR_PREFIXES = ("[Error", "[Warning", "[Transcription failed", "[YouTube download error", "[Groq API error")
+
+
+def is_error_text(text):
+    """True when a result is one of those failure messages (or not text at all)."""
+    return not isinstance(text, str) or text.startswith(ERROR_PREFIXES)
 
 def allowed_file(filename):
     return filename.lower().endswith((".mp4", ".mov", ".avi", ".mkv", ".wav", ".mp3", ".m4a", 
                                     ".pdf", ".doc", ".docx", ".txt", ".ppt", ".pptx", ".xls", ".xlsx"))
 
 
-def chunk_text(text, chunk_size=500, overlap=50):
+def save_upload_to_temp(uploaded_file, chunk_size=UPLOAD_CHUNK_BYTES, filename=None):
     """
-    Split text into overlapping chunks for embedding.
+    Stream a file-like upload into a uniquely named temp file in chunks,
+    computing its SHA-256 on the way. The file keeps the upload's extension
+    (taken from `filename` or the upload's `name`).
+    Returns (temp_path, sha256_hex, size_bytes); the caller removes the file.
     """
-    chunks = []
+    suffix = os.path.splitext(filename or getattr(uploaded_file, 'name', '') or '')[1]
+    hasher = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(prefix="upload_", suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            if hasattr(uploaded_file, 'seek'):
+                uploaded_file.seek(0)
+            while True:
+                chunk = uploaded_file.read(chunk_size)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, hasher.hexdigest(), size
+
+def youtube_filename():
+    """Stored filename for a downloaded YouTube video, unique even for jobs started in the same second."""
+    return f"youtube_{uuid.uuid4().hex[:12]}.mp4"
+
+
+def chunk_spans(text, chunk_size=500, overlap=50):
+    """
+    Return (start, end) character offsets of the overlapping chunks of text.
+    """
+    spans = []
     start = 0
     while start < len(text):
         end = min(start + chunk_size, len(text))
-        chunks.append(text[start:end])
+        spans.append((start, end))
         start += chunk_size - overlap
-    return chunks
+    return spans
+
+
+def chunk_text(text, chunk_size=500, overlap=50):
+    """
+    Split text into overlapping chunks for embedding.
+    """
+    return [text[start:end] for start, end in chunk_spans(text, chunk_size, overlap)]
 
 
 def extract_text_from_file(file_path, file_type):
     """
     Extract text from different file types.
     """
+    from extractors import get_extractor
+    extractor = get_extractor(file_type)
+    if extractor is None or extractor.category != 'document':
+        return f"[Error: Unsupported file type: {file_type}]"
     try:
-        if file_type in ['pdf']:
-            return extract_text_from_pdf(file_path)
-        elif file_type in ['doc', 'docx']:
-            return extract_text_from_docx(file_path)
-        elif file_type in ['txt']:
-            return extract_text_from_txt(file_path)
-        elif file_type in ['ppt', 'pptx']:
-            return extract_text_from_ppt(file_path)
-        elif file_type in ['xls', 'xlsx']:
-            return extract_text_from_excel(file_path)
-        else:
-            return f"[Error: Unsupported file type: {file_type}]"
+        return extractor.extract(file_path)
     except Exception as e:
         return f"[Error extracting text from {file_type}: {e}]"
 
 
-def extract_text_from_pdf(file_path):
-    """Extract text from PDF file."""
+def join_pieces(pieces, separator="\n", skip_empty=False, offsets=None):
+    """
+    Join text pieces (pages, paragraphs, slides) in a single pass.
+    If an `offsets` list is passed, a (piece_number, start) pair is appended
+    to it for each piece kept: its 1-based number (skipped empty pieces keep
+    theirs) and where it starts in the returned text.
+    """
+    parts = []
+    starts = []
+    position = 0
+    for piece_number, piece in enumerate(pieces, 1):
+        piece = piece or ""
+        if skip_empty and not piece:
+            continue
+        if parts:
+            parts.append(separator)
+            position += len(separator)
+        parts.append(piece)
+        starts.append((piece_number, position))
+        position += len(piece)
+    text = "".join(parts)
+    stripped = text.strip()
+    if offsets is not None:
+        # Strip once, shifting the starts to match
+        leading = len(text) - len(text.lstrip())
+        offsets.extend((piece_number, min(max(start - leading, 0), len(stripped)))
+                       for piece_number, start in starts)
+    return stripped
+
+
+def piece_at(offsets, position):
+    """Number of the piece (page, paragraph, slide) containing a text position, from join_pieces offsets."""
+    index = bisect.bisect_right([start for _, start in offsets], position) - 1
+    return offsets[max(index, 0)][0] if offsets else None
+
+
+def iter_pdf_pages(file_path):
+    """Yield the text of each PDF page in order."""
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        yield from _iter_reader_pages(PyPDF2.PdfReader(file))
+
+
+def _iter_reader_pages(pdf_reader):
+    for page in pdf_reader.pages:
+        yield page.extract_text() or ""
+
+
+def _extract_pdf_page_range(file_path, start, end):
+    """Process-pool worker: open the PDF independently and extract pages [start, end)."""
+    import PyPDF2
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def iter_pdf_pages_parallel(file_path, max_workers=None):
+    """
+    Yield PDF page texts in order, extracting page ranges in worker processes.
+    PDFs below PDF_PARALLEL_MIN_PAGES (or with a single worker) stay serial, and
+    so does extraction that already runs in a worker process (the API and the
+    ingest CLI extract in their own pools; a pool per file would oversubscribe the CPUs).
+    """
+    import PyPDF2
+    max_workers = max_workers or PDF_PARALLEL_MAX_WORKERS
+    if multiprocessing.parent_process() is not None:
+        max_workers = 1
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        page_count = len(pdf_reader.pages)
+        if page_count < PDF_PARALLEL_MIN_PAGES or max_workers <= 1:
+            # Serial: reuse the reader that counted the pages instead of parsing the file again
+            yield from _iter_reader_pages(pdf_reader)
+            return
+
+    # A few contiguous ranges per worker keeps the load balanced when pages vary in cost
+    range_count = min(page_count, max_workers * 4)
+    bounds = [page_count * i // range_count for i in range(range_count + 1)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # map() returns results in submission order, so pages come back in order
+        for page_texts in executor.map(_extract_pdf_page_range,
+                                       [file_path] * range_count, bounds[:-1], bounds[1:]):
+            yield from page_texts
+
+
+def with_page_markers(pages):
+    """Prefix each page's text with a [Page N] marker."""
+    for page_number, page_text in enumerate(pages, 1):
+        yield f"[Page {page_number}]\n{page_text}"
+
+
+def iter_docx_paragraphs(file_path):
+    """Yield the text of each DOCX paragraph in order."""
+    import docx
+    doc = docx.Document(file_path)
+    for paragraph in doc.paragraphs:
+        yield paragraph.text
+
+
+def iter_ppt_slides(file_path):
+    """Yield the text of each slide in order (one piece per slide)."""
+    from pptx import Presentation
+    prs = Presentation(file_path)
+    for slide in prs.slides:
+        slide_pieces = []
+        for shape in slide.shapes:
+            # Try to extract text using getattr to avoid linter errors
+            shape_text = getattr(shape, 'text', None)
+            if shape_text:
+                slide_pieces.append(shape_text)
+            else:
+                # Try text_frame approach
+                text_frame = getattr(shape, 'text_frame', None)
+                if text_frame:
+                    slide_pieces.extend(paragraph.text for paragraph in text_frame.paragraphs)
+        yield "\n".join(slide_pieces)
+
+
+def extract_text_with_offsets(file_path, file_type):
+    """
+    Extract text together with where each page (PDF), paragraph (DOCX) or
+    slide (PPT) starts in it, for chunking by page later. Returns
+    (text, offsets) with offsets as join_pieces builds them.
+    """
+    offsets = []
+    if file_type in ['pdf']:
+        text = join_pieces(iter_pdf_pages_parallel(file_path), offsets=offsets)
+    elif file_type in ['doc', 'docx']:
+        text = join_pieces(iter_docx_paragraphs(file_path), offsets=offsets)
+    elif file_type in ['ppt', 'pptx']:
+        text = join_pieces(iter_ppt_slides(file_path), skip_empty=True, offsets=offsets)
+    else:
+        text = extract_text_from_file(file_path, file_type)
+        offsets = [(1, 0)]
+    return text, offsets
+
+
+def extract_text_from_pdf(file_path, parallel=True, page_markers=False):
+    """
+    Extract text from PDF file, in parallel for large PDFs. page_markers puts
+    a [Page N] marker before each page, for callers that cite pages.
+    """
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text.strip()
+        pages = iter_pdf_pages_parallel(file_path) if parallel else iter_pdf_pages(file_path)
+        if page_markers:
+            pages = with_page_markers(pages)
+        return join_pieces(pages)
     except Exception as e:
         return f"[Error reading PDF: {e}]"
 
@@ -63,11 +255,7 @@ def extract_text_from_pdf(file_path):
 def extract_text_from_docx(file_path):
     """Extract text from DOCX file."""
     try:
-        doc = docx.Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text.strip()
+        return join_pieces(iter_docx_paragraphs(file_path))
     except Exception as e:
         return f"[Error reading DOCX: {e}]"
 
@@ -84,36 +272,82 @@ def extract_text_from_txt(file_path):
 def extract_text_from_ppt(file_path):
     """Extract text from PPT/PPTX file."""
     try:
-        prs = Presentation(file_path)
-        text = ""
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                # Try to extract text using getattr to avoid linter errors
-                shape_text = getattr(shape, 'text', None)
-                if shape_text:
-                    text += shape_text + "\n"
-                else:
-                    # Try text_frame approach
-                    text_frame = getattr(shape, 'text_frame', None)
-                    if text_frame:
-                        for paragraph in text_frame.paragraphs:
-                            text += paragraph.text + "\n"
-        return text.strip()
+        return join_pieces(iter_ppt_slides(file_path), skip_empty=True)
     except Exception as e:
         return f"[Error reading PPT: {e}]"
 
 
-def extract_text_from_excel(file_path):
+def _format_cell(value):
+    """Render one spreadsheet cell compactly on a single line."""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if value != value:  # NaN from pandas
+            return ""
+        if value.is_integer():
+            return str(int(value))
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value).replace("\t", " ").replace("\n", " ").strip()
+
+
+def _format_row(values, max_columns):
+    """Render a row as 'a | b | c', trimming trailing empty cells. Returns '' for empty rows."""
+    cells = [_format_cell(value) for value in list(values)[:max_columns]]
+    while cells and not cells[-1]:
+        cells.pop()
+    return " | ".join(cells)
+
+
+def iter_excel_lines(file_path, max_rows=EXCEL_MAX_ROWS_PER_SHEET, max_columns=EXCEL_MAX_COLUMNS):
+    """
+    Yield a compact text rendering of every sheet, opening the workbook once.
+    .xlsx files are streamed row by row with openpyxl in read-only mode;
+    legacy .xls files fall back to a single pandas ExcelFile.
+    """
+    with open(file_path, 'rb') as file:
+        is_legacy_xls = file.read(8) == b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+    if is_legacy_xls:
+        import pandas as pd
+        with pd.ExcelFile(file_path) as excel_file:
+            for sheet_name in excel_file.sheet_names:
+                df = excel_file.parse(sheet_name, header=None, nrows=max_rows + 1)
+                yield f"Sheet: {sheet_name}"
+                rows = df.itertuples(index=False, name=None)
+                yield from _iter_sheet_rows(rows, max_rows, max_columns)
+                yield ""
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            yield f"Sheet: {worksheet.title}"
+            rows = worksheet.iter_rows(max_col=max_columns, values_only=True)
+            yield from _iter_sheet_rows(rows, max_rows, max_columns)
+            yield ""
+    finally:
+        workbook.close()
+
+
+def _iter_sheet_rows(rows, max_rows, max_columns):
+    """Yield formatted non-empty rows, stopping with a note after max_rows."""
+    emitted = 0
+    for values in rows:
+        line = _format_row(values, max_columns)
+        if not line:
+            continue
+        if emitted >= max_rows:
+            yield f"[Truncated: sheet has more than {max_rows} rows]"
+            return
+        yield line
+        emitted += 1
+
+
+def extract_text_from_excel(file_path, max_rows=EXCEL_MAX_ROWS_PER_SHEET, max_columns=EXCEL_MAX_COLUMNS):
     """Extract text from Excel file."""
     try:
-        # Read all sheets
-        excel_file = pd.ExcelFile(file_path)
-        text = ""
-        for sheet_name in excel_file.sheet_names:
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            text += f"Sheet: {sheet_name}\n"
-            text += df.to_string() + "\n\n"
-        return text.strip()
+        return join_pieces(iter_excel_lines(file_path, max_rows, max_columns))
     except Exception as e:
         return f"[Error reading Excel: {e}]"
 
@@ -198,8 +432,8 @@ def generate_video_metadata(transcript, groq_api_key=None):
     cost_estimate = estimate_tokens_and_cost(prompt)
     
     try:
-        client = Groq(api_key=groq_api_key)
-        response = client.chat.completions.create(
+        response = get_scheduler().chat_completion(
+            groq_api_key,
             model="llama3-70b-8192",
             messages=[
                 {"role": "system", "content": "You are an expert content analyst. Provide accurate, structured metadata in JSON format. Always respond with valid JSON."},
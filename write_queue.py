@@ -0,0 +1,408 @@
+# write_queue.py
+
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Durable spool for writes that haven't reached storage yet
+WRITE_QUEUE_SPOOL = os.getenv("WRITE_QUEUE_SPOOL", ".write_queue.db")
+WRITE_QUEUE_FLUSH_SECONDS = float(os.getenv("WRITE_QUEUE_FLUSH_SECONDS", "2"))
+WRITE_QUEUE_BATCH_SIZE = int(os.getenv("WRITE_QUEUE_BATCH_SIZE", "200"))
+WRITE_QUEUE_MAX_ATTEMPTS = int(os.getenv("WRITE_QUEUE_MAX_ATTEMPTS", "8"))
+# Retry backoff doubles per attempt up to this many seconds
+MAX_RETRY_DELAY = 300
+
+SPOOL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_writes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    user_id TEXT,
+    session_id TEXT,
+    payload TEXT NOT NULL,
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at REAL DEFAULT 0,
+    last_error TEXT,
+    dead INTEGER DEFAULT 0,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_pending_writes_due ON pending_writes(dead, next_attempt_at, id);
+
+-- File ids assigned to queued ingests, so later writes can refer to a file before it exists
+CREATE TABLE IF NOT EXISTS ingested_files (
+    op_id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    created_at REAL
+);
+"""
+
+
+class WriteBehindQueue:
+    """
+    Background write-behind queue in front of a storage manager.
+
+    Writes are appended to a SQLite spool and return immediately; a worker
+    thread flushes them every flush_interval seconds (or on flush()):
+    - "ingest": one ingest_content call per file
+    - "token_usage": all queued rows in one save_token_usage_bulk call
+    - "summary_tree" / "status": coalesced so only the latest value per file is written
+    Failed writes are retried with exponential backoff and marked dead after
+    max_attempts. Anything still spooled after a crash is written on the next start.
+
+    Writes about a file whose ingest is still queued pass file_ref (the ingest's
+    op id) instead of file_id; they wait until the ingest has been written and
+    are not picked up before then. Ingests carry a client_op_id so a retry after
+    a lost response or a crash finds the row it already wrote instead of adding another.
+    """
+
+    def __init__(self, storage_manager, spool_path=WRITE_QUEUE_SPOOL,
+                 flush_interval=WRITE_QUEUE_FLUSH_SECONDS, batch_size=WRITE_QUEUE_BATCH_SIZE,
+                 max_attempts=WRITE_QUEUE_MAX_ATTEMPTS):
+        self.storage_manager = storage_manager
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(spool_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Each enqueue is on disk before it returns
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.executescript(SPOOL_SCHEMA)
+            self._conn.execute("DELETE FROM ingested_files WHERE created_at < ?", (time.time() - 86400,))
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._counters = {"written": 0, "batches": 0, "retries": 0, "dead": 0, "coalesced": 0}
+
+    # Producer side
+
+    def start(self):
+        """Start the background writer (idempotent)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+        return self
+
+    def enqueue(self, kind, payload, user_id=None, session_id=None):
+        """Spool one write and return its op id."""
+        with self._lock, self._conn:
+            op_id = self._conn.execute(
+                "INSERT INTO pending_writes (kind, user_id, session_id, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, user_id, session_id, json.dumps(payload), time.time())
+            ).lastrowid
+        # No wake-up: writes accumulate until the next interval so they go out in batches
+        self._idle.clear()
+        return op_id
+
+    def for_user(self, user_id, session_id=None):
+        """Producer bound to one user (user_id, or the anonymous session)."""
+        return UserWriteQueue(self, user_id, session_id)
+
+    def update_processing_status(self, file_ids, status):
+        """Queue a status change; only the latest queued status per file is written."""
+        for file_id in file_ids:
+            self.enqueue("status", {"file_id": int(file_id), "status": status})
+
+    def file_id_for(self, op_id):
+        """File id assigned to a queued ingest, or None until it has been written."""
+        with self._lock:
+            row = self._conn.execute("SELECT file_id FROM ingested_files WHERE op_id = ?", (op_id,)).fetchone()
+        return row["file_id"] if row else None
+
+    def dead_letters(self, owner=None):
+        """Writes that gave up, newest first; owner=(user_id, session_id) limits them to one user."""
+        sql = "SELECT * FROM pending_writes WHERE dead = 1"
+        params = []
+        if owner is not None:
+            sql += " AND user_id IS ? AND session_id IS ?"
+            params += list(owner)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY id DESC", params).fetchall()
+        return [{
+            "id": row["id"],
+            "kind": row["kind"],
+            "filename": json.loads(row["payload"]).get("filename"),
+            "error": row["last_error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"]
+        } for row in rows]
+
+    def requeue(self, op_ids):
+        """Retry dead writes from scratch, together with the writes that were waiting on them."""
+        op_ids = [int(op_id) for op_id in op_ids]
+        if not op_ids:
+            return
+        placeholders = ", ".join("?" * len(op_ids))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE pending_writes SET dead = 0, attempts = 0, next_attempt_at = 0, last_error = NULL "
+                f"WHERE dead = 1 AND (id IN ({placeholders}) OR json_extract(payload, '$.file_ref') IN ({placeholders}))",
+                op_ids + op_ids
+            )
+        self._idle.clear()
+
+    def discard(self, op_ids):
+        """Delete dead writes that are no longer wanted."""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pending_writes WHERE id = ? AND dead = 1",
+                                   [(int(op_id),) for op_id in op_ids])
+
+    def flush(self, timeout=None):
+        """Ask the worker to write everything due now and wait until it has (or timeout). Returns True if idle."""
+        if self._thread is None:
+            self._drain()
+            return True
+        self._idle.clear()
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def close(self, timeout=10):
+        """Flush remaining writes and stop the worker; spooled leftovers survive for the next start."""
+        if self._thread is not None:
+            self._stopping = True
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        """Queue depth and write counters for monitoring."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT SUM(dead = 0) AS pending, SUM(dead = 1) AS dead FROM pending_writes").fetchone()
+        return {**self._counters, "pending": row["pending"] or 0, "dead_letters": row["dead"] or 0}
+
+    # Worker side
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            # Keep going while writes arrive mid-flush, so flush() waits for them too
+            while True:
+                self._wake.clear()
+                try:
+                    self._drain()
+                except Exception as e:
+                    print(f"⚠️ Write-behind flush failed: {e}")
+                if not self._wake.is_set() or self._stopping:
+                    break
+            self._idle.set()
+            if self._stopping:
+                return
+
+    def _drain(self):
+        """Write due batches until nothing is due."""
+        while self._flush_batch():
+            pass
+
+    def _due_ops(self):
+        # Ops waiting on an ingest that is still pending are left out, so they can't fill the batch
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT * FROM pending_writes AS op
+                WHERE dead = 0 AND next_attempt_at <= ?
+                  AND (json_extract(payload, '$.file_ref') IS NULL
+                       OR json_extract(payload, '$.file_id') IS NOT NULL
+                       OR EXISTS (SELECT 1 FROM ingested_files
+                                  WHERE op_id = json_extract(op.payload, '$.file_ref'))
+                       OR NOT EXISTS (SELECT 1 FROM pending_writes AS ref
+                                      WHERE ref.id = json_extract(op.payload, '$.file_ref') AND ref.dead = 0))
+                ORDER BY id LIMIT ?
+                """,
+                (time.time(), self.batch_size)
+            ).fetchall()
+        return [{**dict(row), "payload": json.loads(row["payload"])} for row in rows]
+
+    def _storage_for(self, op):
+        return self.storage_manager.for_user(op["user_id"], op["session_id"])
+
+    def _flush_batch(self):
+        """Write one batch of due ops. Returns True if any op was completed or dropped."""
+        ops = self._due_ops()
+        if not ops:
+            return False
+        progress = False
+        self._counters["batches"] += 1
+
+        # Ingests first: later ops in the batch may refer to their file ids
+        for op in [op for op in ops if op["kind"] == "ingest"]:
+            try:
+                result = self._storage_for(op).ingest_content(**op["payload"])
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            if result["success"]:
+                with self._lock, self._conn:
+                    self._conn.execute("INSERT OR REPLACE INTO ingested_files (op_id, file_id, created_at) VALUES (?, ?, ?)",
+                                       (op["id"], result["file_id"], time.time()))
+                    self._conn.execute("DELETE FROM pending_writes WHERE id = ?", (op["id"],))
+                self._counters["written"] += 1
+            else:
+                self._retry([op], result.get("error"))
+            progress = True
+
+        ready = []
+        for op in ops:
+            if op["kind"] == "ingest":
+                continue
+            file_ref = op["payload"].pop("file_ref", None)
+            if file_ref is not None and op["payload"].get("file_id") is None:
+                file_id = self.file_id_for(file_ref)
+                if file_id is None:
+                    if self._is_dead(file_ref):
+                        self._fail([op], "file was never saved")
+                        progress = True
+                    continue
+                op["payload"]["file_id"] = file_id
+            ready.append(op)
+
+        if ready:
+            progress = True
+            self._write_summary_trees([op for op in ready if op["kind"] == "summary_tree"])
+            self._write_statuses([op for op in ready if op["kind"] == "status"])
+            self._write_token_usage([op for op in ready if op["kind"] == "token_usage"])
+        return progress
+
+    def _latest_per_file(self, ops, key):
+        """Keep the newest op per key; older ones are dropped as superseded."""
+        latest = {}
+        for op in ops:
+            latest[key(op)] = op
+        superseded = [op for op in ops if latest[key(op)] is not op]
+        if superseded:
+            self._complete(superseded)
+            self._counters["coalesced"] += len(superseded)
+        return list(latest.values())
+
+    def _write_summary_trees(self, ops):
+        for op in self._latest_per_file(ops, lambda op: (op["user_id"], op["session_id"], op["payload"]["file_id"])):
+            self._apply([op], lambda: self._storage_for(op).save_summary_tree(
+                op["payload"]["file_id"], op["payload"]["summary_tree"]))
+
+    def _write_statuses(self, ops):
+        by_status = {}
+        for op in self._latest_per_file(ops, lambda op: op["payload"]["file_id"]):
+            by_status.setdefault(op["payload"]["status"], []).append(op)
+        for status, status_ops in by_status.items():
+            self._apply(status_ops, lambda: self.storage_manager.update_processing_status(
+                [op["payload"]["file_id"] for op in status_ops], status))
+
+    def _write_token_usage(self, ops):
+        if not ops:
+            return
+        rows = [{
+            "file_id": op["payload"]["file_id"],
+            "operation": op["payload"]["operation"],
+            "input_tokens": op["payload"]["input_tokens"],
+            "output_tokens": op["payload"]["output_tokens"],
+            "estimated_cost": op["payload"]["estimated_cost"],
+            "user_id": self._storage_for(op)._get_owner_id()
+        } for op in ops]
+        self._apply(ops, lambda: self.storage_manager.save_token_usage_bulk(rows))
+
+    def _apply(self, ops, write):
+        """Run one storage write covering `ops`; complete them or schedule a retry."""
+        try:
+            result = write()
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        if result["success"]:
+            self._complete(ops)
+            self._counters["written"] += len(ops)
+        else:
+            self._retry(ops, result.get("error"))
+
+    def _complete(self, ops):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pending_writes WHERE id = ?", [(op["id"],) for op in ops])
+
+    def _retry(self, ops, error):
+        retry = [op for op in ops if op["attempts"] + 1 < self.max_attempts]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE pending_writes SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                [(time.time() + min(MAX_RETRY_DELAY, 2 ** (op["attempts"] + 1)), error, op["id"]) for op in retry]
+            )
+        self._counters["retries"] += len(retry)
+        self._fail([op for op in ops if op not in retry], error)
+
+    def _fail(self, ops, error):
+        """Move ops to the dead letters (kept in the spool for inspection)."""
+        if not ops:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE pending_writes SET dead = 1, last_error = ? WHERE id = ?",
+                                   [(error, op["id"]) for op in ops])
+        self._counters["dead"] += len(ops)
+        print(f"❌ Dropped {len(ops)} queued write(s): {error}")
+
+    def _is_dead(self, op_id):
+        with self._lock:
+            row = self._conn.execute("SELECT dead FROM pending_writes WHERE id = ?", (op_id,)).fetchone()
+        # Gone without an ingested_files row means it never succeeded
+        return row is None or bool(row["dead"])
+
+
+class UserWriteQueue:
+    """The write queue's producer methods, bound to one user."""
+
+    def __init__(self, queue, user_id, session_id=None):
+        self.queue = queue
+        self.user_id = user_id
+        self.session_id = session_id
+
+    def _enqueue(self, kind, payload):
+        return self.queue.enqueue(kind, payload, self.user_id, self.session_id)
+
+    def ingest_content(self, **kwargs):
+        """Queue a processed file (ingest_content arguments). Returns the op id to use as file_ref."""
+        return self._enqueue("ingest", {**kwargs, "client_op_id": kwargs.get("client_op_id") or str(uuid.uuid4())})
+
+    def save_token_usage(self, operation, input_tokens, output_tokens, estimated_cost,
+                         file_id=None, file_ref=None):
+        return self._enqueue("token_usage", {
+            "file_id": file_id,
+            "file_ref": file_ref,
+            "operation": operation,
+            "input_tokens": int(input_tokens),
+            "output_tokens": int(output_tokens),
+            "estimated_cost": float(estimated_cost)
+        })
+
+    def save_summary_tree(self, summary_tree, file_id=None, file_ref=None):
+        return self._enqueue("summary_tree", {"file_id": file_id, "file_ref": file_ref, "summary_tree": summary_tree})
+
+    def file_id_for(self, op_id):
+        return self.queue.file_id_for(op_id)
+
+    def dead_letters(self):
+        return self.queue.dead_letters((self.user_id, self.session_id))
+
+    def requeue(self, op_ids):
+        owned = {letter["id"] for letter in self.dead_letters()}
+        self.queue.requeue([op_id for op_id in op_ids if op_id in owned])
+
+    def discard(self, op_ids):
+        owned = {letter["id"] for letter in self.dead_letters()}
+        self.queue.discard([op_id for op_id in op_ids if op_id in owned])
+
+    def stats(self):
+        return self.queue.stats()
+
+
+# Global write queue instance
+write_queue = None
+
+def get_write_queue() -> WriteBehindQueue:
+    """Get or create the global write-behind queue (started, and flushed at exit)."""
+    global write_queue
+    if write_queue is None:
+        from supabase_storage import get_storage_manager
+        write_queue = WriteBehindQueue(get_storage_manager()).start()
+        atexit.register(write_queue.close)
+    return write_queue